@@ -0,0 +1,439 @@
+import heapq
+import json
+from bisect import bisect_left, insort
+from collections import Counter
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+
+# Bump when the saved layout changes; older files are then rebuilt.
+_VERSION = 10
+
+# The record fields listings need; everything else is the requirement body.
+SUMMARY_FIELDS = ("id", "title", "user", "status", "created_at", "updated_at", "tags", "revision")
+
+
+# Record fields with a time index, ordered by microseconds since the epoch.
+TIME_FIELDS = ("created_at", "updated_at")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def timestamp_us(value: str | None) -> int | None:
+    """Return an ISO 8601 timestamp as whole microseconds since the epoch.
+
+    Guarantees: naive timestamps are taken as UTC; returns None for a missing
+                or unparseable value.
+    """
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+def title_key(title: str) -> str:
+    """Return the form of a title used for case-insensitive lookups."""
+    return title.lower()
+
+
+def link_targets(entry: dict) -> list[tuple[str | None, str]]:
+    """Return (target ID or None, title_key()) for each related_rs title of a record.
+
+    related_ids holds, position by position, the ID each related_rs title
+    was resolved to when the record was written, or None where no single
+    requirement had that title. Records written before IDs were kept have
+    no related_ids, so all their links are unresolved.
+    """
+    ids = entry.get("related_ids") or []
+    return [
+        (ids[i] if i < len(ids) else None, title_key(title))
+        for i, title in enumerate(entry.get("related_rs") or [])
+    ]
+
+
+def title_trigrams(title: str) -> set[str]:
+    """Return the character trigrams of a title, for typo-tolerant matching.
+
+    The title_key() is padded with two spaces in front and one behind, so
+    short titles still have trigrams and the start of a title weighs more.
+    """
+    padded = f"  {' '.join(title_key(title).split())} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def most_similar(
+    grams: set[str], shared: Iterable[tuple[str, str, int]], *, threshold: float, limit: int
+) -> list[tuple[str, float]]:
+    """Rank candidate titles by trigram similarity to a title with grams.
+
+    shared yields (req_id, title, trigrams in common) for every candidate
+    that has at least one trigram in common; nothing else is looked at.
+    Similarity is the Jaccard index of the two trigram sets.
+
+    Guarantees: returns up to limit (req_id, similarity) pairs with
+                similarity >= threshold, most similar first, ties by ID.
+    """
+    scored = []
+    for req_id, title, common in shared:
+        similarity = common / (len(grams) + len(title_trigrams(title)) - common)
+        if similarity >= threshold:
+            scored.append((-similarity, req_id))
+    return [(req_id, -negated) for negated, req_id in heapq.nsmallest(limit, scored)]
+
+
+def summarize(entry: dict) -> dict:
+    """Return the listing fields of a requirement record.
+
+    Guarantees: returns a new dict holding those SUMMARY_FIELDS that entry
+                has, so optional fields stay absent rather than empty.
+    """
+    return {field: entry[field] for field in SUMMARY_FIELDS if field in entry}
+
+
+def _remove_sorted(items: list[str], item: str) -> None:
+    i = bisect_left(items, item)
+    if i < len(items) and items[i] == item:
+        del items[i]
+
+
+def _remove_posting(postings: dict[str, list[str]], key: str, req_id: str) -> None:
+    posting = postings[key]
+    _remove_sorted(posting, req_id)
+    if not posting:
+        del postings[key]
+
+
+class Catalog:
+    """Secondary indexes over the requirement records of the file storages.
+
+    The catalog is derived data. It is saved next to each rsdb.json snapshot,
+    stamped with that snapshot's identity, and brought up to date by applying
+    the journal records written after it. A catalog whose stamp does not
+    match the snapshot on disk is discarded and rebuilt from the records.
+
+    Indexes:
+      - IDs in sorted order, so prefix resolution is a bisection.
+      - Summaries: the summarize() projection of every record, so listings
+        never need the requirement bodies.
+      - Tag postings: each lowercased tag maps to the sorted IDs carrying it.
+      - Titles: each title_key() maps to the IDs with that title.
+      - Trigrams: each title_trigrams() trigram maps to the sorted title
+        keys containing it, for typo-tolerant title lookups.
+      - Times: for each of TIME_FIELDS, sorted [microseconds, id] pairs, so a
+        time range is found by bisection. Unparseable times are left out.
+      - Links: each ID maps to its link_targets(), in order. Each target ID
+        maps back to the sorted IDs linking to it, and so does the title key
+        of each unresolved link, which leads to the requirement with that
+        title if exactly one has it.
+    The previous summary of a record tells an update exactly which tag and
+    title entries to remove.
+
+    Guarantees: after build() or apply(), every index reflects exactly the
+                records it was given; apply() is idempotent.
+    """
+
+    FILE_SUFFIX = ".json"
+
+    def __init__(
+        self,
+        ids: list[str],
+        summaries: dict[str, dict],
+        postings: dict[str, list[str]],
+        titles: dict[str, list[str]],
+        trigrams: dict[str, list[str]],
+        times: dict[str, list[list]],
+        links: dict[str, list[list]],
+        referrers: dict[str, list[str]],
+        waiting: dict[str, list[str]],
+    ):
+        self._ids = ids
+        self._summaries = summaries
+        self._postings = postings
+        self._titles = titles
+        self._trigrams = trigrams
+        self._times = times
+        self._links = links
+        self._referrers = referrers
+        self._waiting = waiting
+
+    @classmethod
+    def build(cls, records: Iterable[dict]) -> "Catalog":
+        catalog = cls([], {}, {}, {}, {}, {field: [] for field in TIME_FIELDS}, {}, {}, {})
+        for entry in records:
+            catalog._summaries[entry["id"]] = summarize(entry)
+            catalog._add_links(entry)
+        catalog._ids = sorted(catalog._summaries)
+        for req_id in catalog._ids:
+            summary = catalog._summaries[req_id]
+            for tag in _tag_keys(summary):
+                catalog._postings.setdefault(tag, []).append(req_id)
+            catalog._titles.setdefault(_title_of(summary), []).append(req_id)
+            for field, pair in _time_pairs(summary):
+                catalog._times[field].append(pair)
+        for pairs in catalog._times.values():
+            pairs.sort()
+        for key in sorted(catalog._titles):
+            for gram in title_trigrams(key):
+                catalog._trigrams.setdefault(gram, []).append(key)
+        return catalog
+
+    @classmethod
+    def from_bytes(cls, data: bytes, stamp: list) -> "Catalog | None":
+        """Return the catalog saved in data, or None if it is unreadable or stale."""
+        try:
+            saved = json.loads(data)
+        except ValueError:
+            return None
+        if saved.get("version") != _VERSION or saved.get("stamp") != stamp:
+            return None
+        return cls(
+            saved["ids"],
+            saved["summaries"],
+            saved["postings"],
+            saved["titles"],
+            saved["trigrams"],
+            saved["times"],
+            saved["links"],
+            saved["referrers"],
+            saved["waiting"],
+        )
+
+    def to_bytes(self, stamp: list) -> bytes:
+        return json.dumps({
+            "version": _VERSION,
+            "stamp": stamp,
+            "ids": self._ids,
+            "summaries": self._summaries,
+            "postings": self._postings,
+            "titles": self._titles,
+            "trigrams": self._trigrams,
+            "times": self._times,
+            "links": self._links,
+            "referrers": self._referrers,
+            "waiting": self._waiting,
+        }).encode()
+
+    def apply(self, puts: list[dict], deletes: list[str]) -> None:
+        for entry in puts:
+            req_id = entry["id"]
+            old = self._summaries.get(req_id)
+            if old is None:
+                insort(self._ids, req_id)
+            new = self._summaries[req_id] = summarize(entry)
+
+            old_tags = _tag_keys(old) if old is not None else []
+            new_tags = _tag_keys(new)
+            self._unpost(req_id, [t for t in old_tags if t not in new_tags])
+            for tag in new_tags:
+                if tag not in old_tags:
+                    insort(self._postings.setdefault(tag, []), req_id)
+
+            old_title = _title_of(old) if old is not None else None
+            if old_title != _title_of(new):
+                if old_title is not None:
+                    self._remove_title(old_title, req_id)
+                self._add_title(_title_of(new), req_id)
+
+            old_times = _time_pairs(old) if old is not None else []
+            new_times = _time_pairs(new)
+            if old_times != new_times:
+                for field, pair in old_times:
+                    _remove_sorted(self._times[field], pair)
+                for field, pair in new_times:
+                    insort(self._times[field], pair)
+
+            self._remove_links(req_id)
+            self._add_links(entry)
+        for req_id in deletes:
+            old = self._summaries.pop(req_id, None)
+            if old is not None:
+                _remove_sorted(self._ids, req_id)
+                self._unpost(req_id, _tag_keys(old))
+                self._remove_title(_title_of(old), req_id)
+                for field, pair in _time_pairs(old):
+                    _remove_sorted(self._times[field], pair)
+                self._remove_links(req_id)
+
+    def _add_title(self, key: str, req_id: str) -> None:
+        if key not in self._titles:
+            for gram in title_trigrams(key):
+                insort(self._trigrams.setdefault(gram, []), key)
+        insort(self._titles.setdefault(key, []), req_id)
+
+    def _remove_title(self, key: str, req_id: str) -> None:
+        _remove_posting(self._titles, key, req_id)
+        if key not in self._titles:
+            for gram in title_trigrams(key):
+                _remove_posting(self._trigrams, gram, key)
+
+    def _add_links(self, entry: dict) -> None:
+        targets = link_targets(entry)
+        if targets:
+            self._links[entry["id"]] = [list(pair) for pair in targets]
+            for target in {target for target, _ in targets if target is not None}:
+                insort(self._referrers.setdefault(target, []), entry["id"])
+            for key in {key for target, key in targets if target is None}:
+                insort(self._waiting.setdefault(key, []), entry["id"])
+
+    def _remove_links(self, req_id: str) -> None:
+        targets = self._links.pop(req_id, ())
+        for target in {target for target, _ in targets if target is not None}:
+            _remove_posting(self._referrers, target, req_id)
+        for key in {key for target, key in targets if target is None}:
+            _remove_posting(self._waiting, key, req_id)
+
+    def _unpost(self, req_id: str, tags: list[str]) -> None:
+        for tag in tags:
+            _remove_posting(self._postings, tag, req_id)
+
+    def ids_with_prefix(self, prefix: str) -> list[str]:
+        i = bisect_left(self._ids, prefix)
+        matches = []
+        while i < len(self._ids) and self._ids[i].startswith(prefix):
+            matches.append(self._ids[i])
+            i += 1
+        return matches
+
+    def ids_containing(self, fragment: str) -> list[str]:
+        return [req_id for req_id in self._ids if fragment in req_id]
+
+    def id_neighbours(self, req_id: str) -> tuple[str | None, str | None]:
+        """Return the IDs sorted immediately before and after req_id."""
+        i = bisect_left(self._ids, req_id)
+        before = self._ids[i - 1] if i > 0 else None
+        if i < len(self._ids) and self._ids[i] == req_id:
+            i += 1
+        after = self._ids[i] if i < len(self._ids) else None
+        return before, after
+
+    def ids_with_title(self, title: str) -> list[str]:
+        return list(self._titles.get(title_key(title), []))
+
+    def similar_titles(self, title: str, *, threshold: float, limit: int) -> list[tuple[str, float]]:
+        """Return IDs whose title is similar to title; see most_similar()."""
+        grams = title_trigrams(title)
+        common = Counter(key for gram in grams for key in self._trigrams.get(gram, ()))
+        shared = (
+            (req_id, key, count) for key, count in common.items() for req_id in self._titles[key]
+        )
+        return most_similar(grams, shared, threshold=threshold, limit=limit)
+
+    def _resolve_link(self, key: str) -> str | None:
+        ids = self._titles.get(key, ())
+        return ids[0] if len(ids) == 1 else None
+
+    def links_from(self, req_id: str) -> list[str]:
+        """Return the IDs that req_id's related_rs links lead to, in order.
+
+        Guarantees: unresolved titles that match no requirement, or several,
+                    are left out.
+        """
+        resolved = (
+            target if target is not None else self._resolve_link(key)
+            for target, key in self._links.get(req_id, ())
+        )
+        return [target for target in resolved if target is not None]
+
+    def links_to(self, req_id: str) -> list[str]:
+        """Return the sorted IDs whose related_rs leads to req_id."""
+        summary = self._summaries.get(req_id)
+        if summary is None:
+            return []
+        referrers = set(self._referrers.get(req_id, ()))
+        if self._resolve_link(_title_of(summary)) == req_id:
+            referrers.update(self._waiting.get(_title_of(summary), ()))
+        return sorted(referrers)
+
+    def link_edges(self) -> list[tuple[str, str]]:
+        """Return every (source ID, target ID) link, by source ID then title order."""
+        return [
+            (source, target) for source in sorted(self._links) for target in self.links_from(source)
+        ]
+
+    def ids_with_tag(self, tag: str) -> list[str]:
+        return list(self._postings.get(tag.lower(), []))
+
+    def summaries(self, ids: Iterable[str]) -> list[dict]:
+        return [self._summaries[req_id] for req_id in ids if req_id in self._summaries]
+
+    def ids_between(self, field: str, start: int | None, end: int | None) -> list[str]:
+        """Return the IDs whose field time t satisfies start <= t < end.
+
+        Either bound may be None for an open end. Both ends are bisections
+        in the time index of field, one of TIME_FIELDS.
+        """
+        pairs = self._times[field]
+        lo = bisect_left(pairs, [start]) if start is not None else 0
+        hi = bisect_left(pairs, [end]) if end is not None else len(pairs)
+        return [req_id for _, req_id in pairs[lo:hi]]
+
+    def select(
+        self,
+        *,
+        owner: str | None,
+        status: str | None,
+        tag: str | None,
+        created: tuple[int | None, int | None] | None = None,
+        updated: tuple[int | None, int | None] | None = None,
+    ) -> list[dict]:
+        """Return the summaries matching every given filter, in no set order.
+
+        Filters compare case-insensitively. created and updated are
+        [start, end) ranges in microseconds, as for ids_between(). A tag or
+        time filter reads its index instead of testing every summary.
+        """
+        candidates = []
+        if tag is not None:
+            candidates.append(self.ids_with_tag(tag))
+        if created is not None:
+            candidates.append(self.ids_between("created_at", *created))
+        if updated is not None:
+            candidates.append(self.ids_between("updated_at", *updated))
+        if candidates:
+            candidates.sort(key=len)
+            ids = set(candidates[0]).intersection(*candidates[1:])
+        else:
+            ids = self._ids
+        return [
+            s for s in self.summaries(ids)
+            if (owner is None or s.get("user", "").lower() == owner.lower())
+            and (status is None or s.get("status", "").lower() == status.lower())
+        ]
+
+    def tag_counts(self) -> dict[str, int]:
+        return {tag: len(posting) for tag, posting in self._postings.items()}
+
+    def tag_overlap(self, tags: list[str], *, exclude_id: str, limit: int) -> list[str]:
+        """Return up to limit IDs ranked by how many of tags they carry.
+
+        The posting lists of the query tags are merged in ID order, so equal
+        IDs arrive together and their run length is the overlap count. Only
+        the best limit IDs are kept. Ties are broken by ID.
+        """
+        postings = [self._postings.get(tag, []) for tag in {t.lower() for t in tags}]
+        runs = (
+            (-sum(1 for _ in run), req_id)
+            for req_id, run in groupby(heapq.merge(*postings))
+            if req_id != exclude_id
+        )
+        return [req_id for _, req_id in heapq.nsmallest(limit, runs)]
+
+
+def _tag_keys(entry: dict) -> list[str]:
+    return sorted({t.lower() for t in entry.get("tags", [])})
+
+
+def _title_of(entry: dict) -> str:
+    return title_key(entry.get("title", ""))
+
+
+def _time_pairs(entry: dict) -> list[tuple[str, list]]:
+    pairs = []
+    for field in TIME_FIELDS:
+        moment = timestamp_us(entry.get(field))
+        if moment is not None:
+            pairs.append((field, [moment, entry["id"]]))
+    return pairs
@@ -2,6 +2,13 @@ import argparse
 import subprocess
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pofe.requirement_store import RequirementStore
+
+# How many further near-duplicates a create warning names before summing up.
+_DUPLICATES_SHOWN = 4
 
 
 def cmd_init(args: argparse.Namespace) -> None:
@@ -19,19 +26,42 @@ def cmd_init(args: argparse.Namespace) -> None:
     print(f"Initialized .pofe in {Path.cwd()}")
 
 
+def _open_store() -> "RequirementStore":
+    """Return the process-wide requirement store.
+
+    Fails: prints error to stderr and exits if no .pofe directory exists or
+           the configured storage mode is unknown.
+    """
+    from pofe.requirement_store import open_store
+
+    try:
+        return open_store()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def _available_tags(store: "RequirementStore") -> list[str]:
+    try:
+        return [t["name"] for t in store.list_tags()]
+    except FileNotFoundError:
+        return []
+
+
 def cmd_req_create(args: argparse.Namespace) -> None:
+    import warnings
+
     from pofe.editor_adapter import open_editor
-    from pofe.requirement_store import append_requirement, list_all_tags
+    from pofe.requirement_store import NearDuplicateWarning
     from pofe.user_manager import get_username
 
+    store = _open_store()
     try:
         username = get_username()
-        try:
-            available_tags = [t["name"] for t in list_all_tags()]
-        except FileNotFoundError:
-            available_tags = []
-        content = open_editor(available_tags=available_tags)
-        req_id = append_requirement(content, username)
+        content = open_editor(available_tags=_available_tags(store))
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", NearDuplicateWarning)
+            req_id = store.append(content, username)
         print(f"Created: {req_id}")
     except (FileNotFoundError, ValueError) as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -39,37 +69,86 @@ def cmd_req_create(args: argparse.Namespace) -> None:
     except OSError as e:
         print(f"Storage error: {e}", file=sys.stderr)
         sys.exit(1)
+    for warning in caught:
+        if isinstance(warning.message, NearDuplicateWarning):
+            print(f"Warning: {warning.message}", file=sys.stderr)
+            others = warning.message.duplicates[1:]
+            for summary, score in others[:_DUPLICATES_SHOWN]:
+                print(f"  also [{summary['id'][:8]}] {summary.get('title', '')} ({score:.2f})", file=sys.stderr)
+            if len(others) > _DUPLICATES_SHOWN:
+                print(f"  and {len(others) - _DUPLICATES_SHOWN} more", file=sys.stderr)
+            print("Run 'pofe req dedupe' to review near-duplicates.", file=sys.stderr)
+
+
+def cmd_req_import(args: argparse.Namespace) -> None:
+    from pofe.importer import expand_paths, parse_files
+    from pofe.user_manager import get_username
 
+    if args.jobs is not None and args.jobs < 1:
+        print("Error: --jobs must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+    store = _open_store()
+    paths, unmatched = expand_paths(args.paths)
+    for pattern in unmatched:
+        print(f"Error: no markdown files match '{pattern}'.", file=sys.stderr)
+
+    results = parse_files(paths, workers=args.jobs)
+    failures = [r for r in results if r["error"]]
+    for r in results:
+        status = "FAIL" if r["error"] else "ok"
+        print(f"{status:4}  {r['seconds'] * 1000:8.2f} ms  {r['path']}")
+    for r in failures:
+        print(f"Error: {r['path']}: {r['error']}", file=sys.stderr)
+
+    documents = [r["fields"] for r in results if not r["error"]]
+    try:
+        ids = store.append_many(documents, get_username(), dry_run=args.dry_run)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except OSError as e:
+        print(f"Storage error: {e}", file=sys.stderr)
+        sys.exit(1)
 
-def _resolve_requirement(id_input: str) -> dict:
+    verb = "Would import" if args.dry_run else "Imported"
+    total = sum(r["seconds"] for r in results)
+    print(f"{verb} {len(ids)} requirement(s); {len(failures)} file(s) failed; parsing took {total:.3f} s.")
+    if failures or unmatched:
+        sys.exit(1)
+
+
+def _resolve_requirement(store: "RequirementStore", id_input: str) -> dict:
     """Resolve a requirement by full ID, prefix, substring, or title.
 
-    When the input matches multiple requirements, prints a numbered list and
-    prompts the user to select one interactively.
+    When the input matches multiple requirements, or matches none but is
+    close to some titles, prints a numbered list and prompts the user to
+    select one interactively.
 
     Fails: prints error to stderr and exits if no match is found, the selection
            is invalid, or the operation is cancelled.
     """
-    from pofe.requirement_store import get_requirement, find_by_partial_id
-
     try:
-        return get_requirement(id_input)
+        return store.get(id_input)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
     except KeyError as e:
-        if "Ambiguous" not in str(e):
-            print(f"Error: {e}", file=sys.stderr)
-            sys.exit(1)
+        not_found = e
 
     try:
-        candidates = find_by_partial_id(id_input)
+        candidates = store.candidates(id_input)
     except FileNotFoundError as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
     if not candidates:
-        print(f"Error: No requirement found for '{id_input}'.", file=sys.stderr)
+        print(f"Error: {not_found}", file=sys.stderr)
         sys.exit(1)
 
-    print(f"Multiple matches for '{id_input}':")
+    if "Ambiguous" in str(not_found):
+        print(f"Multiple matches for '{id_input}':")
+    else:
+        print(f"No exact match for '{id_input}'. Did you mean:")
     for i, req in enumerate(candidates, 1):
         print(f"  {i}. [{req['id'][:8]}] {req.get('title', '')}")
 
@@ -83,11 +162,12 @@ def _resolve_requirement(id_input: str) -> dict:
         print("Invalid selection.", file=sys.stderr)
         sys.exit(1)
 
-    return candidates[int(choice) - 1]
+    # Candidates are summaries; only the chosen requirement's body is loaded.
+    return store.get(candidates[int(choice) - 1]["id"])
 
 
 def cmd_req_analyze(args: argparse.Namespace) -> None:
-    from pofe.requirement_store import get_requirement, format_as_markdown, find_requirements_by_tags
+    from pofe.requirement_store import format_as_markdown
     from pofe.editor_adapter import open_editor
     from pofe.history_logger import open_history_session, write_request, write_response
 
@@ -95,7 +175,8 @@ def cmd_req_analyze(args: argparse.Namespace) -> None:
     metadata: dict = {}
 
     if args.requirement:
-        req = _resolve_requirement(args.requirement)
+        store = _open_store()
+        req = _resolve_requirement(store, args.requirement)
         try:
             content = format_as_markdown(req)
             metadata["requirement_id"] = req["id"]
@@ -104,11 +185,16 @@ def cmd_req_analyze(args: argparse.Namespace) -> None:
             sys.exit(1)
 
         try:
-            related = find_requirements_by_tags(req.get("tags", []), exclude_id=req["id"])
+            try:
+                related = [store.get(s["id"]) for s, _ in store.similar(req)]
+                reason = "are the most similar in text to"
+            except ImportError:
+                related = store.find_by_tags(req.get("tags", []), exclude_id=req["id"])
+                reason = "share tags with"
             if related:
                 parts = [
                     "\n## Related Requirements (Context)\n",
-                    "The following requirements share tags with the one being analyzed."
+                    f"The following requirements {reason} the one being analyzed."
                     " Use them for context only.\n",
                 ]
                 for r in related:
@@ -171,25 +257,42 @@ def cmd_req_analyze(args: argparse.Namespace) -> None:
 
 
 def cmd_req_list(args: argparse.Namespace) -> None:
-    from pofe.requirement_store import list_requirements
-
+    if (args.limit is not None and args.limit < 1) or args.offset < 0:
+        print("Error: --limit must be at least 1 and --offset not negative.", file=sys.stderr)
+        sys.exit(1)
+    store = _open_store()
     try:
-        reqs = list_requirements(
+        reqs = store.select(
             owner=args.owner,
             status=args.status,
             tag=args.tag,
+            since=args.since,
+            until=args.until,
+            updated_since=args.updated_since,
+            sort=args.sort,
+            reverse=args.reverse,
+            # One row past the page tells whether another page follows.
+            limit=args.limit + 1 if args.limit is not None else None,
+            offset=args.offset,
+            after=args.after,
+            as_of=args.as_of,
         )
-    except FileNotFoundError as e:
+    except (FileNotFoundError, ValueError) as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
+    more = args.limit is not None and len(reqs) > args.limit
+    reqs = reqs[:args.limit]
 
     if not reqs:
         print("No requirements found.")
         return
 
-    lines = _format_req_table(reqs)
+    lines = _format_req_table(reqs, store.short_ids([r["id"] for r in reqs]))
     output = "\n".join(lines)
     print(output)
+    if more:
+        cursor = store.page_cursor(reqs[-1], args.sort, args.reverse)
+        print(f"Next page: --after {cursor}")
 
     if args.output:
         try:
@@ -200,9 +303,118 @@ def cmd_req_list(args: argparse.Namespace) -> None:
             sys.exit(1)
 
 
-def _format_req_table(reqs: list) -> list[str]:
-    """Render requirements as a fixed-width table for terminal display."""
-    col_id = 8
+def _print_scored(store, results: list) -> None:
+    # (summary, score) pairs as a table, best first as given.
+    short_ids = store.short_ids([summary["id"] for summary, _ in results])
+    col_id = max(max(len(short) for short in short_ids.values()), 2)
+    header = f"{'ID':<{col_id}}  {'SCORE':>6}  TITLE"
+    print(header)
+    print("-" * len(header))
+    for summary, score in results:
+        print(f"{short_ids[summary['id']]:<{col_id}}  {score:>6.2f}  {summary.get('title', '')}")
+    print(f"\n{len(results)} result(s).")
+
+
+def cmd_req_search(args: argparse.Namespace) -> None:
+    if args.limit < 1:
+        print("Error: --limit must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+    store = _open_store()
+    try:
+        results = store.search(args.query, limit=args.limit)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not results:
+        print("No requirements found.")
+        return
+
+    _print_scored(store, results)
+
+
+def cmd_req_similar(args: argparse.Namespace) -> None:
+    if args.limit < 1:
+        print("Error: --limit must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+    store = _open_store()
+    req = _resolve_requirement(store, args.id)
+    try:
+        results = store.similar(req, limit=args.limit)
+    except (FileNotFoundError, ImportError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not results:
+        print("No similar requirements found.")
+        return
+
+    _print_scored(store, results)
+
+
+def cmd_req_dedupe(args: argparse.Namespace) -> None:
+    if args.threshold is not None and not 0 < args.threshold <= 1:
+        print("Error: --threshold must be above 0 and at most 1.", file=sys.stderr)
+        sys.exit(1)
+    store = _open_store()
+    try:
+        if args.threshold is None:
+            clusters = store.duplicate_clusters()
+        else:
+            clusters = store.duplicate_clusters(threshold=args.threshold)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not clusters:
+        print("No near-duplicates found.")
+        return
+
+    short_ids = store.short_ids([summary["id"] for c in clusters for summary, _ in c])
+    col_id = max(max(len(short) for short in short_ids.values()), 2)
+    for number, cluster in enumerate(clusters, 1):
+        if number > 1:
+            print()
+        print(f"Cluster {number} ({len(cluster)} requirements):")
+        for summary, score in cluster:
+            print(f"  {short_ids[summary['id']]:<{col_id}}  {score:>4.2f}  {summary.get('title', '')}")
+    print(f"\n{len(clusters)} cluster(s) of near-duplicates.")
+
+
+def cmd_req_export(args: argparse.Namespace) -> None:
+    from pofe.exporter import export_markdown_files, export_records
+
+    if args.split and (args.format != "md" or not args.output):
+        print("Error: --split needs --format md and an output directory.", file=sys.stderr)
+        sys.exit(1)
+
+    store = _open_store()
+    try:
+        records = store.iter_records(owner=args.owner, status=args.status, tag=args.tag, as_of=args.as_of)
+        if args.split:
+            count = export_markdown_files(records, Path(args.output))
+        elif args.output:
+            with open(args.output, "w", encoding="utf-8", newline="") as out:
+                count = export_records(records, args.format, out)
+        else:
+            count = export_records(records, args.format, sys.stdout)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except OSError as e:
+        print(f"Export error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        print(f"Exported {count} requirement(s) to {args.output}")
+
+
+def _format_req_table(reqs: list, short_ids: dict[str, str]) -> list[str]:
+    """Render requirements as a fixed-width table for terminal display.
+
+    IDs are shown by the shortest prefix that still identifies them.
+    """
+    col_id = max(max(len(short) for short in short_ids.values()), 2)
     col_title = max(len(r.get("title", "")) for r in reqs)
     col_title = min(max(col_title, 5), 50)
     col_owner = max((len(r.get("user", "")) for r in reqs), default=5)
@@ -218,7 +430,7 @@ def _format_req_table(reqs: list) -> list[str]:
 
     rows = [header, separator]
     for r in reqs:
-        short_id = r.get("id", "")[:col_id]
+        short_id = short_ids[r["id"]]
         title = r.get("title", "")[:col_title]
         owner = r.get("user", "")[:col_owner]
         created = r.get("created_at", "")[:10]
@@ -245,23 +457,31 @@ def _format_req_table(reqs: list) -> list[str]:
 
 def cmd_req_edit(args: argparse.Namespace) -> None:
     from pofe.editor_adapter import open_editor
-    from pofe.requirement_store import format_as_markdown, update_requirement, list_all_tags
+    from pofe.requirement_store import EditConflict, format_as_markdown
 
-    req = _resolve_requirement(args.id)
+    store = _open_store()
+    req = _resolve_requirement(store, args.id)
+    # The revision being edited: changes others commit meanwhile are merged in.
+    base_revision = req.get("revision", 1)
 
     try:
-        available_tags = [t["name"] for t in list_all_tags()]
-    except FileNotFoundError:
-        available_tags = []
-
-    try:
-        edited_content = open_editor(initial_content=format_as_markdown(req), available_tags=available_tags)
+        edited_content = open_editor(initial_content=format_as_markdown(req), available_tags=_available_tags(store))
     except OSError as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
     try:
-        update_requirement(req["id"], edited_content)
+        content = edited_content
+        while True:
+            try:
+                store.update(req["id"], content, base_revision=base_revision)
+                break
+            except EditConflict as conflict:
+                content = _resolve_conflicts(conflict, edited_content)
+                base_revision = conflict.revision
+        revision = store.get(req["id"]).get("revision", 1)
+        if revision > base_revision + 1:
+            print(f"Merged with {revision - base_revision - 1} change(s) made while editing.")
         print(f"Updated: {req['id']}")
     except ValueError as e:
         print(f"Validation error: {e}", file=sys.stderr)
@@ -274,11 +494,37 @@ def cmd_req_edit(args: argparse.Namespace) -> None:
         sys.exit(1)
 
 
-def cmd_tag_list(args: argparse.Namespace) -> None:
-    from pofe.requirement_store import list_all_tags
+def _resolve_conflicts(conflict, edited_content: str) -> str:
+    # Asks which side to keep for each conflicting field; returns the merged
+    # document. Aborting prints the edit so the work is not lost.
+    from pofe.history import flatten, unflatten
+    from pofe.requirement_store import format_as_markdown
 
+    print(f"{conflict}")
+    fields = flatten(conflict.merged)
+    for path, _, mine, theirs in conflict.conflicts:
+        print(f"\n{path}:")
+        for line in _diff_value(theirs):
+            print(f"  theirs: {line}")
+        for line in _diff_value(mine):
+            print(f"  mine:   {line}")
+        try:
+            answer = input("Keep [m]ine or [t]heirs? (anything else aborts) ").strip().lower()
+        except (EOFError, KeyboardInterrupt):
+            answer = ""
+        if answer == "m":
+            fields[path] = mine
+        elif answer != "t":
+            print("\nAborted. Your edit was not saved:\n", file=sys.stderr)
+            print(edited_content)
+            sys.exit(1)
+    return format_as_markdown(unflatten(fields))
+
+
+def cmd_tag_list(args: argparse.Namespace) -> None:
+    store = _open_store()
     try:
-        tags = list_all_tags()
+        tags = store.list_tags()
     except FileNotFoundError as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -299,10 +545,9 @@ def cmd_tag_list(args: argparse.Namespace) -> None:
 
 
 def cmd_tag_rename(args: argparse.Namespace) -> None:
-    from pofe.requirement_store import rename_tag
-
+    store = _open_store()
     try:
-        count = rename_tag(args.old, args.new)
+        count = store.rename_tag(args.old, args.new)
         print(f"Renamed '{args.old}' to '{args.new}' in {count} requirement(s).")
     except (FileNotFoundError, KeyError, ValueError) as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -313,8 +558,7 @@ def cmd_tag_rename(args: argparse.Namespace) -> None:
 
 
 def cmd_tag_delete(args: argparse.Namespace) -> None:
-    from pofe.requirement_store import delete_tag
-
+    store = _open_store()
     if not args.yes:
         answer = input(f"Delete tag '{args.name}' from all requirements? [y/N] ")
         if answer.strip().lower() != "y":
@@ -322,7 +566,7 @@ def cmd_tag_delete(args: argparse.Namespace) -> None:
             return
 
     try:
-        count = delete_tag(args.name)
+        count = store.delete_tag(args.name)
         print(f"Deleted tag '{args.name}' from {count} requirement(s).")
     except (FileNotFoundError, KeyError, ValueError) as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -333,50 +577,190 @@ def cmd_tag_delete(args: argparse.Namespace) -> None:
 
 
 def cmd_req_related(args: argparse.Namespace) -> None:
-    from pofe.requirement_store import get_related_requirements
-
-    req = _resolve_requirement(args.id)
+    if args.depth < 1:
+        print("Error: --depth must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+    store = _open_store()
+    req = _resolve_requirement(store, args.id)
+    if args.depth > 1 or args.reverse:
+        _print_linked(store, req, args.depth, args.reverse)
+        return
     try:
-        related = get_related_requirements(req["id"])
-    except (FileNotFoundError, KeyError) as e:
+        links = store.resolve_links(req)
+    except FileNotFoundError as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
-    titles = req.get("related_rs") or []
-    if not titles:
+    if not links:
         print("No related requirements.")
         return
 
     print(f"Related requirements for: {req['title']}")
     print()
-    resolved_by_title = {r.get("title", "").lower(): r for r in related}
-    for title in titles:
-        match = resolved_by_title.get(title.lower())
-        if match:
-            print(f"  [{match['id'][:8]}] {title}")
+    for title, target in links:
+        if target:
+            print(f"  [{target[:8]}] {title}")
         else:
             print(f"  [unresolved] {title}")
 
 
+def _print_linked(store, req: dict, depth: int, reverse: bool) -> None:
+    # Requirements within depth links of req, indented by distance.
+    try:
+        linked = store.linked(req["id"], depth=depth, reverse=reverse)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not linked:
+        print("No requirements link to this one." if reverse else "No related requirements.")
+        return
+
+    heading = "Requirements linking to" if reverse else "Requirements reachable from"
+    print(f"{heading}: {req['title']}")
+    print()
+    for summary, distance in linked:
+        print(f"{'  ' * distance}[{summary['id'][:8]}] {summary.get('title', '')}")
+    print(f"\n{len(linked)} requirement(s) within {depth} link(s).")
+
+
+def cmd_req_graph(args: argparse.Namespace) -> None:
+    if args.depth is not None and args.depth < 1:
+        print("Error: --depth must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+    if args.id is None and (args.depth is not None or args.reverse):
+        print("Error: --depth and --reverse need a requirement ID.", file=sys.stderr)
+        sys.exit(1)
+    from pofe.exporter import write_graph
+
+    store = _open_store()
+    req_id = _resolve_requirement(store, args.id)["id"] if args.id else None
+    try:
+        nodes, edges = store.link_graph(req_id, depth=args.depth, reverse=args.reverse)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as out:
+                write_graph(nodes, edges, args.format, out)
+        else:
+            write_graph(nodes, edges, args.format, sys.stdout)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except OSError as e:
+        print(f"Export error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.output:
+        print(f"Wrote {len(nodes)} requirement(s) and {len(edges)} link(s) to {args.output}.")
+
+
 def cmd_req_show(args: argparse.Namespace) -> None:
     from pofe.requirement_store import format_as_markdown
 
-    req = _resolve_requirement(args.id)
+    if args.rev is not None and args.as_of is not None:
+        print("Error: --rev and --as-of cannot be combined.", file=sys.stderr)
+        sys.exit(1)
+    store = _open_store()
+    req = _resolve_requirement(store, args.id)
+    if args.rev is not None or args.as_of is not None:
+        try:
+            if args.rev is not None:
+                req = store.revision(req["id"], args.rev)
+            else:
+                req = store.revision_at(req["id"], args.as_of)
+        except KeyError as e:
+            print(f"Error: {e.args[0]}", file=sys.stderr)
+            sys.exit(1)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        except OSError as e:
+            print(f"Storage error: {e}", file=sys.stderr)
+            sys.exit(1)
 
     print(f"ID:      {req['id']}")
     print(f"Owner:   {req.get('user', '')}")
     print(f"Created: {req.get('created_at', '')[:10]}")
     print(f"Updated: {req.get('updated_at', '')[:10]}")
+    print(f"Rev:     {req.get('revision', 1)}")
     print()
     print(format_as_markdown(req))
 
 
+def cmd_req_history(args: argparse.Namespace) -> None:
+    store = _open_store()
+    req = _resolve_requirement(store, args.id)
+    try:
+        revisions = store.history(req["id"])
+    except OSError as e:
+        print(f"Storage error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"History of: {req['title']}")
+    print()
+    header = f"{'REV':>4}  {'DATE':<19}  CHANGES"
+    print(header)
+    print("-" * len(header))
+    for revision in revisions:
+        if revision["deleted"]:
+            described = "deleted"
+        elif revision["rev"] == 1:
+            described = "created"
+        else:
+            described = ", ".join(revision["changed"]) or "no field changes"
+        date = revision["at"][:19].replace("T", " ")
+        print(f"{revision['rev']:>4}  {date:<19}  {described}")
+    print(f"\n{len(revisions)} revision(s).")
+
+
+def _diff_value(value) -> list[str]:
+    # The lines a field value is shown as in a diff.
+    if value is None or value == []:
+        return []
+    if isinstance(value, list):
+        value = ", ".join(str(item) for item in value)
+    return str(value).splitlines() or [""]
+
+
+def cmd_req_diff(args: argparse.Namespace) -> None:
+    store = _open_store()
+    req = _resolve_requirement(store, args.id)
+    new_rev = args.rev2 if args.rev2 is not None else req.get("revision", 1)
+    old_rev = args.rev1 if args.rev1 is not None else new_rev - 1
+    try:
+        changed = store.diff(req["id"], old_rev, new_rev)
+    except KeyError as e:
+        print(f"Error: {e.args[0]}", file=sys.stderr)
+        sys.exit(1)
+    except OSError as e:
+        print(f"Storage error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not changed:
+        print(f"No changes between revisions {old_rev} and {new_rev}.")
+        return
+
+    print(f"Changes to {req['title']} from revision {old_rev} to {new_rev}:")
+    for path, old, new in changed:
+        print()
+        print(path)
+        for line in _diff_value(old):
+            print(f"  - {line}")
+        for line in _diff_value(new):
+            print(f"  + {line}")
+
+
 def cmd_req_delete(args: argparse.Namespace) -> None:
-    from pofe.requirement_store import delete_requirement
+    store = _open_store()
+    req = _resolve_requirement(store, args.id)
+
+    if not args.yes:
+        answer = input(f"Delete '{req.get('title', req['id'])}' [{req['id'][:8]}...]? [y/N] ")
+        if answer.strip().lower() != "y":
+            print("Aborted.")
+            return
 
-    req = _resolve_requirement(args.id)
     try:
-        delete_requirement(req["id"], confirm=not args.yes)
+        store.delete(req["id"])
+        print(f"Deleted: {req['id']}")
     except (FileNotFoundError, KeyError) as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -385,7 +769,68 @@ def cmd_req_delete(args: argparse.Namespace) -> None:
         sys.exit(1)
 
 
+def cmd_db_compact(args: argparse.Namespace) -> None:
+    store = _open_store()
+    try:
+        folded = store.compact()
+        print(f"Compacted storage ({folded} journal byte(s) folded).")
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except OSError as e:
+        print(f"Storage error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def cmd_db_reindex(args: argparse.Namespace) -> None:
+    store = _open_store()
+    try:
+        store.reindex()
+        print("Rebuilt indexes.")
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except OSError as e:
+        print(f"Storage error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def cmd_db_migrate(args: argparse.Namespace) -> None:
+    store = _open_store()
+    try:
+        count = store.migrate(args.to)
+        print(f"Migrated {count} requirement(s) to {args.to} storage.")
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except OSError as e:
+        print(f"Storage error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def cmd_serve(args: argparse.Namespace) -> None:
+    from pofe.http_api import parse_address
+    from pofe.server import serve
+
+    def ready(path: Path, url: str | None) -> None:
+        print(f"Serving {path.parent} on {path}.")
+        if url is not None:
+            print(f"JSON API on {url}/requirements")
+        print("Press Ctrl+C to stop.", flush=True)
+
+    try:
+        http = parse_address(args.http) if args.http is not None else None
+        serve(http=http, on_ready=ready)
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
 def main() -> None:
+    # Choices are spelled out rather than imported, so that parsing the
+    # command line loads nothing but this module.
     parser = argparse.ArgumentParser(prog="pofe")
     sub = parser.add_subparsers(dest="command")
 
@@ -399,6 +844,26 @@ def main() -> None:
 
     tag_sub.add_parser("list", help="List all tags with usage counts.")
 
+    db_parser = sub.add_parser("db", help="Maintain the requirement database.")
+    db_sub = db_parser.add_subparsers(dest="db_command")
+
+    db_sub.add_parser("compact", help="Fold the write-ahead journal into rsdb.json.")
+
+    db_sub.add_parser("reindex", help="Rebuild all lookup indexes from the stored requirements.")
+
+    migrate_parser = db_sub.add_parser("migrate", help="Copy all requirements to another storage backend.")
+    migrate_parser.add_argument("--to", required=True, choices=("json", "journal", "sqlite"), help="Target storage mode.")
+
+    serve_parser = sub.add_parser(
+        "serve",
+        help="Keep the requirement store loaded and answer pofe commands from memory until stopped.",
+    )
+    serve_parser.add_argument(
+        "--http",
+        metavar="[HOST:]PORT",
+        help="Also serve a JSON API over HTTP on this address (no authentication; keep it on 127.0.0.1).",
+    )
+
     rename_parser = tag_sub.add_parser("rename", help="Rename a tag across all requirements.")
     rename_parser.add_argument("old", help="Current tag name.")
     rename_parser.add_argument("new", help="New tag name.")
@@ -413,10 +878,63 @@ def main() -> None:
     list_parser.add_argument("--owner", metavar="USER", help="Filter by owner username.")
     list_parser.add_argument("--status", metavar="STATUS", help="Filter by status value.")
     list_parser.add_argument("--tag", metavar="TAG", help="Filter by tag.")
+    list_parser.add_argument("--since", metavar="TIME", help="Only requirements created at or after TIME (ISO 8601).")
+    list_parser.add_argument("--until", metavar="TIME", help="Only requirements created at or before TIME; a date includes the whole day.")
+    list_parser.add_argument("--updated-since", metavar="TIME", help="Only requirements updated at or after TIME.")
+    list_parser.add_argument("--sort", choices=("created", "updated", "title", "owner"), default="created", help="Sort order (default: created).")
+    list_parser.add_argument("--reverse", action="store_true", help="Reverse the sort order.")
+    list_parser.add_argument("--limit", type=int, metavar="N", help="Show at most N requirements.")
+    list_parser.add_argument("--offset", type=int, default=0, metavar="N", help="Skip the first N requirements.")
+    list_parser.add_argument("--after", metavar="CURSOR", help="Continue after the cursor printed by a previous page.")
     list_parser.add_argument("-o", "--output", metavar="FILE", help="Export results to a file.")
+    list_parser.add_argument(
+        "--as-of", metavar="TIME", help="List the requirements as they were at TIME (ISO 8601; a date means its end)."
+    )
+
+    import_parser = req_sub.add_parser("import", help="Store requirements from markdown files in one commit.")
+    import_parser.add_argument("paths", nargs="+", help="Markdown files, directories or glob patterns.")
+    import_parser.add_argument("--dry-run", action="store_true", help="Validate the files without storing anything.")
+    import_parser.add_argument("-j", "--jobs", type=int, metavar="N", help="Number of parser processes.")
+
+    search_parser = req_sub.add_parser("search", help="Search requirement text, best matches first.")
+    search_parser.add_argument(
+        "query", help='Words, "quoted phrases" and field terms such as title:login or why:latency.'
+    )
+    search_parser.add_argument("--limit", type=int, default=20, metavar="N", help="Show at most N results (default: 20).")
+
+    similar_parser = req_sub.add_parser("similar", help="Show the requirements most similar in text to one.")
+    similar_parser.add_argument("id", help="Requirement ID (full or prefix) or title.")
+    similar_parser.add_argument("--limit", type=int, default=10, metavar="N", help="Show at most N results (default: 10).")
+
+    dedupe_parser = req_sub.add_parser("dedupe", help="Find clusters of requirements that nearly copy each other.")
+    dedupe_parser.add_argument(
+        "--threshold", type=float, metavar="T",
+        help="Least similarity, 0 to 1, for two requirements to count as near-duplicates (default: 0.7).",
+    )
+
+    export_parser = req_sub.add_parser("export", help="Write stored requirements as Markdown, JSONL or CSV.")
+    export_parser.add_argument("--format", choices=("md", "jsonl", "csv"), default="md", help="Output format (default: md).")
+    export_parser.add_argument("--owner", metavar="USER", help="Filter by owner username.")
+    export_parser.add_argument("--status", metavar="STATUS", help="Filter by status value.")
+    export_parser.add_argument("--tag", metavar="TAG", help="Filter by tag.")
+    export_parser.add_argument("-o", "--output", metavar="PATH", help="Output file (default: stdout).")
+    export_parser.add_argument(
+        "--split", action="store_true", help="With --format md, write one <id>.md file per requirement into PATH."
+    )
+    export_parser.add_argument("--as-of", metavar="TIME", help="Export the requirements as they were at TIME (ISO 8601).")
 
     show_parser = req_sub.add_parser("show", help="Display a requirement specification.")
     show_parser.add_argument("id", help="Requirement ID (full or prefix) or title.")
+    show_parser.add_argument("--rev", type=int, metavar="N", help="Show revision N instead of the current one.")
+    show_parser.add_argument("--as-of", metavar="TIME", help="Show the requirement as it was at TIME (ISO 8601).")
+
+    history_parser = req_sub.add_parser("history", help="List the revisions of a requirement.")
+    history_parser.add_argument("id", help="Requirement ID (full or prefix) or title.")
+
+    diff_parser = req_sub.add_parser("diff", help="Show the fields changed between two revisions of a requirement.")
+    diff_parser.add_argument("id", help="Requirement ID (full or prefix) or title.")
+    diff_parser.add_argument("rev1", type=int, nargs="?", help="Older revision (default: the one before REV2).")
+    diff_parser.add_argument("rev2", type=int, nargs="?", help="Newer revision (default: the current one).")
 
     edit_parser = req_sub.add_parser("edit", help="Open editor to modify an existing requirement.")
     edit_parser.add_argument("id", help="Requirement ID (full or prefix) or title.")
@@ -427,6 +945,21 @@ def main() -> None:
 
     related_parser = req_sub.add_parser("related", help="Show related requirements for a given requirement.")
     related_parser.add_argument("id", help="Requirement ID (full or prefix) or title.")
+    related_parser.add_argument(
+        "--depth", type=int, default=1, metavar="N", help="Follow links up to N steps away (default: 1)."
+    )
+    related_parser.add_argument(
+        "--reverse", action="store_true", help="Show the requirements that link to this one instead."
+    )
+
+    graph_parser = req_sub.add_parser("graph", help="Write the graph of related-requirement links as DOT or JSON.")
+    graph_parser.add_argument(
+        "id", nargs="?", help="Only the part around this requirement (ID, prefix or title); default: the whole graph."
+    )
+    graph_parser.add_argument("--depth", type=int, metavar="N", help="With an ID, follow links up to N steps away (default: any).")
+    graph_parser.add_argument("--reverse", action="store_true", help="With an ID, follow links backwards.")
+    graph_parser.add_argument("--format", choices=("dot", "json"), default="dot", help="Output format (default: dot).")
+    graph_parser.add_argument("-o", "--output", metavar="PATH", help="Output file (default: stdout).")
 
     analyze_parser = req_sub.add_parser("analyze", help="Analyze a requirement using AI.")
     analyze_parser.add_argument(
@@ -448,9 +981,26 @@ def main() -> None:
             cmd_tag_delete(args)
         else:
             tag_parser.print_help()
+    elif args.command == "db":
+        if args.db_command == "compact":
+            cmd_db_compact(args)
+        elif args.db_command == "reindex":
+            cmd_db_reindex(args)
+        elif args.db_command == "migrate":
+            cmd_db_migrate(args)
+        else:
+            db_parser.print_help()
+    elif args.command == "serve":
+        cmd_serve(args)
     elif args.command == "req":
         if args.req_command == "create":
             cmd_req_create(args)
+        elif args.req_command == "import":
+            cmd_req_import(args)
+        elif args.req_command == "search":
+            cmd_req_search(args)
+        elif args.req_command == "export":
+            cmd_req_export(args)
         elif args.req_command == "list":
             cmd_req_list(args)
         elif args.req_command == "show":
@@ -461,6 +1011,16 @@ def main() -> None:
             cmd_req_delete(args)
         elif args.req_command == "related":
             cmd_req_related(args)
+        elif args.req_command == "graph":
+            cmd_req_graph(args)
+        elif args.req_command == "history":
+            cmd_req_history(args)
+        elif args.req_command == "diff":
+            cmd_req_diff(args)
+        elif args.req_command == "dedupe":
+            cmd_req_dedupe(args)
+        elif args.req_command == "similar":
+            cmd_req_similar(args)
         elif args.req_command == "analyze":
             cmd_req_analyze(args)
         else:
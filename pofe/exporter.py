@@ -0,0 +1,113 @@
+import csv
+import json
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TextIO
+
+from pofe.requirement_store import format_as_markdown
+
+EXPORT_FORMATS = ("md", "jsonl", "csv")
+
+GRAPH_FORMATS = ("dot", "json")
+
+_CSV_COLUMNS = [
+    ("id", lambda r: r.get("id", "")),
+    ("title", lambda r: r.get("title", "")),
+    ("user", lambda r: r.get("user", "")),
+    ("status", lambda r: r.get("status", "")),
+    ("created_at", lambda r: r.get("created_at", "")),
+    ("updated_at", lambda r: r.get("updated_at", "")),
+    ("tags", lambda r: ", ".join(r.get("tags") or [])),
+    ("why.problem", lambda r: r.get("why", {}).get("problem", "")),
+    ("why.hypothesis", lambda r: r.get("why", {}).get("hypothesis", "")),
+    ("why.expect", lambda r: r.get("why", {}).get("expect", "")),
+    ("what.input", lambda r: r.get("what", {}).get("input", "")),
+    ("what.process", lambda r: r.get("what", {}).get("process", "")),
+    ("what.output", lambda r: r.get("what", {}).get("output", "")),
+    ("how.constraints", lambda r: r.get("how", {}).get("constraints", "")),
+    ("how.approach", lambda r: r.get("how", {}).get("approach", "")),
+    ("how.acceptance_criteria", lambda r: r.get("how", {}).get("acceptance_criteria", "")),
+    # Related titles may contain commas, so they go one per line.
+    ("related_rs", lambda r: "\n".join(r.get("related_rs") or [])),
+]
+
+
+def export_records(records: Iterable[dict], fmt: str, out: TextIO) -> int:
+    """Write requirements to out one at a time in the given format.
+
+    md renders each record with format_as_markdown(), separated by a blank
+    line; jsonl writes each record as one JSON object per line; csv writes
+    a header row and one row per record with nested fields flattened.
+
+    Guarantees: returns the number of records written; memory use does not
+                grow with the number of records.
+    Assumes: fmt is one of EXPORT_FORMATS.
+    Fails: raises OSError on write failure.
+    """
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow([name for name, _ in _CSV_COLUMNS])
+        for record in records:
+            writer.writerow([value(record) for _, value in _CSV_COLUMNS])
+            count += 1
+    elif fmt == "jsonl":
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    else:
+        for record in records:
+            if count:
+                out.write("\n")
+            out.write(format_as_markdown(record) + "\n")
+            count += 1
+    return count
+
+
+def export_markdown_files(records: Iterable[dict], directory: Path) -> int:
+    """Write each requirement to its own <id>.md file in directory.
+
+    Guarantees: returns the number of files written; directory is created
+                if missing; existing files of the same name are replaced.
+    Fails: raises OSError on write failure.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    count = 0
+    for record in records:
+        (directory / f"{record['id']}.md").write_text(format_as_markdown(record) + "\n")
+        count += 1
+    return count
+
+
+def _dot_string(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ") + '"'
+
+
+def write_graph(nodes: list[dict], edges: list[tuple[str, str]], fmt: str, out: TextIO) -> None:
+    """Write a requirement link graph as Graphviz DOT or JSON.
+
+    dot writes a digraph with one node per requirement, labelled with its
+    title, and one edge per link; json writes {"nodes": [...], "edges":
+    [...]} with each node's id, title and status and each edge's from and to.
+
+    Assumes: nodes are summaries, edges (source ID, target ID) pairs between
+             them, as returned by RequirementStore.link_graph(); fmt is one of
+             GRAPH_FORMATS.
+    Fails: raises OSError on write failure.
+    """
+    if fmt == "json":
+        json.dump({
+            "nodes": [
+                {"id": n["id"], "title": n.get("title", ""), "status": n.get("status")} for n in nodes
+            ],
+            "edges": [{"from": source, "to": target} for source, target in edges],
+        }, out, indent=2, ensure_ascii=False)
+        out.write("\n")
+        return
+    out.write("digraph requirements {\n")
+    out.write("  node [shape=box];\n")
+    for n in nodes:
+        out.write(f"  {_dot_string(n['id'])} [label={_dot_string(n.get('title', ''))}];\n")
+    for source, target in edges:
+        out.write(f"  {_dot_string(source)} -> {_dot_string(target)};\n")
+    out.write("}\n")
@@ -0,0 +1,138 @@
+from collections.abc import Iterable
+
+# Every revision numbered 1 modulo this is saved whole, as a checkpoint; the
+# others hold only the fields that changed since the revision before. Any
+# revision is rebuilt from one checkpoint and fewer than this many deltas.
+CHECKPOINT_INTERVAL = 8
+
+# Fields the store maintains itself; a revision does not list them as changes.
+_BOOKKEEPING = ("revision", "updated_at", "related_ids")
+
+
+def flatten(entry: dict) -> dict:
+    """Return a record as {field path: value}, one level of sections deep.
+
+    A non-empty section such as why becomes one path per key ("why.problem");
+    every other value, empty sections included, keeps its top-level name.
+    """
+    flat = {}
+    for key, value in entry.items():
+        if isinstance(value, dict) and value:
+            for sub_key, sub_value in value.items():
+                flat[f"{key}.{sub_key}"] = sub_value
+        else:
+            flat[key] = value
+    return flat
+
+
+def unflatten(flat: dict) -> dict:
+    """Invert flatten()."""
+    entry: dict = {}
+    for path, value in flat.items():
+        key, dot, sub_key = path.partition(".")
+        if dot:
+            entry.setdefault(key, {})[sub_key] = value
+        else:
+            entry[key] = value
+    return entry
+
+
+def changes(old: dict, new: dict) -> list[str]:
+    """Return the field paths whose value differs between two records, in order.
+
+    Guarantees: paths come in new's order, then paths only old has;
+                bookkeeping fields (revision, updated_at,
+                related_ids) are left out.
+    """
+    before, after = flatten(old), flatten(new)
+    paths = [path for path in after if path not in before or before[path] != after[path]]
+    paths += [path for path in before if path not in after]
+    return [path for path in paths if path not in _BOOKKEEPING]
+
+
+def revision_record(old: dict | None, new: dict | None, *, req_id: str, rev: int, at: str) -> dict:
+    """Return the revision log record that turns old into new.
+
+    A checkpoint holds new whole under "full"; a delta holds the changed
+    values under "set" and the removed paths under "unset"; a deletion has
+    "deleted". Every record names its requirement, revision number, time and
+    the changes() it made.
+
+    Assumes: rev is one more than old's revision; new is None only for a
+             deletion; old is None only when rev is a checkpoint.
+    """
+    record = {"id": req_id, "rev": rev, "at": at}
+    if new is None:
+        record["deleted"] = True
+        record["changed"] = []
+        return record
+    record["changed"] = changes(old or {}, new)
+    if old is None or rev % CHECKPOINT_INTERVAL == 1:
+        record["full"] = new
+        return record
+    before, after = flatten(old), flatten(new)
+    record["set"] = {
+        path: value for path, value in after.items() if path not in before or before[path] != value
+    }
+    record["unset"] = [path for path in before if path not in after]
+    return record
+
+
+def is_checkpoint(record: dict) -> bool:
+    return "full" in record
+
+
+def replay(records: Iterable[dict]) -> dict | None:
+    """Rebuild a requirement from a checkpoint and the deltas after it, in order.
+
+    Guarantees: returns the record as of the last revision given, or None
+                if that revision deleted it.
+    Assumes: the first record is a checkpoint.
+    """
+    flat: dict = {}
+    for record in records:
+        if record.get("deleted"):
+            return None
+        if is_checkpoint(record):
+            flat = flatten(record["full"])
+            continue
+        for path in record["unset"]:
+            flat.pop(path, None)
+        flat.update(record["set"])
+    return unflatten(flat)
+
+
+def merge(base: dict | None, mine: dict, theirs: dict) -> tuple[dict, list[tuple[str, object, object, object]]]:
+    """Merge the changes mine made to base into theirs, a later version of base.
+
+    Fields are compared by path (see flatten()). A path mine left as in base
+    takes theirs' value; one only mine changed takes mine's. A list changed
+    on both sides, such as tags, keeps theirs' items less those mine
+    removed, plus those mine added. Any other path changed on both sides to
+    different values is a conflict and keeps theirs' value.
+
+    Guarantees: returns (merged record, conflicts), where conflicts holds
+                (path, base value, mine's value, theirs' value) tuples in
+                mine's order; merged has every field of theirs and only
+                the paths of mine are merged.
+    Assumes: base is None when it is unknown; then every path both sides
+             set differently conflicts.
+    """
+    before, ours, current = flatten(base or {}), flatten(mine), flatten(theirs)
+    merged = dict(current)
+    conflicts = []
+    for path, value in ours.items():
+        original, other = before.get(path), current.get(path)
+        if value == original or value == other:
+            continue
+        if other == original and base is not None:
+            merged[path] = value
+        elif isinstance(value, list) and isinstance(other, list) and base is not None:
+            removed = [item for item in original or [] if item not in value]
+            added = [item for item in value if item not in (original or [])]
+            merged[path] = list(dict.fromkeys(
+                [item for item in other if item not in removed] + added
+            ))
+        else:
+            conflicts.append((path, original, value, other))
+    return unflatten(merged), conflicts
@@ -0,0 +1,322 @@
+import json
+import threading
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from pofe.requirement_store import EditConflict, NearDuplicateWarning, RequirementStore, format_as_markdown
+
+# Listings return this many requirements per page unless asked for another count.
+DEFAULT_PAGE_SIZE = 50
+
+# The largest request body accepted; a requirement document is far smaller.
+MAX_BODY_BYTES = 1 << 20
+
+# The response header carrying RequirementStore.version(). A client that
+# has seen a version can keep every response it got under that version.
+VERSION_HEADER = "Pofe-Store-Version"
+
+
+def parse_address(text: str) -> tuple[str, int]:
+    """Split "[HOST:]PORT" into (host, port); the host defaults to 127.0.0.1.
+
+    Fails: raises ValueError if PORT is not a number from 0 to 65535.
+    """
+    host, _, port = text.rpartition(":")
+    if not port.isdigit() or int(port) > 65535:
+        raise ValueError(f"Invalid address '{text}'. Use HOST:PORT, e.g. 127.0.0.1:8080.")
+    return host or "127.0.0.1", int(port)
+
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str, headers: dict | None = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _record_etag(entry: dict) -> str:
+    # Every write to a requirement counts up its revision.
+    return f'"{entry["id"]}.{entry.get("revision", 1)}"'
+
+
+def _matches(header: str | None, etag: str) -> bool:
+    # Whether an If-None-Match or If-Match header names etag.
+    if header is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _number(query: dict, name: str, default: int, minimum: int) -> int:
+    value = query.get(name)
+    if value is None:
+        return default
+    if not value.isdigit() or int(value) < minimum:
+        raise _HttpError(400, f"'{name}' must be a whole number of at least {minimum}.")
+    return int(value)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests; every response
+    # therefore states its length.
+    protocol_version = "HTTP/1.1"
+    server: "ApiServer"
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def do_PUT(self) -> None:
+        self._dispatch("PUT")
+
+    def do_DELETE(self) -> None:
+        self._dispatch("DELETE")
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # Quiet, like the socket server.
+
+    def _dispatch(self, method: str) -> None:
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        # The body is read first, so the connection stays usable whatever
+        # happens. Without a usable length the body cannot be told from the
+        # next request, so the connection is closed after the reply.
+        raw, refused = b"", None
+        length = self.headers.get("Content-Length") or "0"
+        if not length.strip().isdigit():
+            refused = _HttpError(400, "Content-Length must be a whole number of bytes.")
+        elif int(length) > MAX_BODY_BYTES:
+            refused = _HttpError(413, f"The request body may hold at most {MAX_BODY_BYTES} bytes.")
+        elif int(length) > 0:
+            raw = self.rfile.read(int(length))
+        if refused is not None:
+            self.close_connection = True
+        store = self.server.store
+        with self.server.guard, store.locked():
+            try:
+                if refused is not None:
+                    raise refused
+                status, payload, headers = self._route(method, parts, query, raw)
+            except _HttpError as e:
+                status, payload, headers = e.status, {"error": str(e)}, e.headers
+            except EditConflict as e:
+                status, headers = 409, {}
+                payload = {
+                    "error": str(e),
+                    "revision": e.revision,
+                    "conflicts": [
+                        {"field": path, "base": base, "mine": mine, "theirs": theirs}
+                        for path, base, mine, theirs in e.conflicts
+                    ],
+                }
+            except (FileNotFoundError, KeyError) as e:
+                status, payload, headers = 404, {"error": e.args[0] if e.args else str(e)}, {}
+            except ValueError as e:
+                status, payload, headers = 400, {"error": str(e)}, {}
+            except OSError as e:
+                status, payload, headers = 500, {"error": f"Storage error: {e}"}, {}
+            version = store.version()
+        if method == "GET" and "ETag" in headers and _matches(self.headers.get("If-None-Match"), headers["ETag"]):
+            status = 304
+        body = b"" if status == 304 else json.dumps(payload).encode()
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.send_header(VERSION_HEADER, version)
+        if refused is not None:
+            self.send_header("Connection", "close")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method: str, parts: list[str], query: dict, raw: bytes) -> tuple[int, object, dict]:
+        allowed = None
+        if parts == ["requirements"]:
+            allowed = {"GET": self._list, "POST": self._create}
+        elif len(parts) == 2 and parts[0] == "requirements":
+            allowed = {"GET": self._get, "PUT": self._update, "DELETE": self._delete}
+        elif parts == ["search"]:
+            allowed = {"GET": self._search}
+        elif parts == ["tags"]:
+            allowed = {"GET": self._tags}
+        elif len(parts) == 2 and parts[0] == "tags":
+            allowed = {"DELETE": self._delete_tag}
+        elif len(parts) == 3 and parts[0] == "tags" and parts[2] == "rename":
+            allowed = {"POST": self._rename_tag}
+        if allowed is None:
+            raise _HttpError(404, f"No such resource: {self.path}")
+        if method not in allowed:
+            raise _HttpError(405, f"{method} is not allowed here.", {"Allow": ", ".join(allowed)})
+        body = None
+        if raw:
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                raise _HttpError(400, "The request body is not valid JSON.") from None
+        return allowed[method](parts, query, body)
+
+    @property
+    def _store(self) -> RequirementStore:
+        return self.server.store
+
+    def _listing_etag(self) -> str:
+        # A listing changes only with the store, and its URL names the rest.
+        return f'"{self._store.version()}"'
+
+    def _list(self, parts, query, body):
+        limit = _number(query, "limit", DEFAULT_PAGE_SIZE, 1)
+        sort = query.get("sort", "created")
+        reverse = query.get("reverse", "").lower() in ("1", "true", "yes")
+        try:
+            items = self._store.select(
+                owner=query.get("owner"),
+                status=query.get("status"),
+                tag=query.get("tag"),
+                since=query.get("since"),
+                until=query.get("until"),
+                updated_since=query.get("updated_since"),
+                sort=sort,
+                reverse=reverse,
+                # One row past the page tells whether another page follows.
+                limit=limit + 1,
+                offset=_number(query, "offset", 0, 0),
+                after=query.get("after"),
+                as_of=query.get("as_of"),
+            )
+        except FileNotFoundError:
+            items = []
+        cursor = self._store.page_cursor(items[limit - 1], sort, reverse) if len(items) > limit else None
+        items = items[:limit]
+        return 200, {"items": items, "next": cursor}, {"ETag": self._listing_etag()}
+
+    def _get(self, parts, query, body):
+        entry = self._store.get(parts[1])
+        if "as_of" in query:
+            entry = self._store.revision_at(entry["id"], query["as_of"])
+        elif "rev" in query:
+            entry = self._store.revision(entry["id"], _number(query, "rev", 1, 1))
+        return 200, entry, {"ETag": _record_etag(entry)}
+
+    def _content(self, body) -> str:
+        # A requirement document: given whole as "content", or as the fields
+        # of a record, which are rendered the way `req edit` shows them.
+        if not isinstance(body, dict):
+            raise _HttpError(400, "Send a JSON object with 'content' or the requirement fields.")
+        if "content" in body:
+            return str(body["content"])
+        return format_as_markdown(body)
+
+    def _create(self, parts, query, body):
+        from pofe.user_manager import get_username
+
+        content = self._content(body)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", NearDuplicateWarning)
+            req_id = self._store.append(content, body.get("user") or get_username())
+        entry = self._store.get(req_id)
+        headers = {"ETag": _record_etag(entry), "Location": f"/requirements/{req_id}"}
+        duplicates = [
+            summary["id"] for warning in caught if isinstance(warning.message, NearDuplicateWarning)
+            for summary, _ in warning.message.duplicates
+        ]
+        if duplicates:
+            headers["Pofe-Near-Duplicates"] = ", ".join(duplicates)
+        return 201, entry, headers
+
+    def _base_revision(self, entry: dict) -> int | None:
+        # The revision an If-Match header names, None without one.
+        header = self.headers.get("If-Match")
+        if header is None or header.strip() == "*":
+            return None
+        if not _matches(header, _record_etag(entry)):
+            for tag in header.split(","):
+                req_id, _, rev = tag.strip().removeprefix("W/").strip('"').rpartition(".")
+                if req_id == entry["id"] and rev.isdigit() and 1 <= int(rev) <= entry.get("revision", 1):
+                    return int(rev)
+            raise _HttpError(412, "If-Match names no revision of this requirement.")
+        return entry.get("revision", 1)
+
+    def _update(self, parts, query, body):
+        entry = self._store.get(parts[1])
+        content = self._content(body)
+        self._store.update(entry["id"], content, base_revision=self._base_revision(entry))
+        entry = self._store.get(entry["id"])
+        return 200, entry, {"ETag": _record_etag(entry)}
+
+    def _delete(self, parts, query, body):
+        entry = self._store.get(parts[1])
+        base = self._base_revision(entry)
+        if base is not None and base != entry.get("revision", 1):
+            raise _HttpError(412, f"Requirement {entry['id'][:8]} has changed since revision {base}.")
+        return 200, self._store.delete(entry["id"]), {}
+
+    def _search(self, parts, query, body):
+        if not query.get("q"):
+            raise _HttpError(400, "Give the search terms as 'q'.")
+        try:
+            found = self._store.search(query["q"], limit=_number(query, "limit", 20, 1))
+        except FileNotFoundError:
+            found = []
+        items = [dict(summary, score=score) for summary, score in found]
+        return 200, {"items": items}, {"ETag": self._listing_etag()}
+
+    def _tags(self, parts, query, body):
+        try:
+            tags = self._store.list_tags()
+        except FileNotFoundError:
+            tags = []
+        return 200, {"items": tags}, {"ETag": self._listing_etag()}
+
+    def _rename_tag(self, parts, query, body):
+        if not isinstance(body, dict) or not body.get("name"):
+            raise _HttpError(400, "Send the new tag name as {\"name\": ...}.")
+        return 200, {"count": self._store.rename_tag(parts[1], body["name"])}, {}
+
+    def _delete_tag(self, parts, query, body):
+        return 200, {"count": self._store.delete_tag(parts[1])}, {}
+
+
+class ApiServer(ThreadingHTTPServer):
+    """A JSON API over a RequirementStore, served on HTTP with keep-alive.
+
+    Endpoints:
+        GET    /requirements            summaries, filtered and paged like
+                                        `req list` (owner, status, tag,
+                                        since, until, updated_since, sort,
+                                        reverse, limit, offset, after,
+                                        as_of); "next" is the cursor for
+                                        after, or null on the last page
+        POST   /requirements            create from {"content": markdown}
+                                        or the record fields
+        GET    /requirements/ID         one requirement (ID, prefix or
+                                        title); rev or as_of for a past one
+        PUT    /requirements/ID         replace, like POST
+        DELETE /requirements/ID         delete; returns the record
+        GET    /search?q=TERMS          ranked summaries with a score
+        GET    /tags                    tags with counts
+        POST   /tags/NAME/rename        {"name": new name}
+        DELETE /tags/NAME               remove the tag everywhere
+
+    A requirement's ETag names its ID and revision. PUT or DELETE with
+    If-Match on an earlier revision works like `req edit`: a PUT is merged
+    with the changes made since (409 on a conflict), a DELETE is refused
+    with 412. Listings have the store version as their ETag. A GET whose
+    If-None-Match names the current ETag gets an empty 304. Every response
+    carries the store version in the Pofe-Store-Version header.
+
+    Requests run one at a time on the store, under guard and the write
+    lock. There is no authentication, so bind to a loopback address.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], store: RequirementStore, guard: threading.Lock):
+        self.store = store
+        self.guard = guard
+        super().__init__(address, _Handler)
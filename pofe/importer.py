@@ -0,0 +1,67 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from pofe.requirement_store import parse_requirement
+
+# Below this many files a process pool costs more to start than it saves.
+_POOL_MIN_FILES = 16
+
+
+def expand_paths(patterns: list[str]) -> tuple[list[Path], list[str]]:
+    """Expand files, directories and glob patterns into markdown file paths.
+
+    A directory stands for the *.md files directly inside it. Glob patterns
+    support '**' for recursion.
+
+    Guarantees: returns (paths, unmatched): paths without duplicates in the
+                order first matched, and the patterns that matched no file.
+    """
+    paths: dict[Path, None] = {}
+    unmatched = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(glob.escape(pattern), "*.md")))
+        elif os.path.isfile(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(m for m in glob.glob(pattern, recursive=True) if os.path.isfile(m))
+        if not matches:
+            unmatched.append(pattern)
+        for match in matches:
+            paths.setdefault(Path(match), None)
+    return list(paths), unmatched
+
+
+def _parse_file(path: Path) -> dict:
+    # Runs in a worker process, so it must stay a picklable top-level function.
+    start = time.perf_counter()
+    try:
+        fields = parse_requirement(path.read_text(encoding="utf-8"))
+        error = None
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        fields, error = None, str(e)
+    return {
+        "path": path,
+        "fields": fields,
+        "error": error,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def parse_files(paths: list[Path], workers: int | None = None) -> list[dict]:
+    """Read and parse requirement documents, in parallel when there are many.
+
+    Guarantees: returns one result per path, in the order given, with keys
+                path, fields (the parsed dict, or None), error (the failure
+                message, or None) and seconds (time spent reading and
+                parsing); one bad file never stops the others.
+    Assumes: workers, when given, is positive.
+    """
+    if len(paths) < _POOL_MIN_FILES or workers == 1:
+        return [_parse_file(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunk = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 4))
+        return list(pool.map(_parse_file, paths, chunksize=chunk))
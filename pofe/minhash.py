@@ -0,0 +1,226 @@
+import hashlib
+import json
+import random
+import zlib
+from collections.abc import Iterable
+
+from pofe.search import FIELDS, document_fields
+
+# Bump when the saved layout or the signature scheme changes; older files
+# are then rebuilt.
+_VERSION = 1
+
+# A signature holds one minimum per hash function. It is cut into bands of
+# rows; two requirements become candidates when any band is identical.
+# With 16 bands of 4 rows, a pair with similarity 0.7 is a candidate with
+# probability 0.99, and one with similarity 0.3 with probability 0.12.
+_PERMUTATIONS = 64
+_BANDS = 16
+_ROWS = _PERMUTATIONS // _BANDS
+
+# Text is compared as overlapping runs of this many words.
+_SHINGLE_WORDS = 3
+
+# Hash functions h(x) = (a * x + b) mod p, fixed so signatures stay comparable.
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_HASHES = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(_PERMUTATIONS)]
+del _rng
+
+
+def shingles(entry: dict) -> set[str]:
+    """Return the word shingles of a requirement's normalized text.
+
+    The text is every searchable field (see pofe.search.FIELDS) in order,
+    lowercased and split into words, so formatting and punctuation do not
+    matter.
+    """
+    fields = document_fields(entry)
+    words = [word for name in FIELDS for word in fields.get(name, ())]
+    if len(words) < _SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + _SHINGLE_WORDS]) for i in range(len(words) - _SHINGLE_WORDS + 1)}
+
+
+def signature(entry: dict) -> list[int]:
+    """Return the MinHash signature of a requirement.
+
+    Only the low 32 bits of each minimum are kept, which halves the size of
+    a signature and makes a false match of two positions very unlikely.
+
+    Guarantees: the share of equal positions in two signatures estimates the
+                Jaccard similarity of the two requirements' shingles.
+    """
+    hashed = [zlib.crc32(shingle.encode()) for shingle in shingles(entry)]
+    return [min([(a * h + b) % _PRIME for h in hashed]) & 0xFFFFFFFF for a, b in _HASHES]
+
+
+def similarity(first: list[int], second: list[int]) -> float:
+    """Return the estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(first, second)) / _PERMUTATIONS
+
+
+def band_keys(sig: list[int]) -> list[int]:
+    """Return one bucket key per band of a signature.
+
+    Guarantees: two signatures share a key exactly when (barring a 64-bit
+                hash collision) they agree on every row of that band.
+    """
+    keys = []
+    for band in range(_BANDS):
+        rows = sig[band * _ROWS:(band + 1) * _ROWS]
+        digest = hashlib.blake2b(f"{band}:{rows}".encode(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+def encode(sig: list[int]) -> str:
+    """Return a signature as text, for saving."""
+    return "".join(f"{value:08x}" for value in sig)
+
+
+def decode(text: str) -> list[int]:
+    """Invert encode()."""
+    return [int(text[i:i + 8], 16) for i in range(0, len(text), 8)]
+
+
+def rank_candidates(
+    sig: list[int], candidates: Iterable[tuple[str, list[int]]], threshold: float
+) -> list[tuple[str, float]]:
+    """Keep the candidates whose signature is at least threshold similar to sig.
+
+    Guarantees: returns (req_id, similarity) pairs, most similar first, ties
+                by ID.
+    """
+    scored = [(req_id, similarity(sig, other)) for req_id, other in candidates]
+    return sorted(
+        [(req_id, score) for req_id, score in scored if score >= threshold],
+        key=lambda pair: (-pair[1], pair[0]),
+    )
+
+
+def similar_pairs(
+    buckets: Iterable[list[str]], signatures: dict[str, list[int]], threshold: float
+) -> dict[tuple[str, str], float]:
+    """Score the candidate pairs that share an LSH bucket.
+
+    Guarantees: returns {(id, other_id): similarity} with id < other_id for
+                every pair in a common bucket whose estimated similarity is
+                at least threshold; each pair is scored once.
+    """
+    pairs: dict[tuple[str, str], float] = {}
+    seen: set[tuple[str, str]] = set()
+    for members in buckets:
+        members = sorted(members)
+        for i, req_id in enumerate(members):
+            for other in members[i + 1:]:
+                if (req_id, other) in seen:
+                    continue
+                seen.add((req_id, other))
+                score = similarity(signatures[req_id], signatures[other])
+                if score >= threshold:
+                    pairs[(req_id, other)] = score
+    return pairs
+
+
+class MinHashIndex:
+    """MinHash signatures of all requirements with their LSH buckets.
+
+    Each requirement's signature is kept; the buckets are derived from the
+    signatures on first use. A lookup only compares requirements that share
+    a bucket, so finding near-duplicates never compares all pairs.
+
+    Guarantees: after build() or apply(), the index reflects exactly the
+                records it was given; apply() is idempotent.
+    """
+
+    FILE_SUFFIX = ".json"
+
+    def __init__(self, signatures: dict[str, str]):
+        self._signatures = signatures
+        self._decoded: dict[str, list[int]] = {}
+        # {band key: [ids]}, built on the first lookup and kept current after.
+        self._buckets: dict[int, list[str]] | None = None
+
+    @classmethod
+    def build(cls, records: Iterable[dict]) -> "MinHashIndex":
+        index = cls({})
+        index.apply(records, [])
+        return index
+
+    @classmethod
+    def from_bytes(cls, data: bytes, stamp: list) -> "MinHashIndex | None":
+        """Return the index saved in data, or None if it is unreadable or stale."""
+        try:
+            saved = json.loads(data)
+        except ValueError:
+            return None
+        if saved.get("version") != _VERSION or saved.get("stamp") != stamp:
+            return None
+        return cls(saved["signatures"])
+
+    def to_bytes(self, stamp: list) -> bytes:
+        return json.dumps({
+            "version": _VERSION,
+            "stamp": stamp,
+            "signatures": self._signatures,
+        }, separators=(",", ":")).encode()
+
+    def apply(self, puts: Iterable[dict], deletes: Iterable[str]) -> None:
+        for entry in puts:
+            self._remove(entry["id"])
+            sig = signature(entry)
+            self._signatures[entry["id"]] = encode(sig)
+            self._decoded[entry["id"]] = sig
+            if self._buckets is not None:
+                for key in band_keys(sig):
+                    self._buckets.setdefault(key, []).append(entry["id"])
+        for req_id in deletes:
+            self._remove(req_id)
+
+    def _remove(self, req_id: str) -> None:
+        if req_id not in self._signatures:
+            return
+        if self._buckets is not None:
+            for key in band_keys(self._signature(req_id)):
+                self._buckets[key].remove(req_id)
+                if not self._buckets[key]:
+                    del self._buckets[key]
+        del self._signatures[req_id]
+        self._decoded.pop(req_id, None)
+
+    def _signature(self, req_id: str) -> list[int]:
+        if req_id not in self._decoded:
+            self._decoded[req_id] = decode(self._signatures[req_id])
+        return self._decoded[req_id]
+
+    def _bucket_index(self) -> dict[int, list[str]]:
+        if self._buckets is None:
+            self._buckets = {}
+            for req_id in self._signatures:
+                for key in band_keys(self._signature(req_id)):
+                    self._buckets.setdefault(key, []).append(req_id)
+        return self._buckets
+
+    def near_duplicates(self, entry: dict, threshold: float) -> list[tuple[str, float]]:
+        """Return stored requirements whose text nearly equals entry's.
+
+        Guarantees: returns (req_id, similarity) pairs with similarity of at
+                    least threshold, most similar first; never entry's ID.
+        """
+        sig = signature(entry)
+        buckets = self._bucket_index()
+        candidates = {
+            req_id for key in band_keys(sig) for req_id in buckets.get(key, ())
+        } - {entry.get("id")}
+        return rank_candidates(
+            sig, ((req_id, self._signature(req_id)) for req_id in candidates), threshold
+        )
+
+    def similar_pairs(self, threshold: float) -> dict[tuple[str, str], float]:
+        """Return every near-duplicate pair; see similar_pairs()."""
+        buckets = [ids for ids in self._bucket_index().values() if len(ids) > 1]
+        involved = {req_id for ids in buckets for req_id in ids}
+        return similar_pairs(
+            buckets, {req_id: self._signature(req_id) for req_id in involved}, threshold
+        )
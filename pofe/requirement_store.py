@@ -1,8 +1,71 @@
+import base64
 import hashlib
+import heapq
 import json
+import os
 import re
-from datetime import datetime, timezone
+import warnings
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import wraps
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+from pofe.catalog import Catalog, link_targets, timestamp_us, title_key
+from pofe.history import changes, flatten, merge, replay, revision_record
+from pofe.storage import RevisionLog, migrate_storage, open_storage, read_config
+
+if TYPE_CHECKING:
+    from pofe.server import RemoteStore
+
+_MIN_SHORT_ID = 4
+
+# Fuzzy title matching: the least trigram similarity (0..1) a title needs to
+# be suggested, and how many suggestions to offer at most.
+_FUZZY_THRESHOLD = 0.3
+_FUZZY_LIMIT = 5
+
+# The least estimated share of common word shingles (0..1) at which two
+# requirements count as near-duplicates.
+DUPLICATE_THRESHOLD = 0.7
+
+
+class NearDuplicateWarning(UserWarning):
+    """Issued by RequirementStore.append when the new requirement nearly copies others.
+
+    duplicates holds (summary, similarity) pairs, most similar first.
+    """
+
+    def __init__(self, title: str, duplicates: list[tuple[dict, float]]):
+        self.duplicates = duplicates
+        closest, score = duplicates[0]
+        super().__init__(
+            f"'{title}' looks like a near-duplicate of '{closest.get('title', '')}'"
+            f" [{closest['id'][:8]}] (similarity {score:.2f})."
+        )
+
+
+class EditConflict(Exception):
+    """Raised by RequirementStore.update when an edit overlaps a concurrent change.
+
+    The requirement changed since the revision the edit started from, and
+    both changed some field to different values. revision is the current
+    revision; merged holds the editable fields with every change that did
+    merge, and the current value of each conflicting field; conflicts holds
+    (field path, base value, edited value, current value) tuples. Resolve
+    the conflicts in merged and update again from revision.
+    """
+
+    def __init__(self, req_id: str, revision: int, merged: dict, conflicts: list[tuple[str, object, object, object]]):
+        self.revision = revision
+        self.merged = merged
+        self.conflicts = conflicts
+        paths = ", ".join(path for path, *_ in conflicts)
+        super().__init__(
+            f"Requirement {req_id[:8]} was changed while it was being edited (now revision"
+            f" {revision}); both changed {paths}."
+        )
 
 
 def _find_pofe_dir() -> Path:
@@ -18,92 +81,126 @@ def _generate_id(timestamp: str, username: str) -> str:
     return hashlib.sha256(raw).hexdigest()
 
 
-def _extract_bullet(text: str, label: str) -> str:
-    match = re.search(rf"- {re.escape(label)}:[ \t]*([^\n]*)", text)
-    if not match:
-        return ""
-
-    inline = match.group(1).strip()
-    if inline:
-        return inline
-
-    # No inline value — collect immediately following indented sub-list items.
-    sub_items = []
-    for line in text[match.end():].split("\n"):
-        if not line.strip():
+# Markdown parsing. A requirement document is read in one pass over its
+# lines; the patterns below are compiled once, at import.
+_SECTION_FIELDS = {
+    "Why": {"Problem": "problem", "Hypothesis": "hypothesis", "Expect": "expect"},
+    "What": {"Input": "input", "Process": "process", "Output": "output"},
+    "How": {
+        "Constraints": "constraints",
+        "Approach": "approach",
+        "Acceptance Criteria": "acceptance_criteria",
+    },
+}
+_LABEL_SECTION = {label: name for name, fields in _SECTION_FIELDS.items() for label in fields}
+_RELATED_SECTION = "Related RS"
+_BULLET = re.compile(
+    r"- (Tags|%s):[ \t]*([^\n]*)"
+    % "|".join(re.escape(label) for fields in _SECTION_FIELDS.values() for label in fields)
+)
+_SECTION_HEADING = re.compile(
+    r"## (%s)\Z" % "|".join(re.escape(name) for name in [*_SECTION_FIELDS, _RELATED_SECTION])
+)
+_SUB_ITEM = re.compile(r"[ \t]+-[ \t]*")
+
+
+def parse_requirement(content: str) -> dict:
+    """Parse a requirement markdown document into a requirement dict.
+
+    The document is scanned once. The title is the first '# ' heading; the
+    Why/What/How/Related RS sections are the first '## ' heading of that
+    name and run to the next '## ' heading. A bullet's value is its inline
+    text or, when that is empty, the indented sub-items that follow it.
+    Only the first bullet of each label counts; '- Tags:' may appear
+    anywhere in the document.
+
+    Guarantees: returns a dict with title, why, what, how, tags (lowercased,
+                de-duplicated, in order) and related_rs (non-empty titles).
+    Fails:      raises ValueError naming every missing field, title first and
+                then the section fields in document order.
+    """
+    title = ""
+    title_pending = False
+    active: set[str] = set()
+    just_opened: set[str] = set()
+    seen_sections: set[str] = set()
+    values: dict[tuple[str, str], str] = {}
+    collecting: list[tuple[tuple[str, str], list[str]]] = []
+    related: list[str] = []
+
+    for line in content.split("\n"):
+        if collecting and line.strip():
+            sub_item = _SUB_ITEM.match(line)
+            if sub_item:
+                for _, items in collecting:
+                    items.append(line[sub_item.end():])
+            else:
+                for key, items in collecting:
+                    values[key] = "\n".join(items)
+                collecting = []
+
+        if not title:
+            if title_pending:
+                title = line.strip()
+            elif line.startswith("#") and (len(line) == 1 or line[1].isspace()):
+                # A bare '#' takes its title from the next non-blank line.
+                title = line[1:].strip()
+                title_pending = not title
+
+        # Any '## ' line ends the open sections, except one whose heading is
+        # the line just above: a section's body starts after its heading.
+        if line.startswith("## "):
+            active = just_opened
+        just_opened = set()
+        heading = _SECTION_HEADING.search(line)
+        if heading and heading.group(1) not in seen_sections:
+            seen_sections.add(heading.group(1))
+            active = active | {heading.group(1)}
+            just_opened = {heading.group(1)}
+
+        if _RELATED_SECTION in active:
+            stripped = line.strip()
+            if stripped.startswith("- ") and stripped[2:].strip():
+                related.append(stripped[2:].strip())
+
+        bullet = _BULLET.search(line)
+        if not bullet:
             continue
-        if re.match(r"^[ \t]+-", line):
-            sub_items.append(re.sub(r"^[ \t]+-[ \t]*", "", line))
+        label, inline = bullet.groups()
+        if label == "Tags":
+            key = ("", label)
+        elif _LABEL_SECTION[label] in active:
+            key = (_LABEL_SECTION[label], label)
         else:
-            break
-
-    return "\n".join(sub_items)
-
-
-def _parse_related_rs(content: str) -> list[str]:
-    """Extract related requirement titles from the '## Related RS' section.
-
-    Guarantees: returns a list of non-empty title strings; returns [] if the
-                section is absent or contains no valid bullet items.
-    """
-    m = re.search(r"## Related RS\n(.*?)(?=\n## |\Z)", content, re.DOTALL)
-    if not m:
-        return []
-    items = []
-    for line in m.group(1).splitlines():
-        stripped = line.strip()
-        if stripped.startswith("- "):
-            title = stripped[2:].strip()
-            if title:
-                items.append(title)
-    return items
-
-
-def _parse(content: str) -> dict:
-    title_match = re.search(r"^#\s+(.+)$", content, re.MULTILINE)
-    title = title_match.group(1).strip() if title_match else ""
-
-    def section(name: str) -> str:
-        m = re.search(rf"## {re.escape(name)}\n(.*?)(?=\n## |\Z)", content, re.DOTALL)
-        return m.group(1) if m else ""
+            continue
+        if key in values or any(key == k for k, _ in collecting):
+            continue
+        if inline.strip():
+            values[key] = inline.strip()
+        else:
+            collecting.append((key, []))
 
-    why = section("Why")
-    what = section("What")
-    how = section("How")
+    for key, items in collecting:
+        values[key] = "\n".join(items)
 
-    raw_tags = _extract_bullet(content, "Tags")
     tags = list(dict.fromkeys(
-        t.strip().lower() for t in raw_tags.split(",") if t.strip()
+        t.strip().lower() for t in values.get(("", "Tags"), "").split(",") if t.strip()
     ))
-
-    fields = {
-        "title": title,
-        "why": {
-            "problem": _extract_bullet(why, "Problem"),
-            "hypothesis": _extract_bullet(why, "Hypothesis"),
-            "expect": _extract_bullet(why, "Expect"),
-        },
-        "what": {
-            "input": _extract_bullet(what, "Input"),
-            "process": _extract_bullet(what, "Process"),
-            "output": _extract_bullet(what, "Output"),
-        },
-        "how": {
-            "constraints": _extract_bullet(how, "Constraints"),
-            "approach": _extract_bullet(how, "Approach"),
-            "acceptance_criteria": _extract_bullet(how, "Acceptance Criteria"),
-        },
-        "tags": tags,
-        "related_rs": _parse_related_rs(content),
-    }
+    fields = {"title": title}
+    for name, labels in _SECTION_FIELDS.items():
+        fields[name.lower()] = {
+            key: values.get((name, label), "") for label, key in labels.items()
+        }
+    fields["tags"] = tags
+    fields["related_rs"] = related
 
     missing = []
     if not fields["title"]:
         missing.append("title")
-    for section, section_fields in [("why", fields["why"]), ("what", fields["what"]), ("how", fields["how"])]:
-        for key, value in section_fields.items():
+    for name in _SECTION_FIELDS:
+        for key, value in fields[name.lower()].items():
             if not value:
-                missing.append(f"{section}.{key}")
+                missing.append(f"{name.lower()}.{key}")
 
     if missing:
         raise ValueError(f"Incomplete fields: {', '.join(missing)}")
@@ -111,91 +208,51 @@ def _parse(content: str) -> dict:
     return fields
 
 
-def append_requirement(content: str, username: str) -> str:
-    """Parse, validate, and store a new requirement from editor content.
-
-    Guarantees: returns a unique 64-char hex ID; entry is written to rsdb.json.
-    Assumes: .pofe directory exists in a parent path; username is non-empty.
-    Fails: raises ValueError if required template fields are missing;
-           raises OSError on file write failure.
-    """
-    pofe_dir = _find_pofe_dir()
-    data_dir = pofe_dir / "data"
-    data_dir.mkdir(exist_ok=True)
-    rsdb_path = data_dir / "rsdb.json"
-
-    fields = _parse(content)
-    now = datetime.now(timezone.utc).isoformat()
-    req_id = _generate_id(now, username)
-
-    entry = {
-        "id": req_id,
+def _new_entry(fields: dict, username: str, created: datetime) -> dict:
+    now = created.isoformat()
+    return {
+        "id": _generate_id(now, username),
         "title": fields["title"],
         "why": fields["why"],
         "what": fields["what"],
         "how": fields["how"],
         "tags": fields["tags"],
         "related_rs": fields["related_rs"],
+        "related_ids": [],
         "created_at": now,
         "updated_at": now,
         "user": username,
         "qna": [],
     }
 
-    db: dict = {}
-    if rsdb_path.exists():
-        with open(rsdb_path) as f:
-            db = json.load(f)
-
-    db[req_id] = entry
-
-    with open(rsdb_path, "w") as f:
-        json.dump(db, f, indent=2)
-
-    return req_id
-
-
-def get_requirement(id_or_title: str) -> dict:
-    """Retrieve a stored requirement by ID (full or prefix) or by exact title.
-
-    Guarantees: returns the matching requirement dict.
-    Assumes: rsdb.json exists.
-    Fails: raises FileNotFoundError if rsdb.json is missing;
-           raises KeyError if no match or ambiguous prefix/title.
-    """
-    rsdb_path = _find_pofe_dir() / "data" / "rsdb.json"
-    if not rsdb_path.exists():
-        raise FileNotFoundError("rsdb.json not found. No requirements stored.")
-
-    with open(rsdb_path) as f:
-        db = json.load(f)
 
-    # Exact ID match
-    if id_or_title in db:
-        return db[id_or_title]
+def _revision_of(entry: dict) -> int:
+    # Entries written before revisions were counted are revision 1.
+    return entry.get("revision", 1)
 
-    # Prefix ID match
-    id_matches = [v for k, v in db.items() if k.startswith(id_or_title)]
-    if len(id_matches) == 1:
-        return id_matches[0]
-    if len(id_matches) > 1:
-        raise KeyError(f"Ambiguous ID prefix '{id_or_title}': matches {len(id_matches)} requirements.")
 
-    # Substring ID match
-    sub_matches = [v for k, v in db.items() if id_or_title in k]
-    if len(sub_matches) == 1:
-        return sub_matches[0]
-    if len(sub_matches) > 1:
-        raise KeyError(f"Ambiguous partial ID '{id_or_title}': matches {len(sub_matches)} requirements.")
+def _legacy_checkpoint(old: dict | None) -> list[dict]:
+    # An entry written before revisions were logged has none in the log yet;
+    # its first change logs it as revision 1, for the next one to build on.
+    if old is None or "revision" in old:
+        return []
+    return [revision_record(None, old, req_id=old["id"], rev=1, at=old.get("updated_at", ""))]
 
-    # Title match (case-insensitive)
-    title_matches = [v for v in db.values() if v.get("title", "").lower() == id_or_title.lower()]
-    if len(title_matches) == 1:
-        return title_matches[0]
-    if len(title_matches) > 1:
-        raise KeyError(f"Ambiguous title '{id_or_title}': matches {len(title_matches)} requirements.")
 
-    raise KeyError(f"No requirement found for '{id_or_title}'.")
+def _follow_rename(entry: dict, target_id: str, old_key: str | None, new_title: str) -> bool:
+    # Show new_title for entry's links to target_id, and for its unresolved
+    # links with title key old_key, which led there too; return whether any did.
+    titles = list(entry.get("related_rs") or [])
+    ids = []
+    for i, (target, key) in enumerate(link_targets(entry)):
+        if target == target_id or (target is None and key == old_key):
+            titles[i] = new_title
+            target = target_id
+        ids.append(target)
+    changed = titles != entry.get("related_rs")
+    entry["related_rs"] = titles
+    entry["related_ids"] = ids
+    return changed
 
 
 def format_as_markdown(req: dict) -> str:
@@ -234,318 +291,1090 @@ def format_as_markdown(req: dict) -> str:
     return "\n".join(lines)
 
 
-def list_requirements(
-    *,
-    owner: str | None = None,
-    status: str | None = None,
-    tag: str | None = None,
-) -> list[dict]:
-    """Return all stored requirements, optionally filtered.
-
-    Guarantees: returns a list sorted by created_at descending; never raises on
-                missing optional fields (status, tags) – those records are simply
-                excluded when the filter is specified.
-    Assumes: .pofe directory exists.
-    Fails: raises FileNotFoundError if rsdb.json is missing.
-    """
-    rsdb_path = _find_pofe_dir() / "data" / "rsdb.json"
-    if not rsdb_path.exists():
-        raise FileNotFoundError("rsdb.json not found. No requirements stored.")
-
-    with open(rsdb_path) as f:
-        db = json.load(f)
-
-    results = list(db.values())
-
-    if owner is not None:
-        results = [r for r in results if r.get("user", "").lower() == owner.lower()]
-    if status is not None:
-        results = [r for r in results if r.get("status", "").lower() == status.lower()]
-    if tag is not None:
-        tag_lower = tag.lower()
-        results = [
-            r for r in results
-            if tag_lower in [t.lower() for t in r.get("tags", [])]
-        ]
-
-    results.sort(key=lambda r: r.get("created_at", ""), reverse=True)
-    return results
-
-
-def update_requirement(req_id: str, content: str) -> None:
-    """Parse, validate, and overwrite an existing requirement by ID.
-
-    Guarantees: the entry in rsdb.json is updated in place; updated_at is refreshed.
-    Assumes: .pofe directory exists; req_id is the full 64-char ID.
-    Fails: raises ValueError if required template fields are missing;
-           raises FileNotFoundError if rsdb.json is missing;
-           raises KeyError if req_id is not found;
-           raises OSError on write failure.
+# Listing orders for RequirementStore.select(); the values are ascending keys.
+_SORT_KEYS = {
+    "created": lambda r: r.get("created_at", ""),
+    "updated": lambda r: r.get("updated_at", ""),
+    "title": lambda r: title_key(r.get("title", "")),
+    "owner": lambda r: r.get("user", "").lower(),
+}
+SORT_FIELDS = tuple(_SORT_KEYS)
+_NEWEST_FIRST = {"created", "updated"}
+
+
+def _sort_key(sort: str):
+    field_key = _SORT_KEYS[sort]
+    return lambda r: (field_key(r), r["id"])
+
+
+_BARE_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_DAY_US = 24 * 60 * 60 * 1_000_000
+
+
+def _time_bound(text: str, *, end_of: bool = False) -> int:
+    # Microseconds for a user-given time. With end_of, the first instant
+    # after it: the next day for a bare date, else the next microsecond.
+    moment = timestamp_us(text)
+    if moment is None:
+        raise ValueError(f"Invalid time '{text}'. Use an ISO 8601 date or timestamp, e.g. 2026-01-31.")
+    if not end_of:
+        return moment
+    return moment + (_DAY_US if _BARE_DATE.fullmatch(text) else 1)
+
+
+def _decode_cursor(cursor: str, sort: str, descending: bool) -> tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_descending, value, req_id = json.loads(raw)
+        if not all(isinstance(part, str) for part in (cursor_sort, value, req_id)):
+            raise ValueError(cursor)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor '{cursor}'.") from None
+    if (cursor_sort, cursor_descending) != (sort, descending):
+        raise ValueError("The cursor was made for a different sort order.")
+    return value, req_id
+
+
+def _write_locked(method):
+    # Runs a mutating store method under the storage's write lock, so the
+    # records it reads cannot change before it commits.
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._storage.locked():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class RequirementStore:
+    """All requirement operations over the storage selected in config.json.
+
+    The store owns the requirement rules: parsing, ID generation, timestamps,
+    ID/title resolution and tag maintenance. The storage it wraps (see
+    pofe.storage) owns persistence and answers the lookups. The json and
+    journal storages load the database once, on first use; the sqlite storage
+    answers each lookup from its indexes. Each mutating method commits to
+    storage exactly once. Callers that perform several operations in one
+    process should share one store (see open_store).
+
+    Links in related_rs are resolved when a requirement is written: each
+    title is stored with the ID of the one requirement that has it, in
+    related_ids. Renaming or deleting a requirement rewrites the entries
+    linking to it in the same commit, so a link never goes stale. A title
+    that matched no single requirement stays unresolved and is looked up by
+    title whenever it is followed.
+
+    Setting "unique_titles": true in .pofe/config.json makes append() and
+    update() reject a title that another requirement already has, compared
+    case-insensitively, so title lookups stay unambiguous.
+
+    Every mutating method holds the storage's write lock (see
+    JsonStorage.locked()) from its first read to its commit, so several
+    processes can write to one database at once without losing changes.
+
+    Guarantees: reads reflect every write made through this store, and
+                mutating methods see every write committed before them.
+    Fails: read methods raise FileNotFoundError if nothing has been stored yet;
+           mutating methods raise OSError on write failure.
     """
-    rsdb_path = _find_pofe_dir() / "data" / "rsdb.json"
 
-    if not rsdb_path.exists():
-        raise FileNotFoundError("rsdb.json not found. No requirements stored.")
+    def __init__(self, pofe_dir: Path):
+        self._pofe_dir = pofe_dir
+        self._storage = open_storage(pofe_dir)
+        self._history = RevisionLog(pofe_dir / "data")
+        self._unique_titles = bool(read_config(pofe_dir).get("unique_titles", False))
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the storage's write lock across several operations.
+
+        Reads in the block see every write committed before it, also by other
+        processes, and in json mode the writes in it share one snapshot
+        rewrite (see JsonStorage.locked()).
+        """
+        with self._storage.locked():
+            yield
+
+    def version(self) -> str:
+        """Return an opaque token for the state of every stored requirement.
+
+        Guarantees: the token changes whenever any requirement is written,
+                    by this process or another; it may also change when
+                    none did, such as when the journal is folded.
+        """
+        return self._storage.version()
+
+    def _check_title_free(self, title: str, req_id: str = "") -> None:
+        if not self._unique_titles or not self._storage.exists():
+            return
+        others = [other for other in self._storage.ids_with_title(title) if other != req_id]
+        if others:
+            raise ValueError(f"Title '{title}' is already used by requirement {others[0][:8]}.")
+
+    def _resolve_titles(
+        self, titles: list[str], known: dict[str, str] | None = None, batch: dict[str, list[str]] | None = None
+    ) -> list[str | None]:
+        # The ID each title leads to: known[title key] if given, else the one
+        # requirement, stored or in batch ({title key: [ids]}), with that title.
+        stored = self._storage.exists()
+        ids = []
+        for title in titles:
+            key = title_key(title)
+            if known and key in known:
+                ids.append(known[key])
+                continue
+            matches = (self._storage.ids_with_title(title) if stored else []) + (batch or {}).get(key, [])
+            ids.append(matches[0] if len(matches) == 1 else None)
+        return ids
+
+    def _commit(self, puts: list[tuple[dict | None, dict]], deletes: list[dict], *, at: str) -> None:
+        # Store each (previous version or None, new version) pair and remove
+        # each deleted entry, logging one revision for each first.
+        records = []
+        for old, new in puts:
+            records += _legacy_checkpoint(old)
+            new["revision"] = _revision_of(old) + 1 if old is not None else 1
+            records.append(revision_record(old, new, req_id=new["id"], rev=new["revision"], at=at))
+        for old in deletes:
+            records += _legacy_checkpoint(old)
+            records.append(revision_record(old, None, req_id=old["id"], rev=_revision_of(old) + 1, at=at))
+        self._history.append(records)
+        self._storage.commit([new for _, new in puts], [old["id"] for old in deletes])
+
+    def _require(self, req_id: str) -> dict:
+        entry = self._storage.get(req_id)
+        if entry is None:
+            raise KeyError(f"Requirement '{req_id}' not found.")
+        return entry
+
+    @_write_locked
+    def compact(self) -> int:
+        """Fold pending journal records into a new snapshot.
+
+        Guarantees: returns the journal size in bytes that was folded; the
+                    store contents are unchanged.
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises OSError on write failure.
+        """
+        if not self._storage.exists():
+            raise FileNotFoundError("rsdb.json not found. No requirements stored.")
+        return self._storage.compact()
+
+    @_write_locked
+    def reindex(self) -> None:
+        """Rebuild every derived index from the stored records.
+
+        Guarantees: the store contents are unchanged; lookups afterwards use
+                    freshly built indexes.
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises OSError on write failure.
+        """
+        if not self._storage.exists():
+            raise FileNotFoundError("rsdb.json not found. No requirements stored.")
+        self._storage.reindex()
+
+    @_write_locked
+    def append(self, content: str, username: str) -> str:
+        """Parse, validate, and store a new requirement from editor content.
+
+        Guarantees: returns a unique 64-char hex ID; the entry is committed;
+                    issues a NearDuplicateWarning when stored requirements
+                    nearly copy the new one (see near_duplicates()).
+        Assumes: username is non-empty.
+        Fails: raises ValueError if required template fields are missing or
+               the title is taken while unique titles are enforced;
+               raises OSError on write failure.
+        """
+        fields = parse_requirement(content)
+        self._check_title_free(fields["title"])
+        entry = _new_entry(fields, username, datetime.now(timezone.utc))
+        entry["related_ids"] = self._resolve_titles(entry["related_rs"])
+        self._commit([(None, entry)], [], at=entry["created_at"])
+        duplicates = self.near_duplicates(entry)
+        if duplicates:
+            warnings.warn(NearDuplicateWarning(entry["title"], duplicates), stacklevel=2)
+        return entry["id"]
+
+    @_write_locked
+    def append_many(self, documents: list[dict], username: str, *, dry_run: bool = False) -> list[str]:
+        """Store several parsed requirements in one commit.
+
+        Each requirement gets its own creation time, one microsecond apart in
+        the order given, so IDs stay distinct and listings keep that order.
+
+        Guarantees: returns the new IDs in the order of documents; either all
+                    of them are committed or none is; with dry_run nothing
+                    is written; related_rs titles may name requirements of
+                    the same batch.
+        Assumes: documents are dicts returned by parse_requirement();
+                 username is non-empty.
+        Fails: raises ValueError listing every title that is taken, or
+               repeated within documents, while unique titles are enforced;
+               raises OSError on write failure.
+        """
+        if self._unique_titles:
+            conflicts = []
+            seen: set[str] = set()
+            for fields in documents:
+                try:
+                    self._check_title_free(fields["title"])
+                except ValueError as e:
+                    conflicts.append(str(e))
+                if title_key(fields["title"]) in seen:
+                    conflicts.append(f"Title '{fields['title']}' appears more than once.")
+                seen.add(title_key(fields["title"]))
+            if conflicts:
+                raise ValueError("\n".join(conflicts))
+
+        start = datetime.now(timezone.utc)
+        entries = [
+            _new_entry(fields, username, start + timedelta(microseconds=i))
+            for i, fields in enumerate(documents)
+        ]
+        batch: dict[str, list[str]] = {}
+        for entry in entries:
+            batch.setdefault(title_key(entry["title"]), []).append(entry["id"])
+        for entry in entries:
+            entry["related_ids"] = self._resolve_titles(entry["related_rs"], batch=batch)
+        if entries and not dry_run:
+            self._commit([(None, entry) for entry in entries], [], at=start.isoformat())
+        return [entry["id"] for entry in entries]
+
+    def _match(self, id_or_title: str) -> tuple[str, list[str]]:
+        # Resolution order: exact ID, ID prefix, ID substring, title.
+        # Returns the first stage that matched anything, with its IDs.
+        id_matches = self._storage.ids_with_prefix(id_or_title)
+        if id_or_title in id_matches:
+            return "id", [id_or_title]
+        if id_matches:
+            return "prefix", id_matches
+        sub_matches = self._storage.ids_containing(id_or_title)
+        if sub_matches:
+            return "partial", sub_matches
+        title_matches = self._storage.ids_with_title(id_or_title)
+        if title_matches:
+            return "title", title_matches
+        return "", []
+
+    def get(self, id_or_title: str) -> dict:
+        """Retrieve a stored requirement by ID (full, prefix or substring) or by title.
+
+        Guarantees: returns the matching requirement dict.
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises KeyError if no match or ambiguous prefix/title.
+        """
+        stage, ids = self._match(id_or_title)
+        if len(ids) == 1:
+            return self._require(ids[0])
+        if stage == "prefix":
+            raise KeyError(f"Ambiguous ID prefix '{id_or_title}': matches {len(ids)} requirements.")
+        if stage == "partial":
+            raise KeyError(f"Ambiguous partial ID '{id_or_title}': matches {len(ids)} requirements.")
+        if stage == "title":
+            raise KeyError(f"Ambiguous title '{id_or_title}': matches {len(ids)} requirements.")
+        raise KeyError(f"No requirement found for '{id_or_title}'.")
+
+    def candidates(self, id_or_title: str) -> list[dict]:
+        """Return every requirement that id_or_title could refer to.
+
+        Uses the same resolution order as get(), so for an ambiguous input
+        this lists exactly the requirements get() found ambiguous. When
+        nothing matches that way, falls back to titles that look like
+        id_or_title, so a typo still finds what was meant. Similarity is
+        measured on shared character trigrams, looked up in an index rather
+        than compared against every title.
+
+        Guarantees: returns summaries (see select()); exact matches sorted by
+                    created_at descending, fuzzy ones most similar first;
+                    returns [] when nothing matches.
+        Fails: raises FileNotFoundError if nothing has been stored yet.
+        """
+        _, ids = self._match(id_or_title)
+        if not ids:
+            similar = self._storage.similar_titles(
+                id_or_title, threshold=_FUZZY_THRESHOLD, limit=_FUZZY_LIMIT
+            )
+            by_id = {r["id"]: r for r in self._storage.summaries(i for i, _ in similar)}
+            return [by_id[req_id] for req_id, _ in similar]
+        matches = self._storage.summaries(ids)
+        matches.sort(key=lambda r: r.get("created_at", ""), reverse=True)
+        return matches
+
+    def short_ids(self, ids: list[str]) -> dict[str, str]:
+        """Return the shortest prefix of each ID that resolves to it alone.
+
+        A prefix is never shorter than four characters, as with git.
+
+        Guarantees: each returned prefix passed to get() resolves to its ID
+                    for as long as no new ID sharing that prefix is stored.
+        Fails: raises FileNotFoundError if nothing has been stored yet.
+        """
+        short = {}
+        for req_id in ids:
+            length = _MIN_SHORT_ID
+            for neighbour in self._storage.id_neighbours(req_id):
+                if neighbour is not None:
+                    length = max(length, len(os.path.commonprefix([req_id, neighbour])) + 1)
+            short[req_id] = req_id[:length]
+        return short
+
+    def select(
+        self,
+        *,
+        owner: str | None = None,
+        status: str | None = None,
+        tag: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        updated_since: str | None = None,
+        sort: str = "created",
+        reverse: bool = False,
+        limit: int | None = None,
+        offset: int = 0,
+        after: str | None = None,
+        as_of: str | None = None,
+    ) -> list[dict]:
+        """Return the summary of every stored requirement, optionally filtered.
+
+        A summary holds only the listing fields (id, title, user, status,
+        created_at, updated_at, tags, revision), read from a projection kept
+        up to date on every write; use get() for the full requirement.
+        Filters compare case-insensitively.
+
+        With as_of, an ISO 8601 date or timestamp, the requirements are
+        those that existed at that moment, as they were then (see
+        records_at()); a bare date means the end of that day.
+
+        since, until and updated_since are ISO 8601 dates or timestamps
+        (naive ones are UTC). They keep requirements created at or after
+        since, created at or before until (a bare date includes that whole
+        day) and updated at or after updated_since. Time filters are
+        bisections of sorted time indexes, not scans.
+
+        Results are ordered by sort (one of SORT_FIELDS): newest first for
+        created and updated, alphabetical for title and owner; reverse flips
+        the order. Ties are broken by ID, so the order is total. A page is
+        picked with a bounded heap rather than a full sort: after (a cursor
+        from page_cursor()) skips everything up to and including the row it
+        was made from, then offset more rows are skipped and at most limit
+        are returned.
+
+        Guarantees: returns summaries in the requested order; records missing
+                    an optional field (status, tags) are excluded when that
+                    filter is specified.
+        Assumes: limit and offset, when given, are not negative.
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises ValueError for an unknown sort field, an unreadable
+               time, or a cursor that is malformed or was made for a
+               different order.
+        """
+        if sort not in _SORT_KEYS:
+            raise ValueError(f"Unknown sort field '{sort}'. Choose from: {', '.join(SORT_FIELDS)}.")
+        descending = (sort in _NEWEST_FIRST) != reverse
+        key = _sort_key(sort)
+        created = None
+        if since is not None or until is not None:
+            created = (
+                _time_bound(since) if since is not None else None,
+                _time_bound(until, end_of=True) if until is not None else None,
+            )
+        updated = (_time_bound(updated_since), None) if updated_since is not None else None
+        source = Catalog.build(self.records_at(as_of)) if as_of is not None else self._storage
+        rows = source.select(owner=owner, status=status, tag=tag, created=created, updated=updated)
+
+        if after is not None:
+            position = _decode_cursor(after, sort, descending)
+            if descending:
+                rows = [r for r in rows if key(r) < position]
+            else:
+                rows = [r for r in rows if key(r) > position]
+
+        if limit is None:
+            rows.sort(key=key, reverse=descending)
+        else:
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            rows = pick(offset + limit, rows, key=key)
+        return rows[offset:]
+
+    @staticmethod
+    def page_cursor(summary: dict, sort: str = "created", reverse: bool = False) -> str:
+        """Return an opaque cursor that makes select() continue after summary.
+
+        Guarantees: passing the cursor as select(after=...) with the same sort
+                    and reverse returns the rows that follow summary, even if
+                    other requirements were added or removed meanwhile.
+        Assumes: sort is one of SORT_FIELDS.
+        """
+        descending = (sort in _NEWEST_FIRST) != reverse
+        raw = json.dumps([sort, descending, *_sort_key(sort)(summary)])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def search(self, query: str, *, limit: int = 20) -> list[tuple[dict, float]]:
+        """Full-text search over titles, tags and every why/what/how field.
+
+        See pofe.search.parse_query for the query syntax: words, "quoted
+        phrases" and field-scoped terms such as title:login. Every term must
+        match; results are ranked with BM25, weighting titles and tags above
+        body fields.
+
+        Guarantees: returns up to limit (summary, score) pairs, best first.
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises ValueError for a query with no words or an unknown
+               field prefix.
+        """
+        ranked = self._storage.search(query, limit)
+        summaries = {s["id"]: s for s in self._storage.summaries(req_id for req_id, _ in ranked)}
+        return [(summaries[req_id], score) for req_id, score in ranked]
+
+    def similar(self, entry: dict, *, limit: int = 10) -> list[tuple[dict, float]]:
+        """Return the stored requirements whose text is most like entry's.
+
+        Requirements are compared as TF-IDF vectors of their titles, tags and
+        why/what/how fields (see pofe.vectors), by cosine similarity, so
+        requirements about the same thing are found whatever their tags.
+
+        Guarantees: returns up to limit (summary, similarity) pairs, most
+                    similar first, never including entry itself.
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises ImportError if NumPy is not installed.
+        """
+        ranked = self._storage.similar(entry, limit)
+        summaries = {s["id"]: s for s in self._storage.summaries(req_id for req_id, _ in ranked)}
+        return [(summaries[req_id], score) for req_id, score in ranked]
+
+    def near_duplicates(
+        self, entry: dict, *, threshold: float = DUPLICATE_THRESHOLD
+    ) -> list[tuple[dict, float]]:
+        """Return the stored requirements whose text nearly copies entry's.
+
+        Text is compared as sets of word shingles, estimated from MinHash
+        signatures; only requirements that share an LSH band with entry are
+        compared at all (see pofe.minhash).
+
+        Guarantees: returns (summary, similarity) pairs with similarity of at
+                    least threshold, most similar first, never entry itself.
+        Fails: raises FileNotFoundError if nothing has been stored yet.
+        """
+        found = self._storage.near_duplicates(entry, threshold)
+        summaries = {s["id"]: s for s in self._storage.summaries(req_id for req_id, _ in found)}
+        return [(summaries[req_id], score) for req_id, score in found]
+
+    def duplicate_clusters(
+        self, *, threshold: float = DUPLICATE_THRESHOLD
+    ) -> list[list[tuple[dict, float]]]:
+        """Group requirements that nearly copy each other.
+
+        Two requirements are linked when their similarity (see
+        near_duplicates()) is at least threshold; a cluster is everything
+        linked directly or through others.
+
+        Guarantees: returns clusters of two or more (summary, similarity)
+                    pairs, where similarity is the highest to any other
+                    member; members are ordered oldest first, clusters by
+                    size and then best similarity, descending.
+        Fails: raises FileNotFoundError if nothing has been stored yet.
+        """
+        pairs = self._storage.duplicate_pairs(threshold)
+        parent: dict[str, str] = {}
+
+        def root(req_id: str) -> str:
+            while parent.setdefault(req_id, req_id) != req_id:
+                parent[req_id] = parent[parent[req_id]]
+                req_id = parent[req_id]
+            return req_id
+
+        best: dict[str, float] = {}
+        for (first, second), score in pairs.items():
+            parent[root(first)] = root(second)
+            best[first] = max(best.get(first, 0.0), score)
+            best[second] = max(best.get(second, 0.0), score)
+        summaries = {s["id"]: s for s in self._storage.summaries(best)}
+        groups: dict[str, list[tuple[dict, float]]] = {}
+        for req_id, score in best.items():
+            groups.setdefault(root(req_id), []).append((summaries[req_id], score))
+        clusters = [
+            sorted(members, key=lambda m: (m[0].get("created_at", ""), m[0]["id"]))
+            for members in groups.values()
+        ]
+        clusters.sort(key=lambda c: (-len(c), -max(score for _, score in c)))
+        return clusters
+
+    def iter_records(
+        self,
+        *,
+        owner: str | None = None,
+        status: str | None = None,
+        tag: str | None = None,
+        as_of: str | None = None,
+    ) -> Iterator[dict]:
+        """Yield stored requirements one at a time, optionally filtered.
+
+        Unlike select(), nothing is sorted or collected, so callers that
+        stream the results never hold more than one record of their own.
+        Only the sqlite storage also reads the records from disk one at a
+        time; the json and journal storages hold every record in memory
+        once loaded, and this walks them. With as_of, yields the
+        requirements as they were then, as in select().
+
+        Guarantees: yields every matching requirement once, in storage order;
+                    filters compare case-insensitively as in select().
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises ValueError if as_of is not a valid time.
+        """
+        if not self._storage.exists():
+            raise FileNotFoundError("rsdb.json not found. No requirements stored.")
+        records = self.records_at(as_of) if as_of is not None else self._storage.records()
+        return (
+            entry for entry in records
+            if (owner is None or entry.get("user", "").lower() == owner.lower())
+            and (status is None or entry.get("status", "").lower() == status.lower())
+            and (tag is None or tag.lower() in (t.lower() for t in entry.get("tags", [])))
+        )
+
+    @_write_locked
+    def update(self, req_id: str, content: str, *, base_revision: int | None = None) -> None:
+        """Parse, validate, and overwrite an existing requirement by ID.
+
+        base_revision is the revision content was edited from. If the
+        requirement has changed since, the edit is merged with those changes
+        field by field (see pofe.history.merge), so an edit made over a long
+        session does not undo them. No lock is held while editing.
+
+        Guarantees: the entry is replaced; updated_at is refreshed; when the
+                    title changes, every entry linking to this one shows
+                    the new title in related_rs and has its updated_at
+                    refreshed, in the same commit.
+        Assumes: req_id is the full 64-char ID.
+        Fails: raises EditConflict, writing nothing, if the edit and a change
+               since base_revision set a field to different values;
+               raises ValueError if base_revision is below 1 or past the
+               current revision;
+               raises ValueError if required template fields are missing or
+               the new title is taken while unique titles are enforced;
+               raises FileNotFoundError if nothing has been stored yet;
+               raises KeyError if req_id is not found;
+               raises OSError on write failure.
+        """
+        previous = self._require(req_id)
+        entry = dict(previous)
+        fields = parse_requirement(content)
+        if base_revision is not None and base_revision != _revision_of(previous):
+            fields = self._merge_edit(previous, base_revision, fields)
+        old_title = entry.get("title", "")
+        if title_key(fields["title"]) != title_key(old_title):
+            self._check_title_free(fields["title"], req_id)
+        now = datetime.now(timezone.utc).isoformat()
+
+        # Links kept from the previous version keep their target, even if
+        # its title has been given to another requirement since.
+        known = {key: target for target, key in link_targets(entry) if target is not None}
+        entry["title"] = fields["title"]
+        entry["why"] = fields["why"]
+        entry["what"] = fields["what"]
+        entry["how"] = fields["how"]
+        entry["tags"] = fields["tags"]
+        entry["related_rs"] = fields["related_rs"]
+        entry["related_ids"] = self._resolve_titles(fields["related_rs"], known)
+        entry["updated_at"] = now
+
+        puts = [(previous, entry)]
+        if fields["title"] != old_title:
+            # Unresolved links to the old title led here only if no other
+            # requirement had it.
+            old_key = title_key(old_title) if self._storage.ids_with_title(old_title) == [req_id] else None
+            for referrer_id in self._storage.links_to(req_id):
+                if referrer_id == req_id:
+                    _follow_rename(entry, req_id, old_key, fields["title"])
+                    continue
+                stored = self._require(referrer_id)
+                referrer = dict(stored)
+                if _follow_rename(referrer, req_id, old_key, fields["title"]):
+                    referrer["updated_at"] = now
+                    puts.append((stored, referrer))
+        self._commit(puts, [], at=now)
+
+    def _merge_edit(self, current: dict, base_revision: int, fields: dict) -> dict:
+        # The edited fields merged with the changes made since base_revision.
+        if not 1 <= base_revision <= _revision_of(current):
+            raise ValueError(
+                f"Requirement {current['id'][:8]} has no revision {base_revision}; "
+                f"its latest is {_revision_of(current)}."
+            )
+        try:
+            base = self.revision(current["id"], base_revision)
+        except KeyError:
+            # Written before revisions were logged; any field both sides
+            # set differently conflicts.
+            base = None
+        merged, conflicts = merge(base, fields, current)
+        merged = {name: merged[name] for name in fields}
+        if conflicts:
+            raise EditConflict(current["id"], _revision_of(current), merged, conflicts)
+        return merged
+
+    @_write_locked
+    def delete(self, req_id: str) -> dict:
+        """Remove a requirement by ID and return the removed entry.
+
+        Links to it from other entries become unresolved in the same commit;
+        their related_rs titles stay.
+
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises KeyError if req_id is not found;
+               raises OSError on write failure.
+        """
+        entry = self._require(req_id)
+        detached = []
+        for referrer_id in self._storage.links_to(req_id):
+            stored = self._require(referrer_id)
+            targets = [target for target, _ in link_targets(stored)]
+            if referrer_id != req_id and req_id in targets:
+                referrer = dict(stored)
+                referrer["related_ids"] = [None if target == req_id else target for target in targets]
+                detached.append((stored, referrer))
+        self._commit(detached, [entry], at=datetime.now(timezone.utc).isoformat())
+        return entry
+
+    def history(self, req_id: str) -> list[dict]:
+        """Return the revisions of a requirement, oldest first.
+
+        Every write to a requirement logs a revision, deleting it included.
+        A requirement written before revisions were logged has one revision,
+        its current state, until it next changes.
+
+        Guarantees: returns {"rev", "at", "changed", "deleted"} dicts, where
+                    changed lists the field paths the revision changed (see
+                    pofe.history.changes) and at is when it was written;
+                    returns [] for an unknown ID.
+        Fails: raises OSError on read failure.
+        """
+        current = self._storage.get(req_id) if self._storage.exists() else None
+        # A revision past the current one belongs to a commit that never completed.
+        last = _revision_of(current) if current is not None else None
+        revisions = [
+            {"rev": r["rev"], "at": r["at"], "changed": r["changed"], "deleted": bool(r.get("deleted"))}
+            for r in self._history.revisions(req_id)
+            if last is None or r["rev"] <= last
+        ]
+        if not revisions and current is not None:
+            revisions = [{"rev": 1, "at": current.get("updated_at", ""), "changed": [], "deleted": False}]
+        return revisions
+
+    def revision(self, req_id: str, rev: int) -> dict:
+        """Return a requirement as it was at revision rev.
+
+        Earlier revisions are rebuilt from the nearest checkpoint before them
+        and the deltas after it (see pofe.history), never from the whole log.
+
+        Guarantees: returns the full record; the current revision is read from
+                    storage.
+        Assumes: req_id is the full 64-char ID.
+        Fails: raises KeyError if the requirement has no such revision, or it
+               was deleted at that revision;
+               raises OSError on read failure.
+        """
+        current = self._storage.get(req_id) if self._storage.exists() else None
+        if current is not None and rev == _revision_of(current):
+            return current
+        if rev < 1 or (current is not None and rev > _revision_of(current)):
+            raise KeyError(f"Requirement {req_id[:8]} has no revision {rev}.")
+        chain = self._history.chain(req_id, rev)
+        entry = replay(chain) if chain else None
+        if entry is None:
+            raise KeyError(f"Requirement {req_id[:8]} has no revision {rev}.")
+        return entry
+
+    def _revisions_at(self, moment: str, req_id: str | None = None) -> dict[str, int]:
+        # The revision each requirement (or only req_id) had at moment, for
+        # those that existed then. Found from the revision log's index and the
+        # current summaries, without reading any record.
+        end = _time_bound(moment, end_of=True)
+        if not self._storage.exists():
+            raise FileNotFoundError("rsdb.json not found. No requirements stored.")
+        if req_id is None:
+            current = {s["id"]: s for s in self._storage.select(owner=None, status=None, tag=None)}
+        else:
+            current = {s["id"]: s for s in self._storage.summaries([req_id])}
+        timeline = self._history.timeline(req_id)
+        found = {}
+        for each, revisions in timeline.items():
+            summary = current.get(each)
+            if summary is None and not revisions[-1][2]:
+                continue  # Never stored: the commit that created it did not complete.
+            last = _revision_of(summary) if summary is not None else None
+            chosen = None
+            for rev, at, deleted in revisions:
+                if (last is None or rev <= last) and at is not None and at < end:
+                    chosen = None if deleted else rev
+            if chosen is not None:
+                found[each] = chosen
+        # Requirements with nothing logged (see history()) have looked as
+        # they do now since their last update.
+        for each, summary in current.items():
+            if each not in timeline:
+                updated = timestamp_us(summary.get("updated_at"))
+                if updated is not None and updated < end:
+                    found[each] = _revision_of(summary)
+        return found
+
+    def records_at(self, moment: str) -> Iterator[dict]:
+        """Yield every requirement that existed at moment, as it was then.
+
+        moment is an ISO 8601 date or timestamp (naive ones are UTC); a bare
+        date means the end of that day. The revision each requirement had
+        then is looked up in the revision log's index, and each is rebuilt
+        from its nearest checkpoint (see revision()), so the cost does not
+        grow with the length of the history. Requirements written before
+        revisions were logged are known only as they were last written.
+
+        Guarantees: yields full records by ID, each once; deleted
+                    requirements appear if they existed at moment.
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises ValueError if moment is not a valid time;
+               raises OSError on read failure.
+        """
+        for req_id, rev in sorted(self._revisions_at(moment).items()):
+            yield self.revision(req_id, rev)
+
+    def revision_at(self, req_id: str, moment: str) -> dict:
+        """Return a requirement as it was at moment; see records_at().
+
+        Assumes: req_id is the full 64-char ID.
+        Fails: raises KeyError if the requirement did not exist at moment;
+               raises FileNotFoundError if nothing has been stored yet;
+               raises ValueError if moment is not a valid time;
+               raises OSError on read failure.
+        """
+        rev = self._revisions_at(moment, req_id).get(req_id)
+        if rev is None:
+            raise KeyError(f"Requirement {req_id[:8]} did not exist at {moment}.")
+        return self.revision(req_id, rev)
+
+    def diff(self, req_id: str, old_rev: int, new_rev: int) -> list[tuple[str, object, object]]:
+        """Return the fields that differ between two revisions of a requirement.
+
+        Guarantees: returns (field path, old value, new value) triples in
+                    field order, with None for a field the revision lacks;
+                    bookkeeping fields are left out (see
+                    pofe.history.changes).
+        Assumes: req_id is the full 64-char ID.
+        Fails: raises KeyError if either revision does not exist (see revision());
+               raises OSError on read failure.
+        """
+        old, new = self.revision(req_id, old_rev), self.revision(req_id, new_rev)
+        before, after = flatten(old), flatten(new)
+        return [(path, before.get(path), after.get(path)) for path in changes(old, new)]
+
+    def list_tags(self) -> list[dict]:
+        """Return all unique tags aggregated across requirements with usage counts.
+
+        Guarantees: returns a list of {"name": str, "count": int} sorted by count
+                    descending, then name ascending.
+        Fails: raises FileNotFoundError if nothing has been stored yet.
+        """
+        return sorted(
+            [{"name": name, "count": count} for name, count in self._storage.tag_counts().items()],
+            key=lambda t: (-t["count"], t["name"]),
+        )
+
+    @_write_locked
+    def rename_tag(self, old_name: str, new_name: str) -> int:
+        """Rename a tag across all requirements.
+
+        Guarantees: all occurrences of old_name are replaced with new_name;
+                    deduplication is applied when new_name already exists on a requirement;
+                    updated_at is refreshed for each modified requirement;
+                    returns count of modified requirements.
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises KeyError if old_name does not exist in any requirement;
+               raises ValueError if either name is empty or old_name == new_name;
+               raises OSError on write failure.
+        """
+        old_name = old_name.strip().lower()
+        new_name = new_name.strip().lower()
+
+        if not old_name or not new_name:
+            raise ValueError("Tag names must be non-empty.")
+        if old_name == new_name:
+            raise ValueError(f"Old and new tag names are identical: '{old_name}'.")
+
+        ids = self._storage.ids_with_tag(old_name)
+        if not ids:
+            raise KeyError(f"Tag '{old_name}' not found.")
+
+        now = datetime.now(timezone.utc).isoformat()
+        modified = []
+        for req_id in ids:
+            stored = self._require(req_id)
+            req = dict(stored)
+            seen: set[str] = set()
+            new_tags = []
+            for t in req.get("tags", []):
+                resolved = new_name if t == old_name else t
+                if resolved not in seen:
+                    new_tags.append(resolved)
+                    seen.add(resolved)
+            req["tags"] = new_tags
+            req["updated_at"] = now
+            modified.append((stored, req))
+
+        self._commit(modified, [], at=now)
+        return len(modified)
+
+    @_write_locked
+    def delete_tag(self, name: str) -> int:
+        """Remove a tag from all requirements.
+
+        Guarantees: all occurrences of name are removed from every requirement;
+                    updated_at is refreshed for each modified requirement;
+                    returns count of modified requirements.
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises KeyError if name does not exist in any requirement;
+               raises ValueError if name is empty;
+               raises OSError on write failure.
+        """
+        name = name.strip().lower()
+        if not name:
+            raise ValueError("Tag name must be non-empty.")
+
+        ids = self._storage.ids_with_tag(name)
+        if not ids:
+            raise KeyError(f"Tag '{name}' not found.")
+
+        now = datetime.now(timezone.utc).isoformat()
+        modified = []
+        for req_id in ids:
+            stored = self._require(req_id)
+            req = dict(stored)
+            req["tags"] = [t for t in req.get("tags", []) if t != name]
+            req["updated_at"] = now
+            modified.append((stored, req))
+
+        self._commit(modified, [], at=now)
+        return len(modified)
+
+    def find_by_partial_id(self, partial: str) -> list[dict]:
+        """Return all requirements whose IDs contain partial as a substring.
+
+        Guarantees: returns a list sorted by created_at descending; returns [] when
+                    no IDs contain partial; the search is case-sensitive since IDs
+                    are lowercase hexadecimal strings.
+        Fails: raises FileNotFoundError if nothing has been stored yet.
+        """
+        matches = [self._require(req_id) for req_id in self._storage.ids_containing(partial)]
+        matches.sort(key=lambda r: r.get("created_at", ""), reverse=True)
+        return matches
+
+    def find_by_tags(self, tags: list[str], *, exclude_id: str = "", limit: int = 10) -> list[dict]:
+        """Return requirements that share at least one tag with the given tag list.
+
+        Requirements are ranked by the number of shared tags (descending) so the
+        most relevant appear first. The requirement identified by exclude_id is
+        always excluded from results.
+
+        Guarantees: returns at most `limit` requirement dicts ordered by tag-overlap
+                    count descending; returns [] when tags is empty.
+        Fails: raises FileNotFoundError if nothing has been stored yet.
+        """
+        if not tags:
+            return []
+        return self._storage.tag_overlap(tags, exclude_id=exclude_id, limit=limit)
+
+    def related(self, id_or_title: str) -> list[dict]:
+        """Return requirements listed in the related_rs field of the given requirement.
+
+        Each link leads to the requirement its ID was resolved to when the
+        entry was written; an unresolved title is matched case-insensitively
+        against the current titles. Titles that do not resolve to exactly one
+        stored requirement are silently skipped.
+
+        Guarantees: returns a list of requirement dicts; order follows related_rs list.
+        Fails: raises FileNotFoundError if nothing has been stored yet;
+               raises KeyError if id_or_title is not found.
+        """
+        req = self.get(id_or_title)
+        return [self._require(target) for target in self._storage.links_from(req["id"])]
+
+    def resolve_links(self, entry: dict) -> list[tuple[str, str | None]]:
+        """Return each related_rs title of entry with the ID it leads to.
+
+        Guarantees: returns (title, req_id or None) pairs in related_rs
+                    order; links resolve as in related().
+        Fails: raises FileNotFoundError if nothing has been stored yet.
+        """
+        resolved = []
+        for title, (target, _) in zip(entry.get("related_rs") or [], link_targets(entry)):
+            if target is None:
+                matches = self._storage.ids_with_title(title)
+                target = matches[0] if len(matches) == 1 else None
+            resolved.append((title, target))
+        return resolved
+
+    def linked(
+        self, req_id: str, *, depth: int | None = 1, reverse: bool = False
+    ) -> list[tuple[dict, int]]:
+        """Return the requirements reachable from req_id through related_rs links.
+
+        Follows links breadth-first, up to depth links away (any distance
+        when depth is None). With reverse, follows links backwards, giving
+        the requirements that depend on req_id directly or transitively.
+        Links are kept in an index updated on every write, so each step is
+        a lookup; titles resolve as in related().
+
+        Guarantees: returns (summary, distance) pairs, each requirement once
+                    at its shortest distance, nearest first; never req_id.
+        Assumes: req_id is the full 64-char ID; depth, if given, is positive.
+        Fails: raises FileNotFoundError if nothing has been stored yet.
+        """
+        step = self._storage.links_to if reverse else self._storage.links_from
+        seen = {req_id}
+        found: list[tuple[str, int]] = []
+        frontier = [req_id]
+        distance = 0
+        while frontier and (depth is None or distance < depth):
+            distance += 1
+            reached = []
+            for node in frontier:
+                for neighbour in step(node):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        reached.append(neighbour)
+                        found.append((neighbour, distance))
+            frontier = reached
+        summaries = {s["id"]: s for s in self._storage.summaries(n for n, _ in found)}
+        return [(summaries[n], d) for n, d in found]
+
+    def link_graph(
+        self, req_id: str | None = None, *, depth: int | None = None, reverse: bool = False
+    ) -> tuple[list[dict], list[tuple[str, str]]]:
+        """Return the graph of resolved related_rs links, or the part around one requirement.
+
+        Without req_id the graph holds every requirement with a link in or
+        out. With req_id it holds req_id and what linked() reaches from it,
+        with the links among them.
+
+        Guarantees: returns (nodes, edges): summaries sorted by ID, and
+                    (source ID, target ID) pairs between those nodes.
+        Assumes: req_id, if given, is the full 64-char ID.
+        Fails: raises FileNotFoundError if nothing has been stored yet.
+        """
+        edges = self._storage.link_edges()
+        if req_id is None:
+            ids = {node for edge in edges for node in edge}
+        else:
+            ids = {req_id} | {s["id"] for s, _ in self.linked(req_id, depth=depth, reverse=reverse)}
+            edges = [(source, target) for source, target in edges if source in ids and target in ids]
+        return sorted(self._storage.summaries(ids), key=lambda s: s["id"]), edges
 
-    with open(rsdb_path) as f:
-        db = json.load(f)
+    @_write_locked
+    def migrate(self, target_mode: str) -> int:
+        """Stream every requirement into another storage mode and switch to it.
 
-    if req_id not in db:
-        raise KeyError(f"Requirement '{req_id}' not found.")
+        Guarantees: returns the number of records copied; this store keeps
+                    working against the new storage afterwards.
+        Fails: raises ValueError if target_mode is unknown or already selected;
+               raises FileNotFoundError if nothing has been stored yet;
+               raises OSError on read or write failure.
+        """
+        count = migrate_storage(self._pofe_dir, target_mode)
+        self._storage = open_storage(self._pofe_dir)
+        return count
 
-    fields = _parse(content)
-    now = datetime.now(timezone.utc).isoformat()
 
-    entry = db[req_id]
-    entry["title"] = fields["title"]
-    entry["why"] = fields["why"]
-    entry["what"] = fields["what"]
-    entry["how"] = fields["how"]
-    entry["tags"] = fields["tags"]
-    entry["related_rs"] = fields["related_rs"]
-    entry["updated_at"] = now
+_stores: dict[Path, "RequirementStore | RemoteStore"] = {}
 
-    with open(rsdb_path, "w") as f:
-        json.dump(db, f, indent=2)
 
+def open_store() -> "RequirementStore | RemoteStore":
+    """Return the store for the nearest .pofe directory, shared across the process.
 
-def list_all_tags() -> list[dict]:
-    """Return all unique tags aggregated across requirements with usage counts.
+    While `pofe serve` runs for that directory, the store is a RemoteStore
+    that forwards every call to the server (see pofe.server), which keeps
+    the database loaded between commands. Otherwise it reads the files
+    directly.
 
-    Guarantees: returns a list of {"name": str, "count": int} sorted by count
-                descending, then name ascending; never raises on missing tags field.
-    Assumes: .pofe directory exists.
-    Fails: raises FileNotFoundError if rsdb.json is missing.
+    Guarantees: repeated calls from the same working tree return the same
+                store, so the database is loaded at most once per process.
+    Fails: raises FileNotFoundError if no .pofe directory exists.
     """
-    rsdb_path = _find_pofe_dir() / "data" / "rsdb.json"
-    if not rsdb_path.exists():
-        raise FileNotFoundError("rsdb.json not found. No requirements stored.")
+    from pofe.server import connect
 
-    with open(rsdb_path) as f:
-        db = json.load(f)
+    pofe_dir = _find_pofe_dir().resolve()
+    if pofe_dir not in _stores:
+        _stores[pofe_dir] = connect(pofe_dir) or RequirementStore(pofe_dir)
+    return _stores[pofe_dir]
 
-    counts: dict[str, int] = {}
-    for req in db.values():
-        for tag in req.get("tags", []):
-            counts[tag] = counts.get(tag, 0) + 1
 
-    return sorted(
-        [{"name": name, "count": count} for name, count in counts.items()],
-        key=lambda t: (-t["count"], t["name"]),
-    )
+# Function API kept for callers that do not hold a store. Each call uses the
+# process-wide store from open_store().
 
+def append_requirement(content: str, username: str) -> str:
+    """Parse, validate, and store a new requirement. See RequirementStore.append."""
+    return open_store().append(content, username)
 
-def rename_tag(old_name: str, new_name: str) -> int:
-    """Rename a tag across all requirements.
-
-    Guarantees: all occurrences of old_name are replaced with new_name;
-                deduplication is applied when new_name already exists on a requirement;
-                updated_at is refreshed for each modified requirement;
-                returns count of modified requirements.
-    Assumes: .pofe directory exists; tag names are non-empty strings.
-    Fails: raises FileNotFoundError if rsdb.json is missing;
-           raises KeyError if old_name does not exist in any requirement;
-           raises ValueError if either name is empty or old_name == new_name;
-           raises OSError on write failure.
-    """
-    old_name = old_name.strip().lower()
-    new_name = new_name.strip().lower()
-
-    if not old_name or not new_name:
-        raise ValueError("Tag names must be non-empty.")
-    if old_name == new_name:
-        raise ValueError(f"Old and new tag names are identical: '{old_name}'.")
 
-    rsdb_path = _find_pofe_dir() / "data" / "rsdb.json"
-    if not rsdb_path.exists():
-        raise FileNotFoundError("rsdb.json not found. No requirements stored.")
+def get_requirement(id_or_title: str) -> dict:
+    """Retrieve a requirement by ID or title. See RequirementStore.get."""
+    return open_store().get(id_or_title)
 
-    with open(rsdb_path) as f:
-        db = json.load(f)
 
-    if not any(old_name in req.get("tags", []) for req in db.values()):
-        raise KeyError(f"Tag '{old_name}' not found.")
+def list_requirements(
+    *,
+    owner: str | None = None,
+    status: str | None = None,
+    tag: str | None = None,
+) -> list[dict]:
+    """Return summaries of stored requirements, optionally filtered. See RequirementStore.select."""
+    return open_store().select(owner=owner, status=status, tag=tag)
 
-    now = datetime.now(timezone.utc).isoformat()
-    modified = 0
-    for req in db.values():
-        tags = req.get("tags", [])
-        if old_name not in tags:
-            continue
-        seen: set[str] = set()
-        new_tags = []
-        for t in tags:
-            resolved = new_name if t == old_name else t
-            if resolved not in seen:
-                new_tags.append(resolved)
-                seen.add(resolved)
-        req["tags"] = new_tags
-        req["updated_at"] = now
-        modified += 1
 
-    with open(rsdb_path, "w") as f:
-        json.dump(db, f, indent=2)
+def update_requirement(req_id: str, content: str, *, base_revision: int | None = None) -> None:
+    """Overwrite an existing requirement. See RequirementStore.update."""
+    open_store().update(req_id, content, base_revision=base_revision)
 
-    return modified
 
+def list_all_tags() -> list[dict]:
+    """Return tags with usage counts. See RequirementStore.list_tags."""
+    return open_store().list_tags()
 
-def delete_tag(name: str) -> int:
-    """Remove a tag from all requirements.
 
-    Guarantees: all occurrences of name are removed from every requirement;
-                updated_at is refreshed for each modified requirement;
-                returns count of modified requirements.
-    Assumes: .pofe directory exists.
-    Fails: raises FileNotFoundError if rsdb.json is missing;
-           raises KeyError if name does not exist in any requirement;
-           raises ValueError if name is empty;
-           raises OSError on write failure.
-    """
-    name = name.strip().lower()
-    if not name:
-        raise ValueError("Tag name must be non-empty.")
-
-    rsdb_path = _find_pofe_dir() / "data" / "rsdb.json"
-    if not rsdb_path.exists():
-        raise FileNotFoundError("rsdb.json not found. No requirements stored.")
-
-    with open(rsdb_path) as f:
-        db = json.load(f)
-
-    if not any(name in req.get("tags", []) for req in db.values()):
-        raise KeyError(f"Tag '{name}' not found.")
-
-    now = datetime.now(timezone.utc).isoformat()
-    modified = 0
-    for req in db.values():
-        tags = req.get("tags", [])
-        if name in tags:
-            req["tags"] = [t for t in tags if t != name]
-            req["updated_at"] = now
-            modified += 1
+def rename_tag(old_name: str, new_name: str) -> int:
+    """Rename a tag across all requirements. See RequirementStore.rename_tag."""
+    return open_store().rename_tag(old_name, new_name)
 
-    with open(rsdb_path, "w") as f:
-        json.dump(db, f, indent=2)
 
-    return modified
+def delete_tag(name: str) -> int:
+    """Remove a tag from all requirements. See RequirementStore.delete_tag."""
+    return open_store().delete_tag(name)
 
 
 def delete_requirement(req_id: str, *, confirm: bool = True) -> None:
-    """Remove a requirement from rsdb.json by ID.
+    """Remove a requirement from the store by ID.
 
-    Guarantees: requirement is removed from rsdb.json; action is printed to stdout.
-    Assumes: .pofe directory and rsdb.json exist.
+    Guarantees: requirement is removed; action is printed to stdout.
     Fails: raises FileNotFoundError if rsdb.json is missing;
            raises KeyError if req_id is not found;
            raises OSError on write failure.
     """
-    rsdb_path = _find_pofe_dir() / "data" / "rsdb.json"
-
-    if not rsdb_path.exists():
-        raise FileNotFoundError("rsdb.json not found. No requirements stored.")
-
-    with open(rsdb_path) as f:
-        db = json.load(f)
-
-    if req_id not in db:
-        raise KeyError(f"Requirement '{req_id}' not found.")
-
+    store = open_store()
     if confirm:
-        title = db[req_id].get("title", req_id)
+        title = store.get(req_id).get("title", req_id)
         answer = input(f"Delete '{title}' [{req_id[:8]}...]? [y/N] ")
         if answer.strip().lower() != "y":
             print("Aborted.")
             return
-
-    del db[req_id]
-
-    with open(rsdb_path, "w") as f:
-        json.dump(db, f, indent=2)
-
+    store.delete(req_id)
     print(f"Deleted: {req_id}")
 
 
 def find_by_partial_id(partial: str) -> list[dict]:
-    """Return all requirements whose IDs contain partial as a substring.
-
-    Guarantees: returns a list sorted by created_at descending; returns [] when
-                no IDs contain partial; the search is case-sensitive since IDs
-                are lowercase hexadecimal strings.
-    Assumes: .pofe directory exists.
-    Fails: raises FileNotFoundError if rsdb.json is missing.
-    """
-    rsdb_path = _find_pofe_dir() / "data" / "rsdb.json"
-    if not rsdb_path.exists():
-        raise FileNotFoundError("rsdb.json not found. No requirements stored.")
-
-    with open(rsdb_path) as f:
-        db = json.load(f)
-
-    matches = [v for k, v in db.items() if partial in k]
-    matches.sort(key=lambda r: r.get("created_at", ""), reverse=True)
-    return matches
+    """Return requirements whose IDs contain partial. See RequirementStore.find_by_partial_id."""
+    return open_store().find_by_partial_id(partial)
 
 
 def find_requirements_by_tags(tags: list[str], *, exclude_id: str = "", limit: int = 10) -> list[dict]:
-    """Return requirements that share at least one tag with the given tag list.
-
-    Requirements are ranked by the number of shared tags (descending) so the
-    most relevant appear first. The requirement identified by exclude_id is
-    always excluded from results.
-
-    Guarantees: returns at most `limit` requirement dicts ordered by tag-overlap
-                count descending; returns [] when tags is empty.
-    Assumes: .pofe directory exists.
-    Fails: raises FileNotFoundError if rsdb.json is missing.
-    """
-    if not tags:
-        return []
-
-    rsdb_path = _find_pofe_dir() / "data" / "rsdb.json"
-    if not rsdb_path.exists():
-        raise FileNotFoundError("rsdb.json not found. No requirements stored.")
-
-    with open(rsdb_path) as f:
-        db = json.load(f)
-
-    tag_set = {t.lower() for t in tags}
-    scored: list[tuple[int, dict]] = []
-    for req_id, req in db.items():
-        if req_id == exclude_id:
-            continue
-        overlap = len(tag_set & {t.lower() for t in req.get("tags", [])})
-        if overlap > 0:
-            scored.append((overlap, req))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [req for _, req in scored[:limit]]
+    """Return requirements ranked by shared tags. See RequirementStore.find_by_tags."""
+    return open_store().find_by_tags(tags, exclude_id=exclude_id, limit=limit)
 
 
 def get_related_requirements(id_or_title: str) -> list[dict]:
-    """Return requirements listed in the related_rs field of the given requirement.
-
-    Each title in related_rs is resolved by exact case-insensitive title match.
-    Titles that do not resolve to any stored requirement are silently skipped.
-
-    Guarantees: returns a list of requirement dicts; order follows related_rs list.
-    Assumes: rsdb.json exists.
-    Fails: raises FileNotFoundError if rsdb.json is missing;
-           raises KeyError if id_or_title is not found.
-    """
-    req = get_requirement(id_or_title)
-    related_titles = req.get("related_rs") or []
-    if not related_titles:
-        return []
-
-    rsdb_path = _find_pofe_dir() / "data" / "rsdb.json"
-    with open(rsdb_path) as f:
-        db = json.load(f)
-
-    all_reqs = list(db.values())
-    resolved = []
-    for title in related_titles:
-        title_lower = title.lower()
-        matches = [r for r in all_reqs if r.get("title", "").lower() == title_lower]
-        if len(matches) == 1:
-            resolved.append(matches[0])
-    return resolved
+    """Return requirements named in related_rs. See RequirementStore.related."""
+    return open_store().related(id_or_title)
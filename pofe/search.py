@@ -0,0 +1,311 @@
+import json
+import math
+import re
+from collections.abc import Iterable
+from typing import Protocol
+
+# Bump when the saved layout changes; older files are then rebuilt.
+_VERSION = 1
+
+# Searchable fields: (name, section, key). Section fields live under
+# entry[section][key]; the others are top-level keys.
+_FIELD_SOURCES = [
+    ("title", None, "title"),
+    ("tags", None, "tags"),
+    ("problem", "why", "problem"),
+    ("hypothesis", "why", "hypothesis"),
+    ("expect", "why", "expect"),
+    ("input", "what", "input"),
+    ("process", "what", "process"),
+    ("output", "what", "output"),
+    ("constraints", "how", "constraints"),
+    ("approach", "how", "approach"),
+    ("acceptance_criteria", "how", "acceptance_criteria"),
+]
+FIELDS = tuple(name for name, _, _ in _FIELD_SOURCES)
+
+# Names accepted before ':' in a query, and the fields each one searches.
+SCOPES = {
+    **{name: (name,) for name in FIELDS},
+    "tag": ("tags",),
+    "criteria": ("acceptance_criteria",),
+    "why": ("problem", "hypothesis", "expect"),
+    "what": ("input", "process", "output"),
+    "how": ("constraints", "approach", "acceptance_criteria"),
+}
+
+# A match in a title or tag says more about a requirement than one in its body.
+_BOOSTS = {"title": 3.0, "tags": 2.0}
+
+# BM25 parameters: term-frequency saturation and length normalization.
+_K1 = 1.2
+_B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+_CLAUSE = re.compile(r'(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+
+# Positions of a term in one requirement: {req_id: {field: [positions]}}.
+Postings = dict[str, dict[str, list[int]]]
+
+_FIELD_NUMBERS = {name: number for number, name in enumerate(FIELDS)}
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase word tokens."""
+    return _TOKEN.findall(text.casefold())
+
+
+def document_fields(entry: dict) -> dict[str, list[str]]:
+    """Return the tokens of every searchable field of a requirement record.
+
+    Guarantees: returns only fields with at least one token.
+    """
+    fields = {}
+    for name, section, key in _FIELD_SOURCES:
+        value = entry.get(section, {}).get(key, "") if section else entry.get(key, "")
+        if isinstance(value, list):
+            value = " ".join(value)
+        tokens = tokenize(value or "")
+        if tokens:
+            fields[name] = tokens
+    return fields
+
+
+def occurrences(fields: dict[str, list[str]]) -> dict[str, str]:
+    """Return, for each term in fields, its encoded positions per field.
+
+    The encoding is compact because it is stored once per term and
+    requirement: 'field:pos.pos;field:pos', with fields numbered by their
+    place in FIELDS.
+    """
+    positions: dict[str, dict[int, list[str]]] = {}
+    for field, tokens in fields.items():
+        number = _FIELD_NUMBERS[field]
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, {}).setdefault(number, []).append(str(position))
+    return {
+        term: ";".join(f"{number}:{'.'.join(p)}" for number, p in by_field.items())
+        for term, by_field in positions.items()
+    }
+
+
+def decode_occurrences(encoded: str) -> dict[str, list[int]]:
+    """Invert occurrences() for one term: return {field: [positions]}."""
+    decoded = {}
+    for part in encoded.split(";"):
+        number, positions = part.split(":")
+        decoded[FIELDS[int(number)]] = [int(p) for p in positions.split(".")]
+    return decoded
+
+
+def field_lengths(fields: dict[str, list[str]]) -> list[int]:
+    """Return the token count of each of FIELDS, in order."""
+    return [len(fields.get(name, ())) for name in FIELDS]
+
+
+def parse_query(query: str) -> list[tuple[tuple[str, ...], list[str]]]:
+    """Split a search query into clauses that every result must match.
+
+    A clause is a word or a "quoted phrase", optionally scoped to fields with
+    a prefix from SCOPES such as title: or why:. Unscoped clauses search
+    every field. A word that tokenizes into several tokens (like 'e-mail')
+    is matched as a phrase.
+
+    Guarantees: returns (fields, tokens) pairs, each with at least one token.
+    Fails: raises ValueError for an unknown field prefix or a query without
+           any words.
+    """
+    clauses = []
+    for match in _CLAUSE.finditer(query):
+        scope, phrase, word = match.groups()
+        if scope is not None and scope.lower() not in SCOPES:
+            raise ValueError(
+                f"Unknown search field '{scope}'. Choose from: {', '.join(sorted(SCOPES))}."
+            )
+        tokens = tokenize(phrase if phrase is not None else word)
+        if tokens:
+            clauses.append((SCOPES[scope.lower()] if scope else FIELDS, tokens))
+    if not clauses:
+        raise ValueError("The search query has no words to look for.")
+    return clauses
+
+
+class PostingSource(Protocol):
+    """Where rank() reads postings and length statistics from."""
+
+    def postings(self, term: str) -> Postings: ...
+
+    def field_lengths(self, req_ids: Iterable[str]) -> dict[str, dict[str, int]]: ...
+
+    def statistics(self) -> tuple[int, dict[str, float]]:
+        """Return the number of documents and the average length of each field."""
+        ...
+
+
+def rank(source: PostingSource, query: str, limit: int) -> list[tuple[str, float]]:
+    """Return the best requirements for query, scored with BM25F.
+
+    Every clause of the query must match. Each clause is scored like one
+    term: its occurrences in the allowed fields are weighted by field boost
+    and length, summed, saturated, and multiplied by the clause's inverse
+    document frequency. A phrase occurs where its tokens follow each other.
+
+    Guarantees: returns at most limit (req_id, score) pairs, best first;
+                ties are broken by ID.
+    Fails: raises ValueError if query cannot be parsed (see parse_query).
+    """
+    clauses = parse_query(query)
+    matches = []
+    for fields, tokens in clauses:
+        matches.append(_clause_matches(source, fields, tokens))
+        if not matches[-1]:
+            return []
+    candidates = set.intersection(*(set(m) for m in matches))
+    if not candidates:
+        return []
+
+    doc_count, average = source.statistics()
+    lengths = source.field_lengths(candidates)
+    scores = dict.fromkeys(candidates, 0.0)
+    for found in matches:
+        idf = math.log(1 + (doc_count - len(found) + 0.5) / (len(found) + 0.5))
+        for req_id in candidates:
+            weight = 0.0
+            for field, count in found[req_id].items():
+                norm = 1 - _B + _B * lengths[req_id].get(field, 0) / (average.get(field) or 1)
+                weight += _BOOSTS.get(field, 1.0) * count / norm
+            scores[req_id] += idf * weight * (_K1 + 1) / (weight + _K1)
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return ranked[:limit]
+
+
+def _clause_matches(
+    source: PostingSource, fields: tuple[str, ...], tokens: list[str]
+) -> dict[str, dict[str, int]]:
+    # {req_id: {field: occurrences}} for one clause within fields.
+    first = source.postings(tokens[0])
+    rest = [source.postings(token) for token in tokens[1:]]
+    found: dict[str, dict[str, int]] = {}
+    for req_id, by_field in first.items():
+        for field, positions in by_field.items():
+            if field not in fields:
+                continue
+            count = 0
+            for start in positions:
+                if all(
+                    start + offset in rest[offset - 1].get(req_id, {}).get(field, ())
+                    for offset in range(1, len(tokens))
+                ):
+                    count += 1
+            if count:
+                found.setdefault(req_id, {})[field] = count
+    return found
+
+
+class SearchIndex:
+    """A positional inverted index over the searchable fields of requirements.
+
+    Requirements are numbered, and the index refers to them by number to
+    stay small. Each term maps to the numbers of the requirements containing
+    it, and for each of those to its positions per field, encoded by
+    occurrences(); the positions make phrase queries possible. The field
+    lengths of every requirement and their running totals give BM25 its
+    length normalization. The terms of every requirement are kept too, so
+    an update removes exactly the postings the old version added.
+
+    Guarantees: after build() or apply(), the index reflects exactly the
+                records it was given; apply() is idempotent.
+    """
+
+    FILE_SUFFIX = ".json"
+
+    def __init__(
+        self,
+        ids: list[str | None],
+        postings: dict[str, dict[str, str]],
+        terms: dict[str, str],
+        lengths: dict[str, list[int]],
+        totals: list[int],
+    ):
+        self._ids = ids
+        self._numbers = {req_id: str(n) for n, req_id in enumerate(ids) if req_id is not None}
+        self._postings = postings
+        self._terms = terms
+        self._lengths = lengths
+        self._totals = totals
+
+    @classmethod
+    def build(cls, records: Iterable[dict]) -> "SearchIndex":
+        index = cls([], {}, {}, {}, [0] * len(FIELDS))
+        index.apply(records, [])
+        return index
+
+    @classmethod
+    def from_bytes(cls, data: bytes, stamp: list) -> "SearchIndex | None":
+        """Return the index saved in data, or None if it is unreadable or stale."""
+        try:
+            saved = json.loads(data)
+        except ValueError:
+            return None
+        if saved.get("version") != _VERSION or saved.get("stamp") != stamp:
+            return None
+        return cls(saved["ids"], saved["postings"], saved["terms"], saved["lengths"], saved["totals"])
+
+    def to_bytes(self, stamp: list) -> bytes:
+        return json.dumps({
+            "version": _VERSION,
+            "stamp": stamp,
+            "ids": self._ids,
+            "postings": self._postings,
+            "terms": self._terms,
+            "lengths": self._lengths,
+            "totals": self._totals,
+        }, separators=(",", ":")).encode()
+
+    def apply(self, puts: Iterable[dict], deletes: Iterable[str]) -> None:
+        for entry in puts:
+            number = self._numbers.get(entry["id"])
+            if number is None:
+                number = self._numbers[entry["id"]] = str(len(self._ids))
+                self._ids.append(entry["id"])
+            else:
+                self._remove(number)
+            fields = document_fields(entry)
+            lengths = self._lengths[number] = field_lengths(fields)
+            self._totals = [total + n for total, n in zip(self._totals, lengths)]
+            encoded = occurrences(fields)
+            self._terms[number] = " ".join(encoded)
+            for term, where in encoded.items():
+                self._postings.setdefault(term, {})[number] = where
+        for req_id in deletes:
+            number = self._numbers.pop(req_id, None)
+            if number is not None:
+                self._remove(number)
+                self._ids[int(number)] = None
+
+    def _remove(self, number: str) -> None:
+        lengths = self._lengths.pop(number, None)
+        if lengths is None:
+            return
+        self._totals = [total - n for total, n in zip(self._totals, lengths)]
+        for term in self._terms.pop(number).split():
+            del self._postings[term][number]
+            if not self._postings[term]:
+                del self._postings[term]
+
+    def postings(self, term: str) -> Postings:
+        return {
+            self._ids[int(number)]: decode_occurrences(where)
+            for number, where in self._postings.get(term, {}).items()
+        }
+
+    def field_lengths(self, req_ids: Iterable[str]) -> dict[str, dict[str, int]]:
+        return {
+            req_id: dict(zip(FIELDS, self._lengths[self._numbers[req_id]])) for req_id in req_ids
+        }
+
+    def statistics(self) -> tuple[int, dict[str, float]]:
+        doc_count = len(self._lengths)
+        if not doc_count:
+            return 0, {}
+        return doc_count, {field: total / doc_count for field, total in zip(FIELDS, self._totals)}
@@ -0,0 +1,304 @@
+import itertools
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import threading
+import traceback
+import warnings
+from collections.abc import Iterator
+from pathlib import Path
+
+# The socket `pofe serve` listens on, inside the .pofe directory.
+SOCKET_NAME = "serve.sock"
+
+# RequirementStore methods a client may call. Each request is one call.
+_METHODS = frozenset({
+    "append", "append_many", "update", "delete", "rename_tag", "delete_tag",
+    "compact", "reindex", "migrate",
+    "get", "candidates", "short_ids", "select", "search", "similar",
+    "near_duplicates", "duplicate_clusters", "iter_records", "history",
+    "revision", "records_at", "revision_at", "diff", "list_tags",
+    "find_by_partial_id", "find_by_tags", "related", "resolve_links",
+    "linked", "link_graph", "version",
+})
+
+# A method that returns an iterator, such as iter_records(), answers with
+# this many items; the client asks for the next ones as it consumes them.
+_STREAM_CHUNK = 200
+
+
+def _error_types() -> dict[str, type]:
+    # Exceptions and warnings that cross the socket as themselves; any other
+    # is sent as the nearest of these it derives from.
+    from pofe.requirement_store import EditConflict, NearDuplicateWarning
+
+    return {cls.__name__: cls for cls in (
+        EditConflict, NearDuplicateWarning, FileNotFoundError, KeyError,
+        ValueError, ImportError, OSError,
+    )}
+
+
+def _encode_error(error: BaseException) -> dict:
+    types = _error_types()
+    name = next((cls.__name__ for cls in type(error).__mro__ if cls.__name__ in types), None)
+    if name is None:
+        # A bug, not a storage failure; the server keeps running.
+        traceback.print_exception(error, file=sys.stderr)
+        return {"type": "OSError", "args": [f"pofe serve failed: {type(error).__name__}: {error}"]}
+    return {"type": name, "args": list(error.args), "attrs": vars(error)}
+
+
+def _decode_error(encoded: dict) -> BaseException:
+    # Rebuilt without calling __init__, whose parameters differ per type.
+    cls = _error_types().get(encoded["type"], OSError)
+    error = cls.__new__(cls)
+    error.args = tuple(encoded["args"])
+    error.__dict__.update(encoded.get("attrs", {}))
+    return error
+
+
+def socket_path(pofe_dir: Path) -> Path:
+    return pofe_dir / SOCKET_NAME
+
+
+class RemoteStore:
+    """A RequirementStore that lives in a `pofe serve` process.
+
+    Every public store method is forwarded over the server's socket and
+    behaves as on a local store: results come back as JSON (tuples become
+    lists), and exceptions and NearDuplicateWarnings are raised again here.
+    Methods that return iterators return generators that fetch the items in
+    chunks as they are consumed, so an export through the server never
+    holds the whole store in one reply. Other calls may be made meanwhile;
+    with the sqlite storage, records they write may show up in a result
+    still being fetched.
+
+    Fails: every method raises OSError if the server goes away.
+    """
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        self._replies = sock.makefile("rb")
+
+    def __getattr__(self, name: str):
+        from pofe.requirement_store import RequirementStore
+
+        if name == "page_cursor":
+            return RequirementStore.page_cursor
+        if name not in _METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, args, kwargs)
+
+    def close(self) -> None:
+        self._replies.close()
+        self._sock.close()
+
+    def _call(self, method: str, args: tuple, kwargs: dict):
+        reply = self._request({"method": method, "args": args, "kwargs": kwargs})
+        if "stream" in reply:
+            return self._stream(reply)
+        return reply["result"]
+
+    def _stream(self, reply: dict) -> Iterator:
+        # Yields the items of a streamed result, pulling chunk after chunk.
+        while True:
+            yield from reply["items"]
+            if not reply["more"]:
+                return
+            reply = self._request({"next": reply["stream"]})
+
+    def _request(self, message: dict) -> dict:
+        # Sends one request and returns its reply, raising the error it holds.
+        request = json.dumps(message)
+        try:
+            self._sock.sendall(request.encode() + b"\n")
+            line = self._replies.readline()
+        except OSError as e:
+            raise OSError(f"Lost the connection to pofe serve: {e}") from e
+        if not line:
+            raise OSError("pofe serve closed the connection.")
+        reply = json.loads(line)
+        for warning in reply.get("warnings", []):
+            warnings.warn(_decode_error(warning), stacklevel=3)
+        if "error" in reply:
+            raise _decode_error(reply["error"])
+        return reply
+
+
+def connect(pofe_dir: Path) -> RemoteStore | None:
+    """Return the store served for pofe_dir, or None if no server is running.
+
+    Guarantees: never raises; a leftover socket of a server that died
+                counts as no server.
+    """
+    path = socket_path(pofe_dir)
+    if not hasattr(socket, "AF_UNIX") or not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+    return RemoteStore(sock)
+
+
+_stream_ids = itertools.count(1)
+
+
+def _next_chunk(streams: dict[int, Iterator], stream_id: int) -> dict:
+    # The next items of an open stream; a finished stream is closed.
+    if stream_id not in streams:
+        raise ValueError(f"No open result stream {stream_id}.")
+    try:
+        items = list(itertools.islice(streams[stream_id], _STREAM_CHUNK))
+    except BaseException:
+        del streams[stream_id]
+        raise
+    more = len(items) == _STREAM_CHUNK
+    if not more:
+        del streams[stream_id]
+    return {"stream": stream_id, "items": items, "more": more}
+
+
+def _handle(store, line: bytes, streams: dict[int, Iterator]) -> bytes:
+    # Runs one request line and returns its reply line. streams holds the
+    # iterator results still being fetched over this connection.
+    from pofe.requirement_store import NearDuplicateWarning
+
+    reply: dict = {}
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", NearDuplicateWarning)
+        try:
+            request = json.loads(line)
+            if "next" in request:
+                reply = _next_chunk(streams, request["next"])
+            elif request.get("method") not in _METHODS:
+                raise ValueError(f"Unknown request '{request.get('method')}'.")
+            else:
+                result = getattr(store, request["method"])(*request["args"], **request["kwargs"])
+                if isinstance(result, Iterator):
+                    # The first chunk comes with the reply, so errors the
+                    # iterator raises when it starts reach this call.
+                    stream_id = next(_stream_ids)
+                    streams[stream_id] = result
+                    reply = _next_chunk(streams, stream_id)
+                else:
+                    reply["result"] = result
+        except Exception as e:
+            reply = {"error": _encode_error(e)}
+    sent = [warning for warning in caught if isinstance(warning.message, NearDuplicateWarning)]
+    for warning in caught:
+        if warning not in sent:
+            # Not meant for the client; shown here as without the server.
+            warnings.showwarning(warning.message, warning.category, warning.filename, warning.lineno)
+    if sent:
+        reply["warnings"] = [_encode_error(warning.message) for warning in sent]
+    return json.dumps(reply, default=str).encode() + b"\n"
+
+
+def serve(pofe_dir: Path | None = None, *, http: tuple[str, int] | None = None, on_ready=None) -> None:
+    """Serve the requirement store of pofe_dir on its socket until stopped.
+
+    pofe_dir defaults to the nearest .pofe directory.
+
+    The server keeps one RequirementStore, so the records and indexes are
+    loaded once and every client call is answered from memory. Requests
+    are read from all connected clients and run one batch at a time while
+    holding the write lock (see RequirementStore.locked()). Holding the lock
+    lets the store notice writes made by processes that bypass the server.
+    It also means every write in a batch shares one snapshot rewrite in
+    json mode. SIGINT or SIGTERM stops the server and removes the socket.
+
+    With http, a (host, port) pair, the store is also served as a JSON API
+    on that address (see pofe.http_api.ApiServer), from the same memory.
+
+    on_ready, if given, is called with the socket path and, with http, the
+    API's URL once both accept connections.
+
+    Fails: raises FileNotFoundError if no .pofe directory exists;
+           raises OSError if a server is already running for pofe_dir, the
+           platform has no Unix sockets, or the socket or the HTTP address
+           cannot be bound.
+    """
+    from pofe.requirement_store import RequirementStore, _find_pofe_dir
+
+    pofe_dir = (pofe_dir or _find_pofe_dir()).resolve()
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("pofe serve needs Unix domain sockets, which this platform lacks.")
+    path = socket_path(pofe_dir)
+    running = connect(pofe_dir)
+    if running is not None:
+        running.close()
+        raise OSError(f"pofe serve is already running on {path}.")
+    store = RequirementStore(pofe_dir)
+    path.unlink(missing_ok=True)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(path))
+    os.chmod(path, 0o600)
+    listener.listen()
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    pending: dict[socket.socket, bytes] = {}
+    streams: dict[socket.socket, dict[int, Iterator]] = {}
+    # Socket batches and HTTP requests take turns on the store.
+    guard = threading.Lock()
+    api = None
+    try:
+        if http is not None:
+            from pofe.http_api import ApiServer
+
+            api = ApiServer(http, store, guard)
+            threading.Thread(target=api.serve_forever, daemon=True).start()
+    except BaseException:
+        listener.close()
+        path.unlink(missing_ok=True)
+        raise
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if on_ready is not None:
+        host, port = api.server_address[:2] if api is not None else (None, None)
+        on_ready(path, f"http://{host}:{port}" if api is not None else None)
+    try:
+        while True:
+            batch = []
+            for key, _ in selector.select():
+                if key.fileobj is listener:
+                    conn, _ = listener.accept()
+                    selector.register(conn, selectors.EVENT_READ)
+                    pending[conn] = b""
+                    streams[conn] = {}
+                    continue
+                conn = key.fileobj
+                try:
+                    data = conn.recv(1 << 16)
+                except OSError:
+                    data = b""
+                if not data:
+                    selector.unregister(conn)
+                    conn.close()
+                    del pending[conn]
+                    del streams[conn]
+                    continue
+                *lines, pending[conn] = (pending[conn] + data).split(b"\n")
+                batch += [(conn, line) for line in lines]
+            if not batch:
+                continue
+            with guard, store.locked():
+                for conn, line in batch:
+                    reply = _handle(store, line, streams[conn])
+                    try:
+                        conn.sendall(reply)
+                    except OSError:
+                        pass  # The client left; its connection closes on the next read.
+    finally:
+        if api is not None:
+            api.shutdown()
+            api.server_close()
+        selector.close()
+        for conn in pending:
+            conn.close()
+        listener.close()
+        path.unlink(missing_ok=True)
@@ -0,0 +1,1441 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from pofe.catalog import (
+    Catalog,
+    link_targets,
+    most_similar,
+    summarize,
+    timestamp_us,
+    title_key,
+    title_trigrams,
+)
+from pofe.history import is_checkpoint
+from pofe.minhash import MinHashIndex, band_keys, decode, encode, rank_candidates, signature
+from pofe.minhash import similar_pairs as score_bucket_pairs
+from pofe.search import FIELDS as SEARCH_FIELDS
+from pofe.search import (
+    SearchIndex,
+    decode_occurrences,
+    document_fields,
+    field_lengths,
+    occurrences,
+    rank,
+)
+from pofe.vectors import VectorIndex
+from pofe.vectors import available as vectors_available
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; msvcrt locks a byte of the file instead.
+    fcntl = None
+    import msvcrt
+
+# The journal is folded into a new snapshot once it grows past this size, so
+# replay on load stays cheap compared to parsing the snapshot itself.
+_COMPACT_THRESHOLD_BYTES = 4 * 1024 * 1024
+
+STORAGE_MODES = ("json", "journal", "sqlite")
+
+# Indexes the file storages derive from their records and save in
+# .pofe/cache/<name><FILE_SUFFIX>, stamped with the snapshot they build on;
+# on load, the journal written since is applied to them. The catalog is
+# always kept; the others only once they have been built, which happens on
+# first use. The sqlite storage keeps the same data in its own tables, except
+# the vectors, which it saves in .pofe/cache stamped with its version.
+_DERIVED_INDEXES = {
+    "catalog": Catalog,
+    "search": SearchIndex,
+    "vectors": VectorIndex,
+    "minhash": MinHashIndex,
+}
+
+_DerivedIndex = Catalog | SearchIndex | VectorIndex | MinHashIndex
+
+
+def read_config(pofe_dir: Path) -> dict:
+    """Return the settings in .pofe/config.json, or {} if the file is missing."""
+    config_path = pofe_dir / "config.json"
+    if not config_path.exists():
+        return {}
+    with open(config_path) as f:
+        return json.load(f)
+
+
+def _storage_mode(pofe_dir: Path) -> str:
+    return read_config(pofe_dir).get("storage", "json")
+
+
+def _set_storage_mode(pofe_dir: Path, mode: str) -> None:
+    config = read_config(pofe_dir)
+    config["storage"] = mode
+    with _atomic_file(pofe_dir / "config.json") as f:
+        json.dump(config, f, indent=2)
+
+
+def open_storage(pofe_dir: Path) -> "JsonStorage | SqliteStorage":
+    """Return the storage selected by the "storage" key in .pofe/config.json.
+
+    Guarantees: "json" (the default) returns JsonStorage; "journal" returns
+                JournalStorage; "sqlite" returns SqliteStorage. The json and
+                journal modes read the same files, so switching between them
+                never loses data.
+    Fails: raises ValueError for an unknown storage mode.
+    """
+    return _storage_for(pofe_dir, _storage_mode(pofe_dir))
+
+
+def _storage_for(pofe_dir: Path, mode: str) -> "JsonStorage | SqliteStorage":
+    data_dir = pofe_dir / "data"
+    if mode == "json":
+        return JsonStorage(data_dir)
+    if mode == "journal":
+        return JournalStorage(data_dir)
+    if mode == "sqlite":
+        return SqliteStorage(data_dir)
+    raise ValueError(f"Unknown storage mode '{mode}' in config.json.")
+
+
+def migrate_storage(pofe_dir: Path, target_mode: str) -> int:
+    """Copy every requirement into the storage for target_mode and select it.
+
+    Records are streamed one at a time from the current storage into the
+    target, so the target never needs the whole database in memory. The
+    source files are left in place as a backup.
+
+    Guarantees: returns the number of records copied; config.json is switched
+                to target_mode only after the copy has fully succeeded.
+    Fails: raises ValueError if target_mode is unknown or already selected;
+           raises FileNotFoundError if nothing has been stored yet;
+           raises OSError on read or write failure.
+    """
+    source_mode = _storage_mode(pofe_dir)
+    if target_mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode '{target_mode}'.")
+    if target_mode == source_mode:
+        raise ValueError(f"Storage is already '{target_mode}'.")
+
+    source = _storage_for(pofe_dir, source_mode)
+    if not source.exists():
+        raise FileNotFoundError("rsdb.json not found. No requirements stored.")
+    target = _storage_for(pofe_dir, target_mode)
+    count = target.replace_all(source.records())
+    _set_storage_mode(pofe_dir, target_mode)
+    return count
+
+
+@contextmanager
+def _atomic_file(path: Path, mode: str = "w") -> Iterator:
+    # Readers see either the old file or the new one, never a partial write.
+    permissions = path.stat().st_mode & 0o777 if path.exists() else 0o644
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, permissions)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    _fsync_directory(path.parent)
+
+
+def _fsync_directory(path: Path) -> None:
+    # Makes a file created or renamed in path survive a crash. Windows
+    # cannot open a directory, and commits its entries with the file.
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _append_durably(path: Path, data: bytes) -> int:
+    # Appends data to path and fsyncs it; returns the offset it starts at.
+    created = not path.exists()
+    with open(path, "a+b") as f:
+        _drop_torn_tail(f)
+        start = f.tell()
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    if created:
+        _fsync_directory(path.parent)
+    return start
+
+
+def _drop_torn_tail(f) -> None:
+    # A crash mid-append leaves a line without "\n". Appending after it
+    # would glue two records together, so cut the fragment off first.
+    size = f.seek(0, os.SEEK_END)
+    if size == 0:
+        return
+    f.seek(size - 1)
+    if f.read(1) == b"\n":
+        return
+    f.seek(0)
+    keep = f.read().rfind(b"\n") + 1
+    f.truncate(keep)
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    # An exclusive advisory lock on path, held until the block exits. Other
+    # processes asking for it wait; the system drops it if the process dies.
+    path.parent.mkdir(exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _WriteLock:
+    # The lock on one data directory that writers hold, shared by every
+    # storage over it in this process (see _write_lock()). The process may
+    # take it again while holding it; only the outermost hold locks the file,
+    # since a second file lock from the same process would wait for itself.
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._depth = 0
+
+    @contextmanager
+    def hold(self) -> Iterator[bool]:
+        # Yields whether this is the outermost hold.
+        if self._depth:
+            self._depth += 1
+            try:
+                yield False
+            finally:
+                self._depth -= 1
+            return
+        with _file_lock(self._path):
+            self._depth = 1
+            try:
+                yield True
+            finally:
+                self._depth = 0
+
+    @property
+    def held(self) -> bool:
+        return self._depth > 0
+
+
+_write_locks: dict[Path, _WriteLock] = {}
+
+
+def _write_lock(data_dir: Path) -> _WriteLock:
+    path = (data_dir / "rsdb.lock").resolve()
+    if path not in _write_locks:
+        _write_locks[path] = _WriteLock(path)
+    return _write_locks[path]
+
+
+def _write_snapshot(path: Path, records: Iterable[dict]) -> int:
+    # Produces the same text as json.dump(db, f, indent=2) without building
+    # the whole document in memory.
+    count = 0
+    with _atomic_file(path) as f:
+        f.write("{")
+        for entry in records:
+            body = json.dumps(entry, indent=2).replace("\n", "\n  ")
+            f.write(("," if count else "") + f"\n  {json.dumps(entry['id'])}: {body}")
+            count += 1
+        f.write("\n}" if count else "}")
+    return count
+
+
+class JsonStorage:
+    """Requirement records kept in rsdb.json, rewritten whole after every commit.
+
+    A snapshot is the full {id: entry} dict in rsdb.json. Changes not yet
+    folded into the snapshot live in rsdb.journal, one JSON line per commit.
+    Loading always replays the journal over the snapshot, so data written in
+    journal mode stays visible after switching back to this mode. A commit
+    is appended to the journal first and folded into a new snapshot once
+    the write lock is released, so commits from several processes at once
+    share one rewrite (see locked()).
+
+    ID, title and tag lookups and listings use the catalog (see pofe.catalog)
+    saved in .pofe/cache with each snapshot, so resolving and listing
+    requirements does not read rsdb.json. Full-text search uses the search
+    index (see pofe.search), similarity queries the vector index (see
+    pofe.vectors) and near-duplicate checks the MinHash index (see
+    pofe.minhash), each kept the same way once it has been built. The
+    full records are loaded on the first get() or records() and kept in
+    memory.
+
+    Tag counts are also written to .pofe/cache/tag_counts.json after every
+    commit, stamped with the state of rsdb.json and rsdb.journal. While that
+    stamp matches, tag_counts() reads only this small file.
+
+    Guarantees: a snapshot rewrite either fully replaces the snapshot or
+                leaves it untouched; a torn final journal line is ignored on
+                load; writes from several processes are serialized by the
+                write lock.
+    Fails: read methods raise FileNotFoundError if nothing has been stored;
+           raises OSError on read or write failure.
+    """
+
+    def __init__(self, data_dir: Path):
+        self._data_dir = data_dir
+        self._snapshot_path = data_dir / "rsdb.json"
+        self._journal_path = data_dir / "rsdb.journal"
+        self._cache_dir = data_dir.parent / "cache"
+        self._tag_counts_path = self._cache_dir / "tag_counts.json"
+        self._db: dict[str, dict] | None = None
+        self._derived: dict[str, _DerivedIndex] = {}
+        self._lock = _write_lock(data_dir)
+        # _state_stamp() when the write lock was last released; loaded state
+        # is dropped on the next hold if the files changed since.
+        self._seen: list | None = None
+        # Whether a commit awaits folding, and the snapshot it was made against.
+        self._fold_pending = False
+        self._fold_stamp: list | None = None
+
+    def exists(self) -> bool:
+        return self._snapshot_path.exists() or self._journal_path.exists()
+
+    def version(self) -> str:
+        """Return a token that changes with every commit, from any process."""
+        stamp = json.dumps(self._state_stamp()).encode()
+        return "j" + hashlib.blake2b(stamp, digest_size=8).hexdigest()
+
+    def _check_exists(self) -> None:
+        if self._db is None and not self.exists():
+            raise FileNotFoundError("rsdb.json not found. No requirements stored.")
+
+    def _records(self) -> dict[str, dict]:
+        if self._db is None:
+            self._check_exists()
+            self._db = self._load()
+        return self._db
+
+    def _records_or_empty(self) -> dict[str, dict]:
+        if self._db is None and not self.exists():
+            self._db = {}
+        return self._records()
+
+    def _load(self) -> dict[str, dict]:
+        db: dict[str, dict] = {}
+        if self._snapshot_path.exists():
+            with open(self._snapshot_path) as f:
+                db = json.load(f)
+        for puts, deletes in self._journal_records():
+            for entry in puts:
+                db[entry["id"]] = entry
+            for req_id in deletes:
+                db.pop(req_id, None)
+        return db
+
+    def _journal_records(self) -> Iterator[tuple[list[dict], list[str]]]:
+        if not self._journal_path.exists():
+            return
+        with open(self._journal_path) as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # Torn write from a crash; the commit never completed.
+                record = json.loads(line)
+                yield record["put"], record["delete"]
+
+    def _snapshot_stamp(self) -> list | None:
+        # Identifies one snapshot file; any rewrite changes at least one part.
+        if not self._snapshot_path.exists():
+            return None
+        st = self._snapshot_path.stat()
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def _index(self) -> Catalog:
+        return self._derived_index("catalog")
+
+    def _search_index(self) -> SearchIndex:
+        return self._derived_index("search")
+
+    def _vector_index(self) -> VectorIndex:
+        return self._derived_index("vectors")
+
+    def _derived_path(self, name: str) -> Path:
+        return self._cache_dir / f"{name}{_DERIVED_INDEXES[name].FILE_SUFFIX}"
+
+    def _derived_index(self, name: str) -> _DerivedIndex:
+        # The saved copy plus the journal written after it, or a fresh build
+        # when the copy is missing or belongs to another snapshot.
+        if name not in self._derived:
+            index_type = _DERIVED_INDEXES[name]
+            index = None
+            stamp = self._snapshot_stamp()
+            if stamp is not None and self._derived_path(name).exists():
+                index = index_type.from_bytes(self._derived_path(name).read_bytes(), stamp)
+            if index is not None:
+                for puts, deletes in self._journal_records():
+                    index.apply(puts, deletes)
+            else:
+                # The build already holds the journal's changes. Saving it
+                # under the snapshot's stamp is still safe, because replaying
+                # those records again on load is idempotent.
+                index = index_type.build(self._records_or_empty().values())
+                if stamp is not None:
+                    self._save_derived(name, index)
+            self._derived[name] = index
+        return self._derived[name]
+
+    def _indexes_in_use(self) -> list[str]:
+        # Without NumPy a saved vector index is left alone; its stamp goes
+        # stale, so it is rebuilt once NumPy is back.
+        return [
+            name for name in _DERIVED_INDEXES
+            if name == "catalog"
+            or name in self._derived
+            or (self._derived_path(name).exists() and (name != "vectors" or vectors_available()))
+        ]
+
+    def _save_derived(self, name: str, index: _DerivedIndex) -> None:
+        self._cache_dir.mkdir(exist_ok=True)
+        with _atomic_file(self._derived_path(name), "wb") as f:
+            f.write(index.to_bytes(self._snapshot_stamp()))
+
+    def _state_stamp(self) -> list:
+        # Identifies the snapshot plus every journal record written after it.
+        stamp = [self._snapshot_stamp()]
+        if self._journal_path.exists():
+            st = self._journal_path.stat()
+            stamp.append([st.st_size, st.st_mtime_ns, st.st_ino])
+        return stamp
+
+    def _save_tag_counts(self, counts: dict[str, int]) -> None:
+        self._tag_counts_path.parent.mkdir(exist_ok=True)
+        with _atomic_file(self._tag_counts_path) as f:
+            json.dump({"stamp": self._state_stamp(), "counts": counts}, f)
+
+    def _saved_tag_counts(self) -> dict[str, int] | None:
+        if not self._tag_counts_path.exists():
+            return None
+        try:
+            saved = json.loads(self._tag_counts_path.read_text())
+        except ValueError:
+            return None
+        if saved.get("stamp") != self._state_stamp():
+            return None
+        return saved["counts"]
+
+    def get(self, req_id: str) -> dict | None:
+        return self._records().get(req_id)
+
+    def records(self) -> Iterator[dict]:
+        return iter(list(self._records().values()))
+
+    def ids_with_prefix(self, prefix: str) -> list[str]:
+        self._check_exists()
+        return self._index().ids_with_prefix(prefix)
+
+    def id_neighbours(self, req_id: str) -> tuple[str | None, str | None]:
+        self._check_exists()
+        return self._index().id_neighbours(req_id)
+
+    def ids_containing(self, fragment: str) -> list[str]:
+        self._check_exists()
+        return self._index().ids_containing(fragment)
+
+    def ids_with_title(self, title: str) -> list[str]:
+        self._check_exists()
+        return self._index().ids_with_title(title)
+
+    def ids_with_tag(self, tag: str) -> list[str]:
+        self._check_exists()
+        return self._index().ids_with_tag(tag)
+
+    def similar_titles(self, title: str, *, threshold: float, limit: int) -> list[tuple[str, float]]:
+        self._check_exists()
+        return self._index().similar_titles(title, threshold=threshold, limit=limit)
+
+    def links_from(self, req_id: str) -> list[str]:
+        self._check_exists()
+        return self._index().links_from(req_id)
+
+    def links_to(self, req_id: str) -> list[str]:
+        self._check_exists()
+        return self._index().links_to(req_id)
+
+    def link_edges(self) -> list[tuple[str, str]]:
+        self._check_exists()
+        return self._index().link_edges()
+
+    def summaries(self, ids: Iterable[str]) -> list[dict]:
+        self._check_exists()
+        return self._index().summaries(ids)
+
+    def select(
+        self,
+        *,
+        owner: str | None,
+        status: str | None,
+        tag: str | None,
+        created: tuple[int | None, int | None] | None = None,
+        updated: tuple[int | None, int | None] | None = None,
+    ) -> list[dict]:
+        self._check_exists()
+        return self._index().select(
+            owner=owner, status=status, tag=tag, created=created, updated=updated
+        )
+
+    def tag_counts(self) -> dict[str, int]:
+        self._check_exists()
+        if "catalog" not in self._derived:
+            counts = self._saved_tag_counts()
+            if counts is not None:
+                return counts
+        counts = self._index().tag_counts()
+        self._save_tag_counts(counts)
+        return counts
+
+    def tag_overlap(self, tags: list[str], *, exclude_id: str, limit: int) -> list[dict]:
+        self._check_exists()
+        ids = self._index().tag_overlap(tags, exclude_id=exclude_id, limit=limit)
+        db = self._records()
+        return [db[req_id] for req_id in ids]
+
+    def search(self, query: str, limit: int) -> list[tuple[str, float]]:
+        self._check_exists()
+        return rank(self._search_index(), query, limit)
+
+    def similar(self, entry: dict, limit: int) -> list[tuple[str, float]]:
+        self._check_exists()
+        return self._vector_index().similar(entry, limit)
+
+    def near_duplicates(self, entry: dict, threshold: float) -> list[tuple[str, float]]:
+        self._check_exists()
+        return self._derived_index("minhash").near_duplicates(entry, threshold)
+
+    def duplicate_pairs(self, threshold: float) -> dict[tuple[str, str], float]:
+        self._check_exists()
+        return self._derived_index("minhash").similar_pairs(threshold)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the write lock of the data directory for the block.
+
+        Wrap a read-modify-write in this so that no other process writes
+        between its reads and its commit. The lock is an advisory file lock
+        on rsdb.lock that every pofe process takes before writing, and
+        blocks may nest. On entry, anything loaded earlier is dropped if
+        another process has written since, so reads inside the block see
+        every committed change.
+
+        Commits made inside the block are folded into the snapshot after the
+        lock is released, in a group commit: each writer then waits for the
+        fold lock, and the first to get it folds the journal records of
+        every writer that committed meanwhile with one snapshot rewrite. The
+        others find their records already folded and return.
+        """
+        with self._exclusive():
+            yield
+        if not self._lock.held:
+            self._fold()
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        with self._lock.hold() as outermost:
+            if outermost and self._seen != self._state_stamp():
+                self._db = None
+                self._derived = {}
+            try:
+                yield
+            finally:
+                if outermost:
+                    self._seen = self._state_stamp()
+
+    def commit(self, puts: list[dict], deletes: list[str]) -> None:
+        """Persist one logical change: store every entry in puts and remove
+        every ID in deletes.
+
+        The change is appended to rsdb.journal, then folded into rsdb.json
+        once the write lock is released (see locked()).
+
+        Guarantees: the change is durable once commit() returns (the journal
+                    is fsynced) and applied in full or not at all.
+        """
+        with self.locked():
+            self._data_dir.mkdir(exist_ok=True)
+            if not self._snapshot_path.exists():
+                # Derived indexes are saved stamped with the snapshot they
+                # build on; a store begun in journal mode needs one to start
+                # from, or every process would rebuild them from the journal.
+                _write_snapshot(self._snapshot_path, [])
+            # Load the catalog before the journal grows, so it is not brought
+            # up to date from a journal that already holds this change. Other
+            # indexes not loaded yet will replay it when they are.
+            catalog = self._index()
+            _append_durably(self._journal_path, (json.dumps({"put": puts, "delete": deletes}) + "\n").encode())
+            self._apply(puts, deletes)
+            if self._should_fold():
+                self._fold_pending = True
+                self._fold_stamp = self._snapshot_stamp()
+            else:
+                self._save_tag_counts(catalog.tag_counts())
+
+    def _should_fold(self) -> bool:
+        # Whether the journal should be folded after this commit.
+        return True
+
+    def _fold(self) -> None:
+        # Every fold holds the write lock, so a snapshot written since this
+        # process's last commit holds that commit too.
+        if not self._fold_pending:
+            return
+        self._fold_pending = False
+        with _file_lock(self._data_dir / "rsdb.fold.lock"):
+            if self._journal_path.exists() and self._snapshot_stamp() == self._fold_stamp:
+                self.compact()
+
+    def _apply(self, puts: list[dict], deletes: list[str]) -> None:
+        # Bring whatever is loaded up to date: the records and each index.
+        if self._db is not None:
+            for entry in puts:
+                self._db[entry["id"]] = entry
+            for req_id in deletes:
+                self._db.pop(req_id, None)
+        for index in self._derived.values():
+            index.apply(puts, deletes)
+
+    def compact(self) -> int:
+        """Write the current state as the new snapshot and discard the journal.
+
+        Guarantees: returns the journal size in bytes that was folded; a crash
+                    at any point leaves a loadable store with the same contents,
+                    because journal replay over the new snapshot is idempotent.
+        """
+        with self._exclusive():
+            folded = self._journal_size()
+            self._data_dir.mkdir(exist_ok=True)
+            # Load the indexes while their saved copies still match the snapshot.
+            for name in self._indexes_in_use():
+                self._derived_index(name)
+            _write_snapshot(self._snapshot_path, self._records_or_empty().values())
+            for name, index in self._derived.items():
+                self._save_derived(name, index)
+            if self._journal_path.exists():
+                self._journal_path.unlink()
+            self._save_tag_counts(self._index().tag_counts())
+            return folded
+
+    def reindex(self) -> None:
+        """Rebuild the indexes from the records and save them with a new snapshot."""
+        with self._exclusive():
+            records = self._records()
+            for name in self._indexes_in_use():
+                self._derived[name] = _DERIVED_INDEXES[name].build(records.values())
+            self.compact()
+
+    def replace_all(self, records: Iterable[dict]) -> int:
+        """Replace the whole store with records, streaming them to disk.
+
+        Guarantees: returns the number of records written.
+        """
+        with self._exclusive():
+            self._data_dir.mkdir(exist_ok=True)
+            count = _write_snapshot(self._snapshot_path, records)
+            if self._journal_path.exists():
+                self._journal_path.unlink()
+            self._db = None
+            self._derived = {}
+            return count
+
+    def _journal_size(self) -> int:
+        return self._journal_path.stat().st_size if self._journal_path.exists() else 0
+
+
+class JournalStorage(JsonStorage):
+    """Requirement records whose changes are appended to rsdb.journal.
+
+    A commit writes only the changed records, not the database, and does
+    not need the database to be loaded. It does load the catalog, which is
+    much smaller, to keep the tag counts current. The journal is compacted into
+    rsdb.json automatically once it grows past a fixed size, or on demand
+    with `pofe db compact`.
+
+    Guarantees: a commit is durable once commit() returns (the journal is
+                fsynced); a crash mid-append loses only that commit.
+    """
+
+    def _should_fold(self) -> bool:
+        return self._journal_size() > _COMPACT_THRESHOLD_BYTES
+
+
+# Bump when the layout of .pofe/cache/history.json changes; older files are
+# then rebuilt from the log.
+_HISTORY_INDEX_VERSION = 1
+
+
+class RevisionLog:
+    """Every revision of every requirement, appended to history.jsonl.
+
+    Each line is one revision_record() (see pofe.history): a checkpoint, a
+    delta or a deletion. The log only grows, and it lives beside the
+    storage files rather than in them, so it is shared by every storage
+    mode and survives migrations.
+
+    The byte offset, time and kind of each requirement's revisions are
+    indexed in .pofe/cache/history.json, saved with the log size it covers,
+    so the state of the whole store at any moment can be found without
+    reading the log (see timeline()). Because
+    earlier lines never move, a stale index is brought up to date by reading
+    only the lines appended after that size. Reading a revision then costs
+    one seek per line, and rebuilding one needs at most a checkpoint and
+    the deltas after it.
+
+    A revision written again under the same number, after a crash cut its
+    commit short, replaces the earlier line.
+
+    Guarantees: append() is durable once it returns (the log is fsynced);
+                a torn final line is ignored and cut off before the next
+                append.
+    Fails: raises OSError on read or write failure.
+    """
+
+    def __init__(self, data_dir: Path):
+        self._data_dir = data_dir
+        self._path = data_dir / "history.jsonl"
+        self._index_path = data_dir.parent / "cache" / "history.json"
+        # {req_id: {rev: [offset, time in microseconds, deleted]}} for the
+        # first _indexed bytes of the log.
+        self._offsets: dict[str, dict[int, list]] | None = None
+        self._indexed = 0
+
+    def append(self, records: list[dict]) -> None:
+        if not records:
+            return
+        self._data_dir.mkdir(exist_ok=True)
+        lines = [(json.dumps(record) + "\n").encode() for record in records]
+        start = _append_durably(self._path, b"".join(lines))
+        if self._offsets is not None and self._indexed == start:
+            for record, line in zip(records, lines):
+                self._add(record, start)
+                start += len(line)
+            self._indexed = start
+
+    def _add(self, record: dict, offset: int) -> None:
+        self._offsets.setdefault(record["id"], {})[record["rev"]] = [
+            offset, timestamp_us(record["at"]), bool(record.get("deleted")),
+        ]
+
+    def _stamp(self) -> list:
+        st = self._path.stat()
+        return [st.st_ino, st.st_dev]
+
+    def _index(self) -> dict[str, dict[int, list]]:
+        if self._offsets is None:
+            self._offsets, self._indexed = {}, 0
+            if not self._path.exists():
+                return self._offsets
+            saved = None
+            if self._index_path.exists():
+                try:
+                    saved = json.loads(self._index_path.read_bytes())
+                except ValueError:
+                    pass
+            if (
+                saved
+                and saved.get("version") == _HISTORY_INDEX_VERSION
+                and saved.get("stamp") == self._stamp()
+                and saved["size"] <= self._path.stat().st_size
+            ):
+                self._offsets = {
+                    req_id: {rev: where for rev, *where in revs} for req_id, revs in saved["offsets"].items()
+                }
+                self._indexed = saved["size"]
+        if self._path.exists() and self._path.stat().st_size > self._indexed:
+            self._index_tail()
+        return self._offsets
+
+    def _index_tail(self) -> None:
+        # Index the complete lines appended since the saved index, then save it.
+        with open(self._path, "rb") as f:
+            f.seek(self._indexed)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn write from a crash; that commit never completed.
+                self._add(json.loads(line), self._indexed)
+                self._indexed += len(line)
+        self._index_path.parent.mkdir(exist_ok=True)
+        with _atomic_file(self._index_path) as f:
+            json.dump({
+                "version": _HISTORY_INDEX_VERSION,
+                "stamp": self._stamp(),
+                "size": self._indexed,
+                "offsets": {
+                    req_id: [[rev, *where] for rev, where in sorted(revs.items())]
+                    for req_id, revs in self._offsets.items()
+                },
+            }, f, separators=(",", ":"))
+
+    def _read(self, f, offset: int) -> dict:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+    def revisions(self, req_id: str) -> list[dict]:
+        """Return every logged revision record of req_id, by revision number."""
+        offsets = self._index().get(req_id, {})
+        if not offsets:
+            return []
+        with open(self._path, "rb") as f:
+            return [self._read(f, offsets[rev][0]) for rev in sorted(offsets)]
+
+    def chain(self, req_id: str, rev: int) -> list[dict]:
+        """Return the records that rebuild revision rev of req_id, for history.replay().
+
+        Guarantees: returns the nearest checkpoint at or before rev followed by
+                    the revisions after it up to rev, or [] if any is missing.
+        """
+        offsets = self._index().get(req_id, {})
+        if rev not in offsets:
+            return []
+        records: list[dict] = []
+        with open(self._path, "rb") as f:
+            while rev in offsets:
+                records.append(self._read(f, offsets[rev][0]))
+                if is_checkpoint(records[-1]):
+                    return records[::-1]
+                rev -= 1
+        return []
+
+    def timeline(self, req_id: str | None = None) -> dict[str, list[tuple[int, int | None, bool]]]:
+        """Return when each requirement's revisions were written, from the index alone.
+
+        Guarantees: returns {req_id: [(rev, microseconds or None, deleted)]}
+                    sorted by revision, for every logged requirement, or only
+                    req_id if given.
+        """
+        index = self._index()
+        ids = index if req_id is None else [req_id] if req_id in index else []
+        return {
+            each: [(rev, at, deleted) for rev, (_, at, deleted) in sorted(index[each].items())]
+            for each in ids
+        }
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS requirements (
+    id TEXT PRIMARY KEY,
+    title_norm TEXT NOT NULL,
+    user_norm TEXT NOT NULL,
+    status_norm TEXT,
+    created_at TEXT NOT NULL,
+    body TEXT NOT NULL,
+    summary TEXT,
+    created_us INTEGER,
+    updated_us INTEGER
+);
+CREATE INDEX IF NOT EXISTS requirements_title ON requirements (title_norm);
+CREATE INDEX IF NOT EXISTS requirements_user ON requirements (user_norm, created_at);
+CREATE INDEX IF NOT EXISTS requirements_created ON requirements (created_at);
+CREATE TABLE IF NOT EXISTS requirement_tags (
+    tag TEXT NOT NULL,
+    req_id TEXT NOT NULL,
+    PRIMARY KEY (tag, req_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS requirement_tags_req ON requirement_tags (req_id);
+CREATE TABLE IF NOT EXISTS title_trigrams (
+    gram TEXT NOT NULL,
+    req_id TEXT NOT NULL,
+    PRIMARY KEY (gram, req_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS title_trigrams_req ON title_trigrams (req_id);
+CREATE TABLE IF NOT EXISTS related_links (
+    req_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    target_id TEXT,
+    title_norm TEXT NOT NULL,
+    PRIMARY KEY (req_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS related_links_target ON related_links (target_id);
+CREATE INDEX IF NOT EXISTS related_links_title ON related_links (title_norm) WHERE target_id IS NULL;
+CREATE TABLE IF NOT EXISTS minhash_signatures (
+    req_id TEXT PRIMARY KEY,
+    signature TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS minhash_buckets (
+    bucket INTEGER NOT NULL,
+    req_id TEXT NOT NULL,
+    PRIMARY KEY (bucket, req_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS minhash_buckets_req ON minhash_buckets (req_id);
+CREATE TABLE IF NOT EXISTS search_docs (
+    doc INTEGER PRIMARY KEY,
+    req_id TEXT NOT NULL UNIQUE,
+    lengths TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS search_postings (
+    term TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    occurrences TEXT NOT NULL,
+    PRIMARY KEY (term, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS search_postings_doc ON search_postings (doc);
+CREATE TABLE IF NOT EXISTS search_totals (
+    field TEXT PRIMARY KEY,
+    total INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tag_counts (
+    tag TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS tag_counts_insert AFTER INSERT ON requirement_tags BEGIN
+    INSERT INTO tag_counts (tag, count) VALUES (NEW.tag, 1)
+        ON CONFLICT (tag) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS tag_counts_delete AFTER DELETE ON requirement_tags BEGIN
+    UPDATE tag_counts SET count = count - 1 WHERE tag = OLD.tag;
+    DELETE FROM tag_counts WHERE tag = OLD.tag AND count <= 0;
+END;
+"""
+
+# PRAGMA user_version of a database whose derived tables are complete.
+_SCHEMA_VERSION = 9
+
+# Columns added after the first schema, with their types. Older databases
+# get them, and their indexes, when the derived tables are rebuilt.
+_ADDED_COLUMNS = {"summary": "TEXT", "created_us": "INTEGER", "updated_us": "INTEGER"}
+
+
+def _derived_columns(entry: dict) -> tuple:
+    return (
+        json.dumps(summarize(entry)),
+        timestamp_us(entry.get("created_at")),
+        timestamp_us(entry.get("updated_at")),
+    )
+
+
+def _rebuild_derived_tables(conn: sqlite3.Connection) -> None:
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(requirements)")]
+    for column, sql_type in _ADDED_COLUMNS.items():
+        if column not in columns:
+            conn.execute(f"ALTER TABLE requirements ADD COLUMN {column} {sql_type}")
+    conn.execute("CREATE INDEX IF NOT EXISTS requirements_created_us ON requirements (created_us)")
+    conn.execute("CREATE INDEX IF NOT EXISTS requirements_updated_us ON requirements (updated_us)")
+    _clear_search_tables(conn)
+    conn.execute("DELETE FROM title_trigrams")
+    # Replaced by related_links in schema version 8.
+    conn.execute("DROP TABLE IF EXISTS requirement_links")
+    conn.execute("DELETE FROM related_links")
+    conn.execute("DELETE FROM minhash_buckets")
+    conn.execute("DELETE FROM minhash_signatures")
+    for (body,) in conn.execute("SELECT body FROM requirements").fetchall():
+        entry = json.loads(body)
+        conn.execute(
+            "UPDATE requirements SET summary = ?, created_us = ?, updated_us = ? WHERE id = ?",
+            (*_derived_columns(entry), entry["id"]),
+        )
+        _write_trigram_rows(conn, entry)
+        _write_link_rows(conn, entry)
+        _write_minhash_rows(conn, entry)
+        _write_search_rows(conn, entry)
+    conn.execute("DELETE FROM tag_counts")
+    conn.execute("INSERT INTO tag_counts SELECT tag, COUNT(*) FROM requirement_tags GROUP BY tag")
+    conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+
+def _clear_search_tables(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM search_postings")
+    conn.execute("DELETE FROM search_docs")
+    conn.execute("DELETE FROM search_totals")
+
+
+def _delete_derived_rows(conn: sqlite3.Connection, req_id: str) -> None:
+    conn.execute("DELETE FROM requirement_tags WHERE req_id = ?", (req_id,))
+    conn.execute("DELETE FROM title_trigrams WHERE req_id = ?", (req_id,))
+    conn.execute("DELETE FROM related_links WHERE req_id = ?", (req_id,))
+    conn.execute("DELETE FROM minhash_buckets WHERE req_id = ?", (req_id,))
+    conn.execute("DELETE FROM minhash_signatures WHERE req_id = ?", (req_id,))
+    row = conn.execute("SELECT doc, lengths FROM search_docs WHERE req_id = ?", (req_id,)).fetchone()
+    if row is not None:
+        doc, lengths = row
+        conn.execute("DELETE FROM search_postings WHERE doc = ?", (doc,))
+        conn.execute("DELETE FROM search_docs WHERE doc = ?", (doc,))
+        _add_search_totals(conn, [-n for n in json.loads(lengths)])
+
+
+def _write_trigram_rows(conn: sqlite3.Connection, entry: dict) -> None:
+    conn.executemany(
+        "INSERT INTO title_trigrams (gram, req_id) VALUES (?, ?)",
+        [(gram, entry["id"]) for gram in title_trigrams(entry.get("title", ""))],
+    )
+
+
+def _write_link_rows(conn: sqlite3.Connection, entry: dict) -> None:
+    conn.executemany(
+        "INSERT INTO related_links (req_id, position, target_id, title_norm) VALUES (?, ?, ?, ?)",
+        [(entry["id"], i, target, key) for i, (target, key) in enumerate(link_targets(entry))],
+    )
+
+
+def _write_minhash_rows(conn: sqlite3.Connection, entry: dict) -> None:
+    sig = signature(entry)
+    conn.execute(
+        "INSERT INTO minhash_signatures (req_id, signature) VALUES (?, ?)", (entry["id"], encode(sig))
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO minhash_buckets (bucket, req_id) VALUES (?, ?)",
+        [(key, entry["id"]) for key in band_keys(sig)],
+    )
+
+
+def _write_search_rows(conn: sqlite3.Connection, entry: dict) -> None:
+    fields = document_fields(entry)
+    lengths = field_lengths(fields)
+    doc = conn.execute(
+        "INSERT INTO search_docs (req_id, lengths) VALUES (?, ?)", (entry["id"], json.dumps(lengths))
+    ).lastrowid
+    conn.executemany(
+        "INSERT INTO search_postings (term, doc, occurrences) VALUES (?, ?, ?)",
+        [(term, doc, where) for term, where in occurrences(fields).items()],
+    )
+    _add_search_totals(conn, lengths)
+
+
+def _add_search_totals(conn: sqlite3.Connection, lengths: list[int]) -> None:
+    conn.executemany(
+        "INSERT INTO search_totals (field, total) VALUES (?, ?)"
+        " ON CONFLICT (field) DO UPDATE SET total = total + excluded.total",
+        [(field, n) for field, n in zip(SEARCH_FIELDS, lengths) if n],
+    )
+
+
+def _bump_version(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "INSERT INTO store_meta (key, value) VALUES ('version', 1)"
+        " ON CONFLICT (key) DO UPDATE SET value = value + 1"
+    )
+
+
+class _SqlitePostings:
+    """The search tables of one database, as a pofe.search.PostingSource."""
+
+    def __init__(self, storage: "SqliteStorage"):
+        self._storage = storage
+
+    def postings(self, term: str) -> dict[str, dict[str, list[int]]]:
+        return {
+            req_id: decode_occurrences(where)
+            for req_id, where in self._storage._rows(
+                "SELECT d.req_id, p.occurrences FROM search_postings p"
+                " JOIN search_docs d ON d.doc = p.doc WHERE p.term = ?",
+                [term],
+            )
+        }
+
+    def field_lengths(self, req_ids: Iterable[str]) -> dict[str, dict[str, int]]:
+        lengths = {}
+        for req_id in req_ids:
+            (encoded,) = self._storage._rows(
+                "SELECT lengths FROM search_docs WHERE req_id = ?", [req_id]
+            )[0]
+            lengths[req_id] = dict(zip(SEARCH_FIELDS, json.loads(encoded)))
+        return lengths
+
+    def statistics(self) -> tuple[int, dict[str, float]]:
+        ((doc_count,),) = self._storage._rows("SELECT COUNT(*) FROM search_docs")
+        totals = self._storage._rows("SELECT field, total FROM search_totals")
+        return doc_count, {field: total / doc_count for field, total in totals} if doc_count else {}
+
+
+# The requirement a link leads to: its target, or for an unresolved link the
+# one requirement with its title (NULL when none or several have it).
+_LINK_TARGET = (
+    "COALESCE(l.target_id, (SELECT CASE WHEN COUNT(*) = 1 THEN MIN(r.id) END"
+    " FROM requirements r WHERE r.title_norm = l.title_norm))"
+)
+
+
+@contextmanager
+def _sqlite_errors() -> Iterator[None]:
+    try:
+        yield
+    except sqlite3.Error as e:
+        raise OSError(f"SQLite error: {e}") from e
+
+
+class SqliteStorage:
+    """Requirement records kept in rsdb.sqlite with indexed lookup columns.
+
+    Each record is stored whole as JSON in the body column, and its
+    summarize() projection in the summary column, which listings read so
+    they never decode a body. The other columns hold normalized
+    (lowercased) copies of the fields that queries filter on, and
+    requirement_tags maps each tag to its requirements. Title, owner, tag
+    and ID-prefix lookups are index searches; nothing is loaded into memory
+    up front. Triggers on requirement_tags keep the tag_counts table current
+    inside the same transaction as the change itself. The title_trigrams
+    table maps each trigram of a title to its requirements, for
+    typo-tolerant title lookups. related_links holds the link_targets() of
+    each record, indexed by target ID, and by title for unresolved links,
+    for reverse lookups.
+    minhash_buckets maps the LSH band keys of the signatures in
+    minhash_signatures (see pofe.minhash) to their requirements. The
+    search_docs, search_postings and search_totals tables hold the full-text
+    index (see pofe.search), written by the same transaction, so a search
+    reads only the postings of its own terms.
+
+    Every commit also counts up the version in store_meta. The vector index
+    (see pofe.vectors) lives outside the database, in .pofe/cache, stamped
+    with that version; once it has been built, each commit updates it.
+
+    Guarantees: each commit is one SQLite transaction; writes from several
+                processes are serialized by the write lock.
+    Fails: read methods raise FileNotFoundError if rsdb.sqlite does not exist;
+           raises OSError wrapping any sqlite3.Error, so callers handle it
+           like any other storage failure.
+    """
+
+    def __init__(self, data_dir: Path):
+        self._data_dir = data_dir
+        self._path = data_dir / "rsdb.sqlite"
+        self._vectors_path = data_dir.parent / "cache" / f"vectors{VectorIndex.FILE_SUFFIX}"
+        self._conn: sqlite3.Connection | None = None
+        self._vectors: VectorIndex | None = None
+        # The version the loaded vector index reflects.
+        self._vectors_stamp: list | None = None
+        self._lock = _write_lock(data_dir)
+
+    def exists(self) -> bool:
+        return self._path.exists()
+
+    def version(self) -> str:
+        """Return a token that changes with every commit, from any process."""
+        return f"s{self._version() if self.exists() else 0}"
+
+    def _db(self, *, create: bool = False) -> sqlite3.Connection:
+        if self._conn is None:
+            if not create and not self.exists():
+                raise FileNotFoundError("rsdb.sqlite not found. No requirements stored.")
+            self._data_dir.mkdir(exist_ok=True)
+            with _sqlite_errors():
+                self._conn = sqlite3.connect(self._path)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.executescript(_SCHEMA)
+                (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+                if version < _SCHEMA_VERSION:
+                    with self._conn:
+                        _rebuild_derived_tables(self._conn)
+        return self._conn
+
+    def _rows(self, sql: str, params: Iterable = ()) -> list[tuple]:
+        with _sqlite_errors():
+            return self._db().execute(sql, tuple(params)).fetchall()
+
+    def _bodies(self, sql: str, params: Iterable = ()) -> list[dict]:
+        return [json.loads(body) for (body,) in self._rows(sql, params)]
+
+    def _ids(self, sql: str, params: Iterable = ()) -> list[str]:
+        return [req_id for (req_id,) in self._rows(sql, params)]
+
+    def _version(self) -> int:
+        found = self._rows("SELECT value FROM store_meta WHERE key = 'version'")
+        return found[0][0] if found else 0
+
+    def _vector_index(self) -> VectorIndex:
+        # The saved copy if it belongs to the current version, else a build.
+        if self._vectors is None:
+            stamp = [self._version()]
+            if self._vectors_path.exists():
+                self._vectors = VectorIndex.from_bytes(self._vectors_path.read_bytes(), stamp)
+            if self._vectors is None:
+                self._vectors = VectorIndex.build(self.records())
+                self._save_vectors(stamp)
+            self._vectors_stamp = stamp
+        return self._vectors
+
+    def _vectors_in_use(self) -> bool:
+        return self._vectors is not None or (self._vectors_path.exists() and vectors_available())
+
+    def _save_vectors(self, stamp: list) -> None:
+        self._vectors_path.parent.mkdir(exist_ok=True)
+        with _atomic_file(self._vectors_path, "wb") as f:
+            f.write(self._vectors.to_bytes(stamp))
+        self._vectors_stamp = stamp
+
+    def get(self, req_id: str) -> dict | None:
+        found = self._bodies("SELECT body FROM requirements WHERE id = ?", [req_id])
+        return found[0] if found else None
+
+    def records(self) -> Iterator[dict]:
+        with _sqlite_errors():
+            for (body,) in self._db().execute("SELECT body FROM requirements ORDER BY created_at"):
+                yield json.loads(body)
+
+    def ids_with_prefix(self, prefix: str) -> list[str]:
+        # A range scan on the primary key. IDs are lowercase hex, so every
+        # ID starting with prefix sorts below prefix + "~".
+        return self._ids(
+            "SELECT id FROM requirements WHERE id >= ? AND id < ?", [prefix, prefix + "~"]
+        )
+
+    def id_neighbours(self, req_id: str) -> tuple[str | None, str | None]:
+        before = self._ids("SELECT max(id) FROM requirements WHERE id < ?", [req_id])
+        after = self._ids("SELECT min(id) FROM requirements WHERE id > ?", [req_id])
+        return before[0], after[0]
+
+    def ids_containing(self, fragment: str) -> list[str]:
+        return self._ids("SELECT id FROM requirements WHERE instr(id, ?) > 0", [fragment])
+
+    def ids_with_title(self, title: str) -> list[str]:
+        return self._ids("SELECT id FROM requirements WHERE title_norm = ?", [title_key(title)])
+
+    def ids_with_tag(self, tag: str) -> list[str]:
+        return self._ids("SELECT req_id FROM requirement_tags WHERE tag = ?", [tag.lower()])
+
+    def similar_titles(self, title: str, *, threshold: float, limit: int) -> list[tuple[str, float]]:
+        grams = title_trigrams(title)
+        placeholders = ", ".join("?" for _ in grams)
+        shared = self._rows(
+            "SELECT t.req_id, r.title_norm, COUNT(*) FROM title_trigrams t"
+            " JOIN requirements r ON r.id = t.req_id"
+            f" WHERE t.gram IN ({placeholders}) GROUP BY t.req_id",
+            sorted(grams),
+        )
+        return most_similar(grams, shared, threshold=threshold, limit=limit)
+
+    def summaries(self, ids: Iterable[str]) -> list[dict]:
+        found = []
+        for req_id in ids:
+            found += self._bodies("SELECT summary FROM requirements WHERE id = ?", [req_id])
+        return found
+
+    def select(
+        self,
+        *,
+        owner: str | None,
+        status: str | None,
+        tag: str | None,
+        created: tuple[int | None, int | None] | None = None,
+        updated: tuple[int | None, int | None] | None = None,
+    ) -> list[dict]:
+        sql = "SELECT r.summary FROM requirements r"
+        where: list[str] = []
+        params: list = []
+        if tag is not None:
+            sql += " JOIN requirement_tags t ON t.req_id = r.id AND t.tag = ?"
+            params.append(tag.lower())
+        if owner is not None:
+            where.append("r.user_norm = ?")
+            params.append(owner.lower())
+        if status is not None:
+            where.append("r.status_norm = ?")
+            params.append(status.lower())
+        for column, bounds in (("r.created_us", created), ("r.updated_us", updated)):
+            if bounds is not None:
+                start, end = bounds
+                where.append(f"{column} IS NOT NULL")
+                if start is not None:
+                    where.append(f"{column} >= ?")
+                    params.append(start)
+                if end is not None:
+                    where.append(f"{column} < ?")
+                    params.append(end)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._bodies(sql, params)
+
+    def tag_counts(self) -> dict[str, int]:
+        return dict(self._rows("SELECT tag, count FROM tag_counts"))
+
+    def tag_overlap(self, tags: list[str], *, exclude_id: str, limit: int) -> list[dict]:
+        tag_list = sorted({t.lower() for t in tags})
+        placeholders = ", ".join("?" for _ in tag_list)
+        return self._bodies(
+            "SELECT r.body FROM ("
+            "  SELECT req_id, COUNT(*) AS overlap FROM requirement_tags"
+            f"  WHERE tag IN ({placeholders}) AND req_id != ?"
+            "   GROUP BY req_id ORDER BY overlap DESC LIMIT ?"
+            ") m JOIN requirements r ON r.id = m.req_id ORDER BY m.overlap DESC",
+            [*tag_list, exclude_id, limit],
+        )
+
+    def search(self, query: str, limit: int) -> list[tuple[str, float]]:
+        self._db()
+        return rank(_SqlitePostings(self), query, limit)
+
+    def similar(self, entry: dict, limit: int) -> list[tuple[str, float]]:
+        self._db()
+        return self._vector_index().similar(entry, limit)
+
+    def links_from(self, req_id: str) -> list[str]:
+        return [
+            target for (target,) in self._rows(
+                f"SELECT {_LINK_TARGET} FROM related_links l WHERE l.req_id = ? ORDER BY l.position",
+                [req_id],
+            ) if target is not None
+        ]
+
+    def links_to(self, req_id: str) -> list[str]:
+        return self._ids(
+            "SELECT req_id FROM related_links WHERE target_id = ?"
+            " UNION"
+            " SELECT l.req_id FROM requirements t"
+            " JOIN related_links l ON l.title_norm = t.title_norm AND l.target_id IS NULL"
+            " WHERE t.id = ?"
+            "  AND (SELECT COUNT(*) FROM requirements o WHERE o.title_norm = t.title_norm) = 1"
+            " ORDER BY 1",
+            [req_id, req_id],
+        )
+
+    def link_edges(self) -> list[tuple[str, str]]:
+        return [
+            (source, target) for source, target in self._rows(
+                f"SELECT l.req_id, {_LINK_TARGET} FROM related_links l ORDER BY l.req_id, l.position"
+            ) if target is not None
+        ]
+
+    def near_duplicates(self, entry: dict, threshold: float) -> list[tuple[str, float]]:
+        sig = signature(entry)
+        keys = band_keys(sig)
+        placeholders = ", ".join("?" for _ in keys)
+        candidates = self._rows(
+            "SELECT req_id, signature FROM minhash_signatures WHERE req_id IN ("
+            f"  SELECT req_id FROM minhash_buckets WHERE bucket IN ({placeholders})"
+            ") AND req_id != ?",
+            [*keys, entry.get("id", "")],
+        )
+        return rank_candidates(
+            sig, ((req_id, decode(text)) for req_id, text in candidates), threshold
+        )
+
+    def duplicate_pairs(self, threshold: float) -> dict[tuple[str, str], float]:
+        shared = "SELECT bucket FROM minhash_buckets GROUP BY bucket HAVING COUNT(*) > 1"
+        buckets: dict[int, list[str]] = {}
+        for bucket, req_id in self._rows(
+            f"SELECT bucket, req_id FROM minhash_buckets WHERE bucket IN ({shared})"
+        ):
+            buckets.setdefault(bucket, []).append(req_id)
+        involved = {req_id for members in buckets.values() for req_id in members}
+        signatures = {
+            req_id: decode(text)
+            for req_id, text in self._rows("SELECT req_id, signature FROM minhash_signatures")
+            if req_id in involved
+        }
+        return score_bucket_pairs(buckets.values(), signatures, threshold)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the write lock of the data directory for the block.
+
+        Wrap a read-modify-write in this so that no other process writes
+        between its reads and its commit; blocks may nest. SQLite already
+        isolates each transaction, but not a read followed by a write. On
+        entry, a vector index loaded earlier is dropped if another process
+        has committed since.
+        """
+        with self._lock.hold() as outermost:
+            if outermost and self._vectors is not None and self._vectors_stamp != [self._version()]:
+                self._vectors = None
+            yield
+
+    def commit(self, puts: list[dict], deletes: list[str]) -> None:
+        """Persist one logical change in a single transaction."""
+        with self.locked():
+            conn = self._db(create=True)
+            # Load the vectors while their saved copy still matches the version.
+            vectors = self._vector_index() if self._vectors_in_use() else None
+            with _sqlite_errors(), conn:
+                self._write(conn, puts, deletes)
+                _bump_version(conn)
+            if vectors is not None:
+                vectors.apply(puts, deletes)
+                self._save_vectors([self._version()])
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, puts: Iterable[dict], deletes: Iterable[str]) -> int:
+        count = 0
+        for req_id in deletes:
+            _delete_derived_rows(conn, req_id)
+            conn.execute("DELETE FROM requirements WHERE id = ?", (req_id,))
+        for entry in puts:
+            _delete_derived_rows(conn, entry["id"])
+            conn.execute(
+                "INSERT OR REPLACE INTO requirements"
+                " (id, title_norm, user_norm, status_norm, created_at, body,"
+                "  summary, created_us, updated_us)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry["id"],
+                    title_key(entry.get("title", "")),
+                    entry.get("user", "").lower(),
+                    entry["status"].lower() if entry.get("status") else None,
+                    entry.get("created_at", ""),
+                    json.dumps(entry),
+                    *_derived_columns(entry),
+                ),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO requirement_tags (tag, req_id) VALUES (?, ?)",
+                [(t.lower(), entry["id"]) for t in entry.get("tags", [])],
+            )
+            _write_trigram_rows(conn, entry)
+            _write_link_rows(conn, entry)
+            _write_minhash_rows(conn, entry)
+            _write_search_rows(conn, entry)
+            count += 1
+        return count
+
+    def compact(self) -> int:
+        """Reclaim free pages. There is no journal to fold, so returns 0."""
+        self._rows("VACUUM")
+        return 0
+
+    def reindex(self) -> None:
+        """Rebuild every index and derived table from the table contents."""
+        with self.locked():
+            conn = self._db()
+            with _sqlite_errors():
+                with conn:
+                    _rebuild_derived_tables(conn)
+                conn.execute("REINDEX")
+                conn.execute("ANALYZE")
+            if self._vectors_in_use():
+                self._vectors = VectorIndex.build(self.records())
+                self._save_vectors([self._version()])
+
+    def replace_all(self, records: Iterable[dict]) -> int:
+        """Replace the whole store with records in one transaction.
+
+        Guarantees: returns the number of records written.
+        """
+        with self.locked():
+            return self._replace_all(records)
+
+    def _replace_all(self, records: Iterable[dict]) -> int:
+        conn = self._db(create=True)
+        with _sqlite_errors(), conn:
+            conn.execute("DELETE FROM requirement_tags")
+            conn.execute("DELETE FROM title_trigrams")
+            conn.execute("DELETE FROM related_links")
+            conn.execute("DELETE FROM minhash_buckets")
+            conn.execute("DELETE FROM minhash_signatures")
+            _clear_search_tables(conn)
+            conn.execute("DELETE FROM requirements")
+            _bump_version(conn)
+            self._vectors = None
+            return self._write(conn, records, ())
@@ -0,0 +1,211 @@
+import io
+import json
+import zipfile
+import zlib
+from collections import Counter
+from collections.abc import Iterable
+from functools import lru_cache
+
+from pofe.search import document_fields
+
+# Bump when the saved layout changes; older files are then rebuilt.
+_VERSION = 1
+
+# Terms are hashed into this many columns instead of keeping a vocabulary.
+# With 2**20 columns, two terms of one collection rarely share a column.
+_COLUMNS = 2 ** 20
+
+# A term in a title or tag says more about a requirement than one in its body.
+_BOOSTS = {"title": 3.0, "tags": 2.0}
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(
+            "Similarity search needs NumPy. Install it with 'pip install numpy'."
+        ) from e
+    return numpy
+
+
+def available() -> bool:
+    """Return whether NumPy is installed, so a VectorIndex can be used."""
+    try:
+        _numpy()
+    except ImportError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=1 << 16)
+def _column(token: str) -> int:
+    return zlib.crc32(token.encode()) % _COLUMNS
+
+
+def _term_counts(entry: dict) -> dict[int, float]:
+    # {column: boosted term count}, ordered by column.
+    counts: Counter[int] = Counter()
+    for field, tokens in document_fields(entry).items():
+        boost = _BOOSTS.get(field, 1.0)
+        for token, count in Counter(tokens).items():
+            counts[_column(token)] += boost * count
+    return dict(sorted(counts.items()))
+
+
+class VectorIndex:
+    """TF-IDF vectors of all requirements, for finding textually similar ones.
+
+    Each requirement is one row of a sparse matrix kept as NumPy arrays in
+    compressed-row form: its terms, hashed to columns, with their sublinear
+    term frequencies. Inverse document frequencies and row norms are
+    derived from the matrix when it is queried, so adding or removing a
+    requirement only touches its own row, yet every score uses the weights
+    of the current collection. A query scores every row at once with a few
+    array operations and keeps the best with a partial sort.
+
+    Changes are collected by apply() and merged into the arrays in one pass
+    before the next query or save, so replaying a long journal stays cheap.
+
+    Guarantees: after build() or apply(), the index reflects exactly the
+                records it was given; apply() is idempotent.
+    Fails: every method raises ImportError if NumPy is not installed.
+    """
+
+    FILE_SUFFIX = ".npz"
+
+    def __init__(self, ids: list[str], indptr, indices, data):
+        np = _numpy()
+        self._ids = ids
+        self._rows = {req_id: row for row, req_id in enumerate(ids)}
+        self._indptr = np.asarray(indptr, dtype=np.int64)
+        self._indices = np.asarray(indices, dtype=np.int32)
+        self._data = np.asarray(data, dtype=np.float32)
+        # Changes not merged into the arrays yet: {req_id: entry, or None to delete}.
+        self._pending: dict[str, dict | None] = {}
+        # Weighted values and row norms, computed on the first query after a change.
+        self._weights = None
+
+    @classmethod
+    def build(cls, records: Iterable[dict]) -> "VectorIndex":
+        index = cls([], [0], [], [])
+        index.apply(records, [])
+        return index
+
+    @classmethod
+    def from_bytes(cls, data: bytes, stamp: list) -> "VectorIndex | None":
+        """Return the index saved in data, or None if it is unreadable or stale."""
+        np = _numpy()
+        try:
+            with np.load(io.BytesIO(data), allow_pickle=False) as saved:
+                meta = json.loads(saved["meta"].tobytes())
+                if meta.get("version") != _VERSION or meta.get("stamp") != stamp:
+                    return None
+                return cls(meta["ids"], saved["indptr"], saved["indices"], saved["data"])
+        except (ValueError, OSError, KeyError, zipfile.BadZipFile):
+            return None
+
+    def to_bytes(self, stamp: list) -> bytes:
+        np = _numpy()
+        self._merge()
+        meta = json.dumps({"version": _VERSION, "stamp": stamp, "ids": self._ids})
+        out = io.BytesIO()
+        np.savez(
+            out,
+            meta=np.frombuffer(meta.encode(), dtype=np.uint8),
+            indptr=self._indptr,
+            indices=self._indices,
+            data=self._data,
+        )
+        return out.getvalue()
+
+    def apply(self, puts: Iterable[dict], deletes: Iterable[str]) -> None:
+        for entry in puts:
+            self._pending[entry["id"]] = entry
+        for req_id in deletes:
+            self._pending[req_id] = None
+
+    def _merge(self) -> None:
+        if not self._pending:
+            return
+        np = _numpy()
+        lengths = np.diff(self._indptr)
+        keep = np.ones(len(self._ids), dtype=bool)
+        for req_id in self._pending:
+            row = self._rows.get(req_id)
+            if row is not None:
+                keep[row] = False
+        ids = [req_id for req_id, kept in zip(self._ids, keep) if kept]
+        values_kept = np.repeat(keep, lengths)
+        new_lengths, new_columns, new_counts = [], [], []
+        for req_id, entry in self._pending.items():
+            if entry is not None:
+                counts = _term_counts(entry)
+                ids.append(req_id)
+                new_lengths.append(len(counts))
+                new_columns += counts.keys()
+                new_counts += counts.values()
+        self._ids = ids
+        self._rows = {req_id: row for row, req_id in enumerate(ids)}
+        self._indices = np.concatenate(
+            [self._indices[values_kept], np.array(new_columns, dtype=np.int32)]
+        )
+        self._data = np.concatenate([
+            self._data[values_kept],
+            # Sublinear term frequency: repeating a word has diminishing weight.
+            (1 + np.log(np.array(new_counts, dtype=np.float32))).astype(np.float32),
+        ])
+        lengths = np.concatenate([lengths[keep], np.array(new_lengths, dtype=np.int64)])
+        self._indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self._pending = {}
+        self._weights = None
+
+    def _weighted(self):
+        # (TF-IDF value of each stored term, row norms, idf per column).
+        if self._weights is None:
+            np = _numpy()
+            document_frequency = np.bincount(self._indices, minlength=_COLUMNS)
+            idf = (np.log((1 + len(self._ids)) / (1 + document_frequency)) + 1).astype(np.float32)
+            values = self._data * idf[self._indices]
+            squares = np.zeros(len(self._ids), dtype=np.float32)
+            if len(values):
+                starts = np.minimum(self._indptr[:-1], len(values) - 1)
+                squares = np.add.reduceat(values * values, starts)
+                # reduceat() gives an empty row the next row's first value.
+                squares[self._indptr[:-1] == self._indptr[1:]] = 0
+            self._weights = values, np.sqrt(squares, dtype=np.float64), idf
+        return self._weights
+
+    def similar(self, entry: dict, limit: int) -> list[tuple[str, float]]:
+        """Return the requirements whose text is most like entry's, by cosine similarity.
+
+        Guarantees: returns up to limit (req_id, similarity) pairs with
+                    similarity > 0, most similar first; never includes
+                    entry's own ID.
+        """
+        np = _numpy()
+        self._merge()
+        if not self._ids:
+            return []
+        values, norms, idf = self._weighted()
+        counts = _term_counts(entry)
+        columns = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        query = 1 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+        query *= idf[columns]
+        query_norm = np.sqrt(query @ query)
+        if not query_norm:
+            return []
+        hits = np.flatnonzero(np.isin(self._indices, columns))
+        products = values[hits] * query[np.searchsorted(columns, self._indices[hits])]
+        rows = np.searchsorted(self._indptr, hits, side="right") - 1
+        dots = np.bincount(rows, weights=products, minlength=len(self._ids))
+        scores = np.divide(dots, norms * query_norm, out=np.zeros_like(dots), where=norms > 0)
+        own_row = self._rows.get(entry.get("id"))
+        if own_row is not None:
+            scores[own_row] = 0.0
+        count = min(limit, int(np.count_nonzero(scores > 0)))
+        if not count:
+            return []
+        best = np.argpartition(-scores, count - 1)[:count]
+        ranked = sorted((-float(scores[row]), self._ids[row]) for row in best)
+        return [(req_id, -negated) for negated, req_id in ranked]